@@ -1,26 +1,93 @@
+import asyncio
+
 from telethon import events
 from telethon.tl.functions.channels import GetParticipantRequest, EditBannedRequest, EditAdminRequest
 from telethon.tl.types import ChatBannedRights, ChatAdminRights
 from telethon.errors import MessageNotModifiedError
-import logging
+from loguru import logger
+
+import constants
+from log_pipeline import sampled_logger
+from profiler import PROFILER
+
+
+class MuteRegistry:
+    """Muted users by chat, with the frozen set of chats that have any.
+
+    A copy of `chats` is what the incoming-message handler filters on, so
+    messages of chats without muted users never reach a callback.
+    """
+
+    __slots__ = ('_users', 'chats')
+
+    def __init__(self):
+        self._users = {}
+        self.chats = frozenset()
+
+    def __contains__(self, key):
+        chat_id, user_id = key
+        users = self._users.get(chat_id)
+        return users is not None and user_id in users
+
+    def users(self, chat_id):
+        return self._users.get(chat_id, frozenset())
+
+    def mute(self, chat_id, user_id):
+        self._users.setdefault(chat_id, set()).add(user_id)
+        self.chats = frozenset(self._users)
 
-# Configure logging
-logger = logging.getLogger(__name__)
+    def unmute(self, chat_id, user_id):
+        """Returns whether the user was muted."""
+        users = self._users.get(chat_id)
+        if users is None or user_id not in users:
+            return False
+        users.discard(user_id)
+        if not users:
+            del self._users[chat_id]
+        self.chats = frozenset(self._users)
+        return True
 
-# Store chat-specific data
-chat_data = {}
 
 class AdminManager:
     """Handles admin commands like mute, unmute, ban, unban, promote, demote, and kick."""
 
+    __slots__ = ('client', 'chat_data', 'mutes', '_muted_messages', '_pending_deletes', '_flushes')
+
     def __init__(self, client):
         self.client = client
+        self.chat_data = {}  # Banned users and admins by chat, for this account only
+        self.mutes = MuteRegistry()
+        self._muted_messages = events.NewMessage(incoming=True, chats=set(self.mutes.chats))
+        self._pending_deletes = {}  # Message IDs of muted users waiting for their chat's next delete
+        self._flushes = {}  # Chat ID -> task sending that delete
+
+    def start(self):
+        """Registers the handler deleting messages of muted users, limited to chats that have any."""
+        PROFILER.add_event_handler(self.client, self.delete_muted_messages, self._muted_messages)
+        logger.info(f'[{self.__class__.__name__}] Registered event handler: `delete_muted_messages`')
+
+    def start_tasks(self):
+        """Sends the deletes still pending after a reconnect."""
+        for chat_id in self._pending_deletes:
+            self._schedule_delete(chat_id)
+
+    async def stop_tasks(self):
+        """Cancels the scheduled deletes, keeping their messages for `start_tasks`."""
+        tasks = list(self._flushes.values())
+        self._flushes.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _update_muted_chats(self):
+        # Read by Telethon's chat filter before any callback runs; a set, as `resolve` rejects frozensets
+        self._muted_messages.chats = set(self.mutes.chats)
 
     async def _get_chat_data(self, chat_id):
         """Returns the data for a specific chat, initializing if necessary."""
-        if chat_id not in chat_data:
-            chat_data[chat_id] = {"muted_users": set(), "banned_users": set(), "admins": set()}
-        return chat_data[chat_id]
+        if chat_id not in self.chat_data:
+            self.chat_data[chat_id] = {"banned_users": set(), "admins": set()}
+        return self.chat_data[chat_id]
 
     async def _get_target_user(self, event):
         """Helper method to get the target user from a reply or user ID."""
@@ -51,8 +118,8 @@ class AdminManager:
         if not user_id:
             return await self._edit_message(event, "Reply to a user or provide a user ID to mute them!")
 
-        chat_info = await self._get_chat_data(chat_id)
-        chat_info["muted_users"].add(user_id)
+        self.mutes.mute(chat_id, user_id)
+        self._update_muted_chats()
 
         await self._edit_message(event, "Muted!!!")
 
@@ -64,30 +131,36 @@ class AdminManager:
         if not user_id:
             return await self._edit_message(event, "Reply to a user or provide a user ID to unmute them!")
 
-        chat_info = await self._get_chat_data(chat_id)
-
-        if user_id not in chat_info["muted_users"]:
+        if not self.mutes.unmute(chat_id, user_id):
             return await self._edit_message(event, "This user is not muted!")
 
-        chat_info["muted_users"].discard(user_id)
+        self._update_muted_chats()
         await self._edit_message(event, "Unmuted!!!")
 
     async def delete_muted_messages(self, event):
-        """Deletes messages sent by muted users."""
+        """Queues a message of a muted user for its chat's next batched delete."""
         chat_id = event.chat_id
-        chat_info = await self._get_chat_data(chat_id)
-
-        logger.info(f"Checking if user {event.sender_id} is muted in chat {chat_id}...")
-
-        if event.sender_id in chat_info["muted_users"]:
-            logger.info(f"User {event.sender_id} is muted. Attempting to delete their message...")
-            try:
-                await event.delete()
-                logger.info(f"Deleted message from muted user {event.sender_id}")
-            except Exception as e:
-                logger.error(f"Failed to delete message from muted user {event.sender_id}: {e}")
-        else:
-            logger.info(f"User {event.sender_id} is not muted.")
+        if (chat_id, event.sender_id) not in self.mutes:
+            return
+        self._pending_deletes.setdefault(chat_id, []).append(event.id)
+        self._schedule_delete(chat_id)
+
+    def _schedule_delete(self, chat_id):
+        if chat_id not in self._flushes:
+            self._flushes[chat_id] = asyncio.create_task(self._delete_pending(chat_id))
+
+    async def _delete_pending(self, chat_id):
+        """Deletes the messages collected in a chat over `MUTE_DELETE_BATCH_SECONDS` with one request."""
+        await asyncio.sleep(constants.MUTE_DELETE_BATCH_SECONDS)
+        del self._flushes[chat_id]
+        message_ids = self._pending_deletes.pop(chat_id, [])
+        if not message_ids:
+            return
+        try:
+            await self.client.delete_messages(chat_id, message_ids)
+            sampled_logger.info("Deleted {} messages from muted users in chat {}", len(message_ids), chat_id)
+        except Exception as e:
+            logger.error(f"Failed to delete {len(message_ids)} messages from muted users in chat {chat_id}: {e}")
 
     async def ban_user(self, event):
         """Bans a user from the chat."""
@@ -191,15 +264,24 @@ class AdminManager:
             logger.error(f"Failed to demote user {user_id}: {e}")
             await self._edit_message(event, "Failed to demote the user.")
 
-    def get_event_handlers(self):
-        """Returns event handlers for admin commands."""
-        return [
-            {"callback": self.mute_user, "event": events.NewMessage(pattern=r"\.mute(?: (\d+))?$", outgoing=True)},
-            {"callback": self.unmute_user, "event": events.NewMessage(pattern=r"\.unmute(?: (\d+))?$", outgoing=True)},
-            {"callback": self.ban_user, "event": events.NewMessage(pattern=r"\.ban(?: (\d+))?$", outgoing=True)},
-            {"callback": self.unban_user, "event": events.NewMessage(pattern=r"\.unban(?: (\d+))?$", outgoing=True)},
-            {"callback": self.kick_user, "event": events.NewMessage(pattern=r"\.kick(?: (\d+))?$", outgoing=True)},
-            {"callback": self.promote_user, "event": events.NewMessage(pattern=r"\.promote(?: (\d+))?$", outgoing=True)},
-            {"callback": self.demote_user, "event": events.NewMessage(pattern=r"\.demote(?: (\d+))?$", outgoing=True)},
-            {"callback": self.delete_muted_messages, "event": events.NewMessage(incoming=True)}
-        ]
+    def checkpoint(self):
+        """Returns the tracked users of every chat as JSON-friendly lists, or None when nothing is tracked."""
+        snapshot = {}
+        for chat_id in self.mutes.chats | self.chat_data.keys():
+            chat_info = {"muted_users": sorted(self.mutes.users(chat_id))}
+            chat_info.update((key, sorted(users)) for key, users in self.chat_data.get(chat_id, {}).items())
+            if any(chat_info.values()):
+                snapshot[str(chat_id)] = chat_info
+        return snapshot or None
+
+    def restore(self, state):
+        """Merges a checkpoint into the tracked users."""
+        for chat_id, chat_info in state.items():
+            chat_id = int(chat_id)
+            for user_id in chat_info.get("muted_users", ()):
+                self.mutes.mute(chat_id, user_id)
+            for key, users in chat_info.items():
+                if key != "muted_users" and users:
+                    self.chat_data.setdefault(chat_id, {"banned_users": set(), "admins": set()})
+                    self.chat_data[chat_id].setdefault(key, set()).update(users)
+        self._update_muted_chats()
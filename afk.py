@@ -1,10 +1,9 @@
 import time
-from typing import Optional, Dict
+from typing import Any, Optional, Dict
 
 from loguru import logger
-from telethon import events
 
-import constants
+REPLY_COOLDOWN_SECONDS = 60  # At most one AFK reply per user within this window
 
 class AFKManager:
     """Manages the AFK feature for the userbot."""
@@ -67,7 +66,7 @@ class AFKManager:
         # Prevent multiple AFK replies to the same user in a short period
         current_time = time.time()
         last_reply_time = self.last_replied.get(event.sender_id, 0)
-        if current_time - last_reply_time < 60:  # 60 seconds cooldown
+        if current_time - last_reply_time < REPLY_COOLDOWN_SECONDS:
             return
 
         # Calculate AFK duration
@@ -87,10 +86,21 @@ class AFKManager:
         self.last_replied[event.sender_id] = current_time  # Update last reply time
         logger.info(f"Sent AFK reply to {event.sender_id}")
 
-    def get_event_handlers(self) -> list:
-        """Returns a list of AFK-related event handlers."""
-        return [
-            {'callback': self.afk_command, 'event': events.NewMessage(pattern=constants.AFK_COMMAND_REGEX, outgoing=True)},
-            {'callback': self.unafk_command, 'event': events.NewMessage(pattern=constants.UNAFK_COMMAND_REGEX, outgoing=True)},
-            {'callback': self.handle_afk_messages, 'event': events.NewMessage(incoming=True)}
-        ]
+    def checkpoint(self) -> Optional[Dict[str, Any]]:
+        """State kept across restarts (see `state_store.py`); nothing while not AFK."""
+        if not self.afk_status:
+            return None
+        cooldown_start = time.time() - REPLY_COOLDOWN_SECONDS
+        return {
+            'message': self.afk_message,
+            'reason': self.afk_reason,
+            'start_time': self.afk_start_time,
+            'last_replied': {str(user_id): replied for user_id, replied in self.last_replied.items() if replied > cooldown_start},
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.afk_status = True
+        self.afk_message = state.get('message', self.afk_message)
+        self.afk_reason = state.get('reason')
+        self.afk_start_time = state.get('start_time') or time.time()
+        self.last_replied = {int(user_id): replied for user_id, replied in state.get('last_replied', {}).items()}
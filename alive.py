@@ -6,6 +6,7 @@ from platform import python_version
 from telethon import version
 
 import constants  # Import constants
+from profiler import PROFILER
 
 class AliveHandler:
     def __init__(self, client):
@@ -41,7 +42,8 @@ class AliveHandler:
 
     def register(self):
         """Registers the `.alive` command with the client."""
-        self._client.add_event_handler(
+        PROFILER.add_event_handler(
+            self._client,
             self.alive_command,
             events.NewMessage(pattern=r"^\.alive$", outgoing=True)
         )
@@ -0,0 +1,366 @@
+"""End-to-end benchmark of the automation engines against the offline Hexa stand-in.
+
+Every scenario runs on a virtual clock with seeded randomness, so the
+virtual-time results (hunts/hour, guess latency, releases/hour) are identical
+across runs of the same code and can be compared between releases. Handler CPU
+and memory are measured for real and vary with the machine.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_engines [--hours H] [--accounts N] [--seed S] [--json PATH]
+    python -m benchmarks.bench_engines --record PATH      # save the synthetic hunt session
+    python -m benchmarks.bench_engines --transcript PATH  # replay a recorded session instead
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from typing import Dict, List, Optional
+
+from benchmarks.harness import FakeTelegramClient, HexaBotSimulator, replay_transcript, run_virtual
+
+import constants
+from loguru import logger
+from manager import Manager
+from plugins import PLUGINS
+
+HOUR = 3600
+RELEASE_NAMES = 75  # Names on the release list in the release benchmark
+RELEASE_COPIES = 2  # Copies owned of each of them
+INVENTORY_SIZE = 600  # Pokemon owned in the bulk release benchmark
+BULK_RELEASE_RULE = 'duplicate and level < 30 and not team'
+PURGE_HISTORY = 10000  # Messages in the chat purged by the purge benchmark
+PURGE_DELETE_RATE = 3  # Delete requests per second the simulated server accepts
+PURGE_OWN_RATIO = 0.1  # Share of the selective purge benchmark's group history that is ours
+PURGE_OWN_TEXTS = ["/hunt", "/hunt", "/hunt", "gg"]  # Our messages there, mostly hunt spam
+MUTE_GROUPS = 20  # Busy groups the account is in during the muting benchmark; one has a muted user
+MUTE_MESSAGE_SECONDS = 2.0  # Seconds between messages in each of them
+MUTE_SPAM_BURST = 5  # Messages the muted user sends at once
+
+
+def _isolate_data_files(directory: str) -> None:
+    """Points the species database and journal, the state store and the battle journal at scratch files; runs must not touch the repository."""
+    database_path = os.path.join(directory, 'pokemon.bin')
+    shutil.copyfile(constants.POKEMON_DATABASE_PATH, database_path)
+    constants.POKEMON_DATABASE_PATH = database_path
+    constants.POKEMON_JOURNAL_PATH = os.path.join(directory, 'learned_pokemon.jsonl')
+    constants.STATE_DATABASE_PATH = os.path.join(directory, 'state.db')
+    constants.BATTLE_JOURNAL_PATH = os.path.join(directory, 'battles.jsonl')
+
+
+def _start_account(account: int, seed: int, record: bool = False, simulate: bool = True):
+    client = FakeTelegramClient(account, record=record)
+    bot = HexaBotSimulator(client, seed=seed + account) if simulate else None
+    manager = Manager(client)
+    manager.start()
+    return client, bot, manager
+
+
+def _handler_cpu(client: FakeTelegramClient) -> Dict[str, float]:
+    return {
+        'updates': client.updates,
+        'handler_calls': client.handler_calls,
+        'handler_errors': client.handler_errors,
+        'handler_cpu_us_per_update': client.handler_cpu_seconds / client.updates * 1e6 if client.updates else 0.0,
+    }
+
+
+def bench_hunting(hours: float, seed: int, record: Optional[str] = None) -> Dict[str, float]:
+    async def scenario(clock):
+        client, bot, _ = _start_account(1, seed, record=record is not None)
+        client.user_command('.hunt on')
+        await asyncio.sleep(hours * HOUR)
+        client.disconnect()
+        if record is not None:
+            with open(record, 'w', encoding='utf-8') as f:
+                json.dump(client.transcript, f, ensure_ascii=False, indent=1)
+        counters = bot.counters
+        return {
+            'hunts_per_hour': counters['hunts'] / hours,
+            'encounters_per_hour': counters['encounters'] / hours,
+            'catches_per_hour': counters['caught'] / hours,
+            'poke_dollars_per_hour': counters['poke_dollars'] / hours,
+            'clicks_per_battle': counters['clicks'] / counters['battles'] if counters['battles'] else 0.0,
+            'balls_per_catch': counters['throws'] / counters['caught'] if counters['caught'] else 0.0,
+            **_handler_cpu(client),
+        }
+
+    return run_virtual(scenario, seed)
+
+
+def bench_guessing(hours: float, seed: int) -> Dict[str, float]:
+    async def scenario(clock):
+        client, bot, _ = _start_account(1, seed)
+        client.user_command('.guess on')
+        await asyncio.sleep(hours * HOUR)
+        client.disconnect()
+        counters, latencies = bot.counters, sorted(bot.guess_latencies)
+        return {
+            'guesses_per_hour': counters['guesses'] / hours,
+            'guessed_ratio': counters['guessed'] / counters['guesses'] if counters['guesses'] else 0.0,
+            'guess_latency_p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+            'guess_latency_p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+            **_handler_cpu(client),
+        }
+
+    return run_virtual(scenario, seed)
+
+
+def bench_releasing(hours: float, seed: int, count: int = RELEASE_NAMES) -> Dict[str, float]:
+    """A bulk cleanup: how long releasing every copy of `count` listed names takes, stopped after `hours` at the latest."""
+    async def scenario(clock):
+        client, bot, manager = _start_account(1, seed)
+        names = sorted(constants.REGULAR_BALL | constants.REPEAT_BALL)[:count]
+        bot.inventory = [[name.lower(), level, 50.0] for name in names for level in range(1, RELEASE_COPIES + 1)]
+        for name in names:
+            client.user_command(f'.release add {name}')
+        client.user_command('.release on', chat_id=constants.CHAT_ID)
+        await asyncio.sleep(1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        while manager.plugins.load('release').release_list and loop.time() - started < hours * HOUR:
+            await asyncio.sleep(1)
+        elapsed = loop.time() - started
+        client.user_command('.release off', chat_id=constants.CHAT_ID)
+        await asyncio.sleep(1)
+        client.disconnect()
+        releases = bot.counters['releases']
+        return {
+            'released': releases,
+            'cleanup_minutes': elapsed / 60,
+            'seconds_per_release': elapsed / releases if releases else 0.0,
+            'releases_per_hour': releases / elapsed * HOUR if elapsed else 0.0,
+            **_handler_cpu(client),
+        }
+
+    return run_virtual(scenario, seed)
+
+
+def bench_bulk_release(hours: float, seed: int, owned: int = INVENTORY_SIZE) -> Dict[str, float]:
+    """Scan an inventory, select with `BULK_RELEASE_RULE` and run the plan, stopped after `hours` at the latest."""
+    async def scenario(clock):
+        client, bot, manager = _start_account(1, seed)
+        bot.stock_inventory(owned)
+        best = {}
+        for name, level, iv in bot.inventory:
+            best[name] = max(best.get(name, (-1.0, 0)), (iv, level))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        client.user_command('.release scan', chat_id=constants.CHAT_ID)
+        await asyncio.sleep(1)
+        release = manager.plugins.load('release')
+        while release.inventory is None and loop.time() - started < hours * HOUR:
+            await asyncio.sleep(1)
+        scanned = loop.time() - started
+        scanned_pokemon = len(release.inventory) if release.inventory is not None else 0
+        client.user_command(f'.release select {BULK_RELEASE_RULE}', chat_id=constants.CHAT_ID)
+        client.user_command('.release run', chat_id=constants.CHAT_ID)
+        await asyncio.sleep(1)
+        while release.plan is not None and not release.plan.finished and loop.time() - started < hours * HOUR:
+            await asyncio.sleep(1)
+        elapsed = loop.time() - scanned - started
+        client.disconnect()
+        remaining = {}
+        for name, level, iv in bot.inventory:
+            remaining[name] = max(remaining.get(name, (-1.0, 0)), (iv, level))
+        plan = release.plan
+        return {
+            'owned': owned,
+            'scanned': scanned_pokemon,
+            'scan_seconds': scanned,
+            'planned': plan.total if plan is not None else 0,
+            'released': bot.counters['releases'],
+            'best_copies_lost': sum(1 for name, copy in best.items() if remaining.get(name) != copy),
+            'cleanup_minutes': elapsed / 60,
+            'seconds_per_release': elapsed / bot.counters['releases'] if bot.counters['releases'] else 0.0,
+            **_handler_cpu(client),
+        }
+
+    return run_virtual(scenario, seed)
+
+
+def bench_purge(seed: int, count: int = PURGE_HISTORY) -> Dict[str, float]:
+    """Purge a chat of `count` messages by replying `.purge` to the oldest, against a rate-limited server."""
+    async def scenario(clock):
+        client = FakeTelegramClient(1, history_limit=count + 100, delete_rate=PURGE_DELETE_RATE)
+        manager = Manager(client)
+        manager.start()
+        oldest = client.seed_history(constants.CHAT_ID, count, seed=seed)[0]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        client.user_command('.purge', chat_id=constants.CHAT_ID, reply_to=oldest.id)
+        while client.deleted < count + 1 and loop.time() - started < HOUR:  # +1: the command message, deleted last
+            await asyncio.sleep(0.5)
+        elapsed = loop.time() - started
+        client.disconnect()
+        return {
+            'deleted': client.deleted,
+            'purge_seconds': elapsed,
+            'messages_per_second': client.deleted / elapsed if elapsed else 0.0,
+            'delete_requests': client.delete_requests,
+            'flood_waits': client.flood_waits,
+        }
+
+    return run_virtual(scenario, seed)
+
+
+def bench_selective_purge(seed: int, count: int = PURGE_HISTORY) -> Dict[str, float]:
+    """Clean our `/hunt` spam out of a busy group of `count` messages with `.purge from:me contains:"/hunt"`."""
+    async def scenario(clock):
+        client = FakeTelegramClient(1, history_limit=count + 100, delete_rate=PURGE_DELETE_RATE)
+        manager = Manager(client)
+        manager.start()
+        history = client.seed_history(constants.CHAT_ID, count, own_ratio=PURGE_OWN_RATIO, seed=seed, own_texts=PURGE_OWN_TEXTS)
+        spam = sum(1 for message in history if message.out and '/hunt' in message.text)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        client.user_command('.purge from:me contains:"/hunt"', chat_id=constants.CHAT_ID)
+        while client.deleted < spam + 1 and loop.time() - started < HOUR:  # +1: the command message, deleted last
+            await asyncio.sleep(0.5)
+        elapsed = loop.time() - started
+        client.disconnect()
+        return {
+            'history': count,
+            'matching': spam,
+            'fetched': client.fetched,
+            'deleted': client.deleted,
+            'purge_seconds': elapsed,
+        }
+
+    return run_virtual(scenario, seed)
+
+
+def bench_muting(hours: float, seed: int, groups: int = MUTE_GROUPS) -> Dict[str, float]:
+    """Mute a spammer in one of `groups` busy groups; count the callbacks reached and the delete requests."""
+    async def scenario(clock):
+        client = FakeTelegramClient(1)
+        manager = Manager(client)
+        manager.start()
+        rng = random.Random(seed)
+        muted_chat, muted_user = -100, 2000
+        client.user_command(f'.mute {muted_user}', chat_id=muted_chat)
+        await asyncio.sleep(1)
+        incoming = from_muted = 0
+        for _ in range(int(hours * HOUR / MUTE_MESSAGE_SECONDS)):
+            for chat_id in range(muted_chat, muted_chat - groups, -1):
+                if chat_id == muted_chat and rng.random() < 0.2:
+                    for _ in range(MUTE_SPAM_BURST):
+                        client.incoming(chat_id, muted_user, 'spam')
+                    from_muted += MUTE_SPAM_BURST
+                    incoming += MUTE_SPAM_BURST
+                else:
+                    client.incoming(chat_id, 2001 + rng.randrange(50), 'hello')
+                    incoming += 1
+            await asyncio.sleep(MUTE_MESSAGE_SECONDS)
+        await asyncio.sleep(constants.MUTE_DELETE_BATCH_SECONDS + 1)
+        client.disconnect()
+        return {
+            'incoming': incoming,
+            'from_muted_user': from_muted,
+            'mute_handler_calls': client.calls_by_handler['delete_muted_messages'],
+            'deleted': client.deleted,
+            'delete_requests': client.delete_requests,
+            'handler_errors': client.handler_errors,
+        }
+
+    return run_virtual(scenario, seed)
+
+
+def bench_memory(hours: float, accounts: int, seed: int) -> Dict[str, float]:
+    """Traced memory of `accounts` hunting and guessing accounts, after one warm-up account loads shared data."""
+    async def scenario(clock):
+        client, _, manager = _start_account(0, seed)
+        manager.plugins.preload(PLUGINS)  # Module imports and the species database are paid once per process
+        clients = [client]
+        gc.collect()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for account in range(1, accounts + 1):
+            client = _start_account(account, seed)[0]
+            client.user_command('.hunt on')
+            client.user_command('.guess on')
+            clients.append(client)
+        started = tracemalloc.get_traced_memory()[0]
+        await asyncio.sleep(hours * HOUR)
+        gc.collect()
+        running = tracemalloc.get_traced_memory()[0]
+        for client in clients:
+            client.disconnect()
+        return {
+            'accounts': accounts,
+            'kib_per_account_at_start': (started - baseline) / accounts / 1024,
+            'kib_per_account_running': (running - baseline) / accounts / 1024,
+        }
+
+    tracemalloc.start()
+    try:
+        return run_virtual(scenario, seed)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_transcript(path: str, seed: int) -> Dict[str, float]:
+    """Replays a recorded Hexa session into a hunting account; clicks get no answer."""
+    with open(path, 'r', encoding='utf-8') as f:
+        transcript = json.load(f)
+
+    async def scenario(clock):
+        client, _, _ = _start_account(1, seed, simulate=False)
+        client.user_command('.hunt on')
+        await replay_transcript(client, transcript)
+        await asyncio.sleep(1)
+        client.disconnect()
+        return _handler_cpu(client)
+
+    return run_virtual(scenario, seed)
+
+
+def _print(name: str, results: Dict[str, float]) -> None:
+    print(f'{name}:')
+    for key, value in results.items():
+        print(f'  {key:>28}: {value:,.2f}' if isinstance(value, float) else f'  {key:>28}: {value:,}')
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hours', type=float, default=6, help='Virtual hours per scenario.')
+    parser.add_argument('--accounts', type=int, default=10, help='Accounts in the memory scenario.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Also write the results to this file.')
+    parser.add_argument('--record', help='Write the hunting session transcript to this file.')
+    parser.add_argument('--transcript', help='Replay this recorded transcript instead of the synthetic scenarios.')
+    parser.add_argument('--log-level', default='ERROR')
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        _isolate_data_files(directory)
+        if args.transcript:
+            results['transcript'] = bench_transcript(args.transcript, args.seed)
+        else:
+            results['hunting'] = bench_hunting(args.hours, args.seed, args.record)
+            results['guessing'] = bench_guessing(args.hours, args.seed)
+            results['releasing'] = bench_releasing(min(args.hours, 1), args.seed)
+            results['bulk_release'] = bench_bulk_release(min(args.hours, 1), args.seed)
+            results['purge'] = bench_purge(args.seed)
+            results['selective_purge'] = bench_selective_purge(args.seed)
+            results['muting'] = bench_muting(min(args.hours, 1), args.seed)
+            results['memory'] = bench_memory(min(args.hours, 1), args.accounts, args.seed)
+
+    for name, values in results.items():
+        _print(name, values)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Micro-benchmark of Hexa message parsing.
+
+Compares the per-message cost of the independent regex passes the hunter
+handlers used to make against a single `parse_hexa_message` scan.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_hexa_parser [--repeat N]
+"""
+import argparse
+import json
+import os
+import timeit
+
+import regex
+
+from hexa_parser import parse_hexa_message
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'hexa_messages.json')
+
+
+def legacy_parse(text: str) -> None:
+    """Replays the checks every hunter handler made on one message before the parser existed."""
+    'daily hunt limit reached' in text.lower()
+    if 'shiny' in text.lower() and text.lower().endswith('found!'):
+        pass
+    elif 'A wild' in text:
+        regex.search(r"A wild (.+?) \(", text)
+    if 'Battle begins!' in text:
+        regex.search(r"Wild ([^\[]+?)\s*\[.*\]\nLv\. \d+\s+•\s+HP \d+/\d+", text)
+        regex.search(r"Wild .* \[.*\]\nLv\. \d+\s+•\s+HP (\d+)/(\d+)", text)
+    if 'Wild' in text:
+        regex.search(r"Wild ([^\[]+?)\s*\[.*\]\nLv\. \d+\s+•\s+HP \d+/\d+", text)
+        regex.search(r"Wild .* \[.*\]\nLv\. \d+  •  HP (\d+)/(\d+)", text)
+    if any(substring in text for substring in ["fled", "💵", "You caught"]):
+        regex.search(r"\+(\d+) 💵", text)
+    regex.search(r"expert trainer", text.lower())
+    regex.search(r"TM(\d+) 💿 found!", text)
+    regex.search(r"(.+) mega stone found!", text.lower())
+    'Choose your next pokemon.' in text
+
+
+def uncached_parse(text: str) -> None:
+    parse_hexa_message.__wrapped__(text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000, help='Passes over the corpus per measurement.')
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    total = len(corpus) * args.repeat
+    for label, func in (('legacy handler passes', legacy_parse), ('single-pass parser', uncached_parse)):
+        func(corpus[0])  # Warm up regex caches
+        seconds = min(timeit.repeat(lambda: [func(text) for text in corpus], number=args.repeat, repeat=5))
+        print(f'{label:>22}: {seconds / total * 1e6:7.2f} µs/message')
+
+    parse_hexa_message.cache_clear()
+    seconds = min(timeit.repeat(lambda: [parse_hexa_message(text) for text in corpus], number=args.repeat, repeat=5))
+    print(f'{"cached parser (hit)":>22}: {seconds / total * 1e6:7.2f} µs/message')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Cold-start benchmark: what an account pays between process start and handling its first command.
+
+Each run happens in a fresh interpreter so imports are cold. The breakdown is
+dependency imports, importing `manager`, constructing the Telegram client and
+starting the Manager (the work done after login), followed by the first-use
+cost of every subsystem in `plugins.PLUGINS`. "eager" is what startup cost when
+every subsystem was loaded before the first command. Logging in needs a real
+account and is not measured here; `main.py` logs it for every login.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup [--runs N] [--json PATH]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+def _measure() -> Dict[str, float]:
+    """One cold start, run in the child interpreter; milliseconds per step."""
+    os.environ.setdefault('API_ID', '0')
+    os.environ.setdefault('CHAT_ID', '-1000000000001')
+    timings = {}
+
+    started = time.perf_counter()
+    import psutil, uvloop  # noqa: E401,F401  Imported by main.py before anything else
+    from loguru import logger
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+    timings['import_dependencies'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    import constants
+    import manager
+    from plugins import PLUGINS
+    timings['import_manager'] = time.perf_counter() - started
+
+    logger.remove()
+
+    async def start():
+        moment = time.perf_counter()
+        client = TelegramClient(StringSession(), constants.API_ID or 1, constants.API_HASH or 'offline')
+        timings['client'] = time.perf_counter() - moment
+
+        moment = time.perf_counter()
+        userbot = manager.Manager(client)
+        userbot.start()
+        timings['manager_start'] = time.perf_counter() - moment
+
+        userbot.plugins.preload(PLUGINS)
+        for name, seconds in userbot.plugins.load_seconds.items():
+            timings[f'load_{name}'] = seconds
+
+    import asyncio
+    asyncio.run(start())
+    timings['lazy_startup'] = sum(timings[key] for key in ('import_dependencies', 'import_manager', 'client', 'manager_start'))
+    timings['eager_startup'] = timings['lazy_startup'] + sum(value for key, value in timings.items() if key.startswith('load_'))
+    return {key: value * 1000 for key, value in timings.items()}
+
+
+def _run_child() -> Dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_startup', '--child'],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts to take the median of.')
+    parser.add_argument('--json', help='Also write the results to this file.')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_measure()))
+        return
+
+    runs = [_run_child() for _ in range(args.runs)]
+    results = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    print(f'startup (median of {args.runs} cold starts, ms):')
+    for key, value in results.items():
+        print(f'  {key:>28}: {value:,.1f}')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
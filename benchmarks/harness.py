@@ -0,0 +1,737 @@
+"""Offline stand-in for Telegram, used to run the automation engines without an account.
+
+`FakeTelegramClient` implements the subset of the Telethon client the engines use
+(`send_message`, `edit_message`, `get_messages`, `iter_messages`,
+`delete_messages`, `add_event_handler`, message clicks and edits) and dispatches new and edited
+messages to the registered handlers through their event builders' filters.
+
+The Hexa bot on the other side is either `HexaBotSimulator`, a seeded synthetic
+bot answering hunts, battles, guesses and releases, or a recorded transcript
+replayed with `replay_transcript`.
+
+Everything runs on `VirtualClockEventLoop`: when the loop has nothing ready it
+jumps straight to its next timer instead of sleeping, and `time.time` /
+`time.monotonic` follow the virtual clock, so hours of cooldowns run in seconds
+and two runs with the same seed produce the same results.
+"""
+import os
+
+# Offline runs need no real credentials; `constants` only has to import.
+os.environ.setdefault('API_ID', '0')
+os.environ.setdefault('CHAT_ID', '-1000000000001')
+
+import asyncio
+import concurrent.futures
+import itertools
+import random
+import selectors
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from loguru import logger
+from telethon import events
+from telethon.errors import FloodWaitError
+from telethon.tl.types import InputMessagesFilterPhotos, PhotoStrippedSize
+
+import constants
+from species import get_species_database
+
+VIRTUAL_EPOCH = 1_700_000_000.0  # Wall-clock time at virtual second zero
+HISTORY_LIMIT = 200  # Messages kept per chat; older ones are only on the (imaginary) server
+HISTORY_PAGE_SIZE = 100  # Messages per history request of `iter_messages`
+DELETE_SECONDS_PER_MESSAGE = 0.002  # Server time of a delete request, on top of the round trip
+
+BATTLE_BUTTONS = [['Tackle', 'Quick Attack'], ['Poke Balls', 'Run']]
+BALL_BUTTONS = [['Regular', 'Great', 'Ultra'], ['Repeat', 'Nest', '🔙']]
+INVENTORY_PAGE_SIZE = 20  # Pokémon per page of the simulated collection listing
+
+
+class VirtualClock:
+    """Simulated time shared by the event loop and the patched `time` functions."""
+
+    __slots__ = ('now',)
+
+    def __init__(self) -> None:
+        self.now: float = 0.0
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    @contextmanager
+    def install(self) -> Iterator['VirtualClock']:
+        """Points `time.time` and `time.monotonic` at the virtual clock while active."""
+        original_time, original_monotonic = time.time, time.monotonic
+        time.time = lambda: VIRTUAL_EPOCH + self.now
+        time.monotonic = lambda: self.now
+        try:
+            yield self
+        finally:
+            time.time, time.monotonic = original_time, original_monotonic
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Never blocks: an idle wait advances the virtual clock to the loop's next timer."""
+
+    def __init__(self, clock: VirtualClock) -> None:
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if not ready:
+            if timeout is None:
+                raise RuntimeError('Virtual loop is idle with no pending timers; every task is waiting forever.')
+            self._clock.advance(timeout)
+        return ready
+
+
+class _InlineExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Runs `asyncio.to_thread` work immediately, so worker threads cannot race the virtual clock."""
+
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    """Event loop whose time is a `VirtualClock`."""
+
+    def __init__(self, clock: VirtualClock) -> None:
+        super().__init__(_VirtualSelector(clock))
+        self._virtual_clock = clock
+        self.set_default_executor(_InlineExecutor())
+
+    def time(self) -> float:
+        return self._virtual_clock.now
+
+
+def run_virtual(main: Callable[[VirtualClock], Any], seed: int = 0) -> Any:
+    """Runs `main(clock)` to completion on a fresh virtual-clock loop with every RNG seeded."""
+    random.seed(seed)
+    clock = VirtualClock()
+    with clock.install(), asyncio.Runner(loop_factory=lambda: VirtualClockEventLoop(clock)) as runner:
+        return runner.run(main(clock))
+
+
+class FakeButton:
+    __slots__ = ('text',)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+class FakeRow:
+    __slots__ = ('buttons',)
+
+    def __init__(self, buttons: List[FakeButton]) -> None:
+        self.buttons = buttons
+
+
+class FakeMarkup:
+    __slots__ = ('rows',)
+
+    def __init__(self, rows: List[List[str]]) -> None:
+        self.rows = [FakeRow([FakeButton(text) for text in row]) for row in rows]
+
+
+class FakeCallbackAnswer:
+    __slots__ = ('message',)
+
+    def __init__(self, message: Optional[str] = None) -> None:
+        self.message = message
+
+
+class FakeMessage:
+    """A message as the handlers see it through Telethon's `Message` API."""
+
+    def __init__(self, client: 'FakeTelegramClient', id: int, chat_id: int, sender_id: int, text: str,
+                 out: bool = False, buttons: Optional[List[List[str]]] = None, photo=None,
+                 reply_to_msg_id: Optional[int] = None) -> None:
+        self.client = client
+        self.id = id
+        self.chat_id = chat_id
+        self.sender_id = sender_id
+        self.out = out
+        self.text = text
+        self.reply_markup = FakeMarkup(buttons) if buttons else None
+        self.photo = photo
+        self.reply_to_msg_id = reply_to_msg_id
+        self.is_reply = reply_to_msg_id is not None
+        self.fwd_from = None
+        self.mentioned = False
+        self.date = datetime.fromtimestamp(time.time(), timezone.utc)
+
+    @property
+    def message(self) -> str:
+        return self.text
+
+    @property
+    def raw_text(self) -> str:
+        return self.text
+
+    @property
+    def media(self):
+        return self.photo
+
+    @property
+    def buttons(self) -> Optional[List[List[FakeButton]]]:
+        return [row.buttons for row in self.reply_markup.rows] if self.reply_markup else None
+
+    @property
+    def is_private(self) -> bool:
+        return self.chat_id > 0
+
+    @property
+    def is_group(self) -> bool:
+        return self.chat_id < 0
+
+    def set_buttons(self, buttons: Optional[List[List[str]]]) -> None:
+        self.reply_markup = FakeMarkup(buttons) if buttons else None
+
+    async def click(self, i=None, j=None, *, text=None, data=None, **kwargs) -> Optional[FakeCallbackAnswer]:
+        buttons = [button for row in self.buttons or () for button in row]
+        if text is not None:
+            button = next((button for button in buttons if button.text == text), None)
+        elif j is not None:
+            rows = self.buttons or []
+            button = rows[i][j] if i < len(rows) and j < len(rows[i]) else None
+        else:
+            index = i or 0
+            button = buttons[index] if index < len(buttons) else None
+        if button is None:
+            return None
+        return await self.client._click(self, button.text)
+
+    async def reply(self, message: str = '', **kwargs) -> 'FakeMessage':
+        return await self.client.send_message(self.chat_id, message, reply_to=self.id, **kwargs)
+
+    async def respond(self, message: str = '', **kwargs) -> 'FakeMessage':
+        return await self.client.send_message(self.chat_id, message, **kwargs)
+
+    async def edit(self, text: str = '', **kwargs) -> 'FakeMessage':
+        await asyncio.sleep(self.client.rtt)
+        self.text = text
+        return self
+
+    async def delete(self) -> None:
+        await self.client.delete_messages(self.chat_id, [self.id])
+
+    async def get_reply_message(self) -> Optional['FakeMessage']:
+        if self.reply_to_msg_id is None:
+            return None
+        return await self.client.get_messages(self.chat_id, ids=self.reply_to_msg_id)
+
+
+class FakeEvent:
+    """One handler's view of an update: the message plus that handler's `pattern_match`."""
+
+    def __init__(self, message: FakeMessage, pattern_match=None) -> None:
+        self.message = message
+        self.pattern_match = pattern_match
+
+    def __getattr__(self, name: str):
+        return getattr(self.message, name)
+
+
+class _TimedCoroutine:
+    """Drives a coroutine step by step and adds the CPU time of each step to `sink`."""
+
+    __slots__ = ('_coroutine', '_sink')
+
+    def __init__(self, coroutine, sink: Callable[[float], None]) -> None:
+        self._coroutine = coroutine
+        self._sink = sink
+
+    def __await__(self):
+        iterator = self._coroutine.__await__()
+        value, error = None, None
+        while True:
+            started = time.process_time()
+            try:
+                yielded = iterator.throw(error) if error is not None else iterator.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self._sink(time.process_time() - started)
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+def _resolve(builder, client) -> None:
+    """Runs Telethon's own `EventBuilder.resolve`, which needs no request for the integer chat IDs used here."""
+    resolution = builder.resolve(client)
+    try:
+        resolution.send(None)
+    except StopIteration:
+        return
+    resolution.close()
+    raise RuntimeError(f'Resolving {builder!r} needs a request the fake client cannot answer')
+
+
+def _as_set(value) -> Optional[set]:
+    if value is None:
+        return None
+    return set(value) if isinstance(value, (list, tuple, set, frozenset)) else {value}
+
+
+class FakeTelegramClient:
+    """In-memory Telegram account; every request costs `rtt` virtual seconds."""
+
+    def __init__(self, account: int = 1, rtt: float = 0.15, record: bool = False, history_limit: int = HISTORY_LIMIT,
+                 delete_rate: Optional[float] = None, flood_wait: int = 5) -> None:
+        self.rtt = rtt
+        self.history_limit = history_limit
+        self.delete_rate = delete_rate  # Delete requests per second the server accepts; more cause a flood wait
+        self.flood_wait = flood_wait
+        self._delete_tokens = delete_rate or 0.0
+        self._delete_refilled = 0.0
+        self.me = SimpleNamespace(
+            id=1000 + account, first_name=f'Account {account}', username=f'account{account}',
+            mention=f'<a href="tg://user?id={1000 + account}">Account {account}</a>'
+        )
+        self.parse_mode = 'html'
+        self.bot = None  # Hexa stand-in answering this account's messages and clicks
+        self._handlers: List[tuple] = []
+        self._chats: Dict[int, deque] = {}
+        self._ids = itertools.count(1)
+        self._connected = True
+        self._disconnected = asyncio.Event()
+        self.sent = 0
+        self.fetched = 0  # Messages returned by history requests
+        self.deleted = 0
+        self.delete_requests = 0
+        self.flood_waits = 0
+        self.updates = 0
+        self.handler_calls = 0
+        self.calls_by_handler: Counter = Counter()
+        self.handler_errors = 0
+        self.handler_cpu_seconds = 0.0
+        self.transcript: Optional[List[dict]] = [] if record else None
+
+    # Telethon client API used by the engines
+
+    def add_event_handler(self, callback, event=None) -> None:
+        self._handlers.append((event or events.NewMessage(), callback))
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def disconnect(self) -> None:
+        self._connected = False
+        self._disconnected.set()
+
+    async def run_until_disconnected(self) -> None:
+        await self._disconnected.wait()
+
+    async def get_me(self):
+        return self.me
+
+    async def send_message(self, entity, message: str = '', *, reply_to=None, **kwargs) -> FakeMessage:
+        await asyncio.sleep(self.rtt)
+        sent = self._store(FakeMessage(self, next(self._ids), entity, self.me.id, message, out=True, reply_to_msg_id=reply_to))
+        self.sent += 1
+        if self.bot is not None:
+            self.bot.on_message(sent)
+        return sent
+
+    async def edit_message(self, entity, message, text: str = '', **kwargs) -> Optional[FakeMessage]:
+        await asyncio.sleep(self.rtt)
+        message_id = getattr(message, 'id', message)
+        edited = next((stored for stored in self._chats.get(entity, ()) if stored.id == message_id), None)
+        if edited is not None:
+            edited.text = text
+        return edited
+
+    async def get_messages(self, entity, ids=None, limit=None):
+        await asyncio.sleep(self.rtt)
+        history = self._chats.get(entity, ())
+        if ids is not None:
+            return next((message for message in history if message.id == ids), None)
+        return list(reversed(history))[:limit or 1]
+
+    async def iter_messages(self, entity, limit=None, *, min_id=0, max_id=0, reverse=False, from_user=None, search=None,
+                            filter=None, offset_date=None, **kwargs):
+        """Newest first (oldest first with `reverse`); one round trip per `HISTORY_PAGE_SIZE` messages."""
+        history = list(self._chats.get(entity, ())) if reverse else list(reversed(self._chats.get(entity, ())))
+        if from_user is not None:
+            history = [message for message in history if message.sender_id == from_user]
+        if search:
+            history = [message for message in history if search.lower() in (message.text or '').lower()]
+        if filter is not None:
+            history = [message for message in history if filter is InputMessagesFilterPhotos and message.photo is not None]
+        if offset_date is not None:
+            history = [message for message in history if message.date < offset_date]
+        history = [message for message in history if message.id > min_id and (not max_id or message.id < max_id)]
+        for index, message in enumerate(history[:limit] if limit else history):
+            if index % HISTORY_PAGE_SIZE == 0:
+                await asyncio.sleep(self.rtt)
+            self.fetched += 1
+            yield message
+
+    async def delete_messages(self, entity, message_ids) -> None:
+        ids = set(message_ids if isinstance(message_ids, (list, tuple, set)) else [message_ids])
+        self.delete_requests += 1
+        if self.delete_rate is not None:
+            now = asyncio.get_running_loop().time()
+            self._delete_tokens = min(self.delete_rate, self._delete_tokens + (now - self._delete_refilled) * self.delete_rate)
+            self._delete_refilled = now
+            if self._delete_tokens < 1:
+                await asyncio.sleep(self.rtt)
+                self.flood_waits += 1
+                raise FloodWaitError(request=None, capture=self.flood_wait)
+            self._delete_tokens -= 1
+        await asyncio.sleep(self.rtt + len(ids) * DELETE_SECONDS_PER_MESSAGE)
+        history = self._chats.get(entity)
+        if history is not None:
+            kept = deque((message for message in history if message.id not in ids), maxlen=self.history_limit)
+            self.deleted += len(history) - len(kept)
+            self._chats[entity] = kept
+
+    async def _click(self, message: FakeMessage, button: str) -> FakeCallbackAnswer:
+        await asyncio.sleep(self.rtt)
+        answer = self.bot.on_click(message, button) if self.bot is not None else None
+        return FakeCallbackAnswer(answer)
+
+    # Driving the account from the outside
+
+    def user_command(self, text: str, chat_id: Optional[int] = None, reply_to: Optional[int] = None) -> FakeMessage:
+        """The account owner types `text` from another device."""
+        message = self._store(FakeMessage(
+            self, next(self._ids), chat_id or self.me.id, self.me.id, text, out=True, reply_to_msg_id=reply_to
+        ))
+        self.push(message)
+        return message
+
+    def seed_history(self, chat_id: int, count: int, own_ratio: float = 0.5, seed: int = 0, spacing: float = 30.0,
+                     own_texts: Optional[List[str]] = None) -> List[FakeMessage]:
+        """Fills a chat with `count` old messages `spacing` seconds apart, `own_ratio` of them ours, without dispatching them.
+
+        Our messages are picked from `own_texts` when given.
+        """
+        rng = random.Random(seed)
+        now = time.time()
+        messages = []
+        for index in range(count):
+            own = rng.random() < own_ratio
+            sender = self.me.id if own else 2000 + rng.randrange(50)
+            text = rng.choice(own_texts) if own and own_texts else f'Message {index}'
+            message = FakeMessage(self, next(self._ids), chat_id, sender, text, out=own)
+            message.date = datetime.fromtimestamp(now - (count - index) * spacing, timezone.utc)
+            messages.append(self._store(message))
+        return messages
+
+    def incoming(self, chat_id: int, sender_id: int, text: str, buttons=None, photo=None,
+                 reply_to: Optional[int] = None) -> FakeMessage:
+        """Delivers a new message from someone else."""
+        message = self._store(FakeMessage(
+            self, next(self._ids), chat_id, sender_id, text, buttons=buttons, photo=photo, reply_to_msg_id=reply_to
+        ))
+        self.push(message)
+        return message
+
+    def edit_incoming(self, message: FakeMessage, text: str, buttons=None) -> None:
+        """Someone else edits their message."""
+        message.text = text
+        message.set_buttons(buttons)
+        self.push(message, edited=True)
+
+    def push(self, message: FakeMessage, edited: bool = False) -> None:
+        """Dispatches an update to every matching handler, each in its own task."""
+        self.updates += 1
+        if self.transcript is not None:
+            self.transcript.append({
+                'at': round(time.monotonic(), 3), 'kind': 'edit' if edited else 'new', 'id': message.id,
+                'chat_id': message.chat_id, 'sender_id': message.sender_id, 'text': message.text,
+                'buttons': [[button.text for button in row] for row in message.buttons or ()]
+            })
+        loop = asyncio.get_running_loop()
+        for builder, callback in self._handlers:
+            if not builder.resolved:
+                try:
+                    _resolve(builder, self)
+                except Exception as e:
+                    # Telethon resolves outside its handler error handling: the update reaches no further handler
+                    self.handler_errors += 1
+                    logger.opt(exception=e).debug(f'Could not resolve the event builder of `{callback.__name__}`: {e}')
+                    return
+            match = self._filter(builder, message, edited)
+            if match is not None:
+                loop.create_task(self._run_handler(callback, FakeEvent(message, match or None)))
+
+    def _store(self, message: FakeMessage) -> FakeMessage:
+        history = self._chats.get(message.chat_id)
+        if history is None:
+            history = self._chats[message.chat_id] = deque(maxlen=self.history_limit)
+        history.append(message)
+        return message
+
+    @staticmethod
+    def _filter(builder, message: FakeMessage, edited: bool):
+        """Applies an event builder's filters; returns None when filtered out, else the pattern match or True."""
+        if isinstance(builder, events.MessageEdited) != edited or not isinstance(builder, events.NewMessage):
+            return None
+        chats = _as_set(builder.chats)
+        if chats is not None and (message.chat_id in chats) == builder.blacklist_chats:
+            return None
+        if builder.incoming and message.out or builder.outgoing and not message.out:
+            return None
+        from_users = _as_set(builder.from_users)
+        if from_users is not None and message.sender_id not in from_users:
+            return None
+        match = True
+        if builder.pattern:
+            match = builder.pattern(message.text or '')
+            if not match:
+                return None
+        if builder.func and not builder.func(FakeEvent(message, match)):
+            return None
+        return match
+
+    async def _run_handler(self, callback, event: FakeEvent) -> None:
+        self.handler_calls += 1
+        self.calls_by_handler[callback.__name__] += 1
+        try:
+            await _TimedCoroutine(callback(event), self._add_cpu)
+        except Exception as e:
+            self.handler_errors += 1
+            logger.opt(exception=e).debug(f'Handler `{callback.__name__}` failed: {e}')
+
+    def _add_cpu(self, seconds: float) -> None:
+        self.handler_cpu_seconds += seconds
+
+
+class HexaBotSimulator:
+    """Seeded synthetic Hexa bot answering one account's hunts, battles, guesses and releases."""
+
+    def __init__(self, client: FakeTelegramClient, seed: int = 0, reply_delay: float = 0.6, guess_timeout: float = 30,
+                 catch_chance: float = 0.55, unknown_guess_ratio: float = 0.1) -> None:
+        self.client = client
+        client.bot = self
+        self.rng = random.Random(seed)
+        self.reply_delay = reply_delay
+        self.guess_timeout = guess_timeout
+        self.catch_chance = catch_chance
+        self.unknown_guess_ratio = unknown_guess_ratio
+        self.wanted = sorted(constants.REGULAR_BALL | constants.REPEAT_BALL)
+        database = get_species_database(constants.POKEMON_DATABASE_PATH)
+        self.species = list(database.items())
+        self.others = sorted({name for name, _ in self.species} - set(self.wanted))
+        self._battles: Dict[int, dict] = {}
+        self._guess: Optional[dict] = None
+        self.inventory: Optional[List[list]] = None  # Owned [name, level, iv] once `stock_inventory` ran
+        self.counters: Dict[str, int] = dict.fromkeys((
+            'hunts', 'encounters', 'battles', 'throws', 'caught', 'fled', 'poke_dollars', 'trainers', 'items', 'clicks',
+            'guesses', 'guessed', 'revealed', 'releases'
+        ), 0)
+        self.guess_latencies: List[float] = []
+
+    def _later(self, callback, *args) -> None:
+        asyncio.get_running_loop().call_later(self.reply_delay, callback, *args)
+
+    def on_message(self, message: FakeMessage) -> None:
+        text = message.text or ''
+        if message.chat_id == constants.HEXA_BOT_ID and text == '/hunt':
+            self.counters['hunts'] += 1
+            self._later(self._answer_hunt)
+        elif text == '/guess' and self._guess is None:
+            self._later(self._start_guess, message.chat_id)
+        elif text.startswith('/release '):
+            self._later(self._offer_release, message.chat_id, message.id, text.split(maxsplit=1)[1])
+        elif text == constants.INVENTORY_COMMAND and self.inventory is not None:
+            self._later(self._list_inventory, message.chat_id, message.id)
+        elif self._guess is not None and message.chat_id == self._guess['chat_id'] and message.reply_to_msg_id == self._guess['id']:
+            self._check_guess(message)
+
+    def on_click(self, message: FakeMessage, button: str) -> Optional[str]:
+        self.counters['clicks'] += 1
+        if message.id in self._battles:
+            self._later(self._play_battle, message, button)
+        elif button == 'Battle':
+            self._later(self._begin_battle, message.text)
+        elif button.startswith('Release'):
+            self.counters['releases'] += 1
+            if self.inventory is not None:
+                self._remove_owned(message.text)
+            self._later(self.client.edit_incoming, message, 'Pokemon released!', None)
+        elif button == constants.INVENTORY_NEXT_BUTTON and message.text.startswith('Your Pokémon'):
+            page = int(message.text.split('page ', 1)[1].split('/', 1)[0])
+            self._later(self.client.edit_incoming, message, *self._inventory_page(page + 1))
+        elif message.text.startswith('Choose the pokemon to release'):
+            self._later(self.client.edit_incoming, message, f'Release {button}?', [['Release', 'Cancel']])
+        return None
+
+    # Hunting
+
+    def _answer_hunt(self) -> None:
+        roll = self.rng.random()
+        bot = constants.HEXA_BOT_ID
+        if roll < 0.05:
+            self.counters['trainers'] += 1
+            self.client.incoming(bot, bot, 'An expert trainer has challenged you! Skipping.')
+        elif roll < 0.10:
+            self.counters['items'] += 1
+            self.client.incoming(bot, bot, f'TM{self.rng.randint(1, 99):02d} 💿 found!')
+        else:
+            self.counters['encounters'] += 1
+            pool = self.wanted if self.rng.random() < 0.5 else self.others
+            name = self.rng.choice(pool)
+            level = self.rng.randint(5, 100)
+            self.client.incoming(bot, bot, f'A wild {name} (Lv. {level}) has appeared.', buttons=[['Battle']])
+
+    def _battle_text(self, battle: dict, note: str = '') -> str:
+        return (
+            f"{note}Wild {battle['name']} [Normal]\nLv. {battle['level']}  •  HP {battle['hp']}/{battle['max_hp']}\n\n"
+            f"Current turn: {constants.POKEMON_TEAM[0]}"
+        )
+
+    def _begin_battle(self, encounter_text: str) -> None:
+        name = encounter_text[len('A wild '):encounter_text.index(' (')]
+        max_hp = self.rng.randint(30, 300)
+        battle = {'name': name, 'level': self.rng.randint(5, 100), 'hp': max_hp, 'max_hp': max_hp, 'throws': 0}
+        self.counters['battles'] += 1
+        message = self.client.incoming(constants.HEXA_BOT_ID, constants.HEXA_BOT_ID,
+                                       'Battle begins!\n\n' + self._battle_text(battle), buttons=BATTLE_BUTTONS)
+        self._battles[message.id] = battle
+
+    def _end_battle(self, message: FakeMessage, text: str) -> None:
+        del self._battles[message.id]
+        self.client.edit_incoming(message, text, None)
+
+    def _play_battle(self, message: FakeMessage, button: str) -> None:
+        battle = self._battles.get(message.id)
+        if battle is None:
+            return
+        if button in ('Tackle', 'Quick Attack'):
+            battle['hp'] = max(0, battle['hp'] - self.rng.randint(battle['max_hp'] // 4, battle['max_hp'] // 2))
+            if battle['hp'] == 0:
+                reward = self.rng.randint(10, 40)
+                self.counters['poke_dollars'] += reward
+                self._end_battle(message, f"Wild {battle['name']} fainted.\n+{reward} 💵")
+            else:
+                self.client.edit_incoming(message, self._battle_text(battle), BATTLE_BUTTONS)
+        elif button == 'Poke Balls':
+            self.client.edit_incoming(message, self._battle_text(battle), BALL_BUTTONS)
+        elif button == '🔙':
+            self.client.edit_incoming(message, self._battle_text(battle), BATTLE_BUTTONS)
+        elif button == 'Run':
+            self.counters['fled'] += 1
+            self._end_battle(message, f"You fled from Wild {battle['name']}.")
+        else:
+            self.counters['throws'] += 1
+            if self.rng.random() < self.catch_chance:
+                reward = self.rng.randint(20, 80)
+                self.counters['caught'] += 1
+                self.counters['poke_dollars'] += reward
+                self._end_battle(message, f"You caught Wild {battle['name']}!\n+{reward} 💵")
+            else:
+                battle['throws'] += 1
+                if battle['throws'] >= 4:
+                    self.counters['fled'] += 1
+                    self._end_battle(message, f"Wild {battle['name']} fled.")
+                else:
+                    self.client.edit_incoming(message, self._battle_text(battle, f'{button} ball failed!\n'), BALL_BUTTONS)
+
+    # Guessing
+
+    def _start_guess(self, chat_id: int) -> None:
+        if self._guess is not None:
+            return
+        name, data = self.rng.choice(self.species)
+        if self.rng.random() < self.unknown_guess_ratio:
+            data = data[:-1] + bytes([data[-1] ^ 0x55])  # A re-encoded thumbnail the exact index cannot know
+        photo = SimpleNamespace(sizes=[PhotoStrippedSize(type='i', bytes=data)])
+        message = self.client.incoming(chat_id, constants.HEXA_BOT_ID, "Who's that pokemon?", photo=photo)
+        self.counters['guesses'] += 1
+        self._guess = {'chat_id': chat_id, 'id': message.id, 'name': name, 'at': time.monotonic()}
+        asyncio.get_running_loop().call_later(self.guess_timeout, self._reveal, message.id)
+
+    def _check_guess(self, message: FakeMessage) -> None:
+        guess = self._guess
+        if message.text.strip().lower() != guess['name'].lower():
+            return
+        self._guess = None
+        self.counters['guessed'] += 1
+        self.guess_latencies.append(time.monotonic() - guess['at'])
+        self._later(self.client.incoming, guess['chat_id'], constants.HEXA_BOT_ID,
+                    f"{self.client.me.first_name} guessed in 1s\nThe pokemon was {guess['name']} +5 💵")
+
+    def _reveal(self, message_id: int) -> None:
+        guess = self._guess
+        if guess is None or guess['id'] != message_id:
+            return
+        self._guess = None
+        self.counters['revealed'] += 1
+        self.client.incoming(guess['chat_id'], constants.HEXA_BOT_ID, f"The pokemon was {guess['name']}")
+
+    # Releasing
+
+    def stock_inventory(self, count: int, species: int = 120) -> None:
+        """Owns `count` Pokémon of the first `species` wanted names, most of them duplicates."""
+        names = self.wanted[:species]
+        self.inventory = [
+            [self.rng.choice(names).lower(), self.rng.randint(1, 60), round(self.rng.uniform(0, 100), 1)] for _ in range(count)
+        ]
+
+    def _offer_release(self, chat_id: int, command_id: int, name: str) -> None:
+        if self.inventory is None:
+            buttons = [[f'{name.capitalize()} Lv. {self.rng.randint(1, 100)}' for _ in range(2)]]
+        else:
+            copies = [f'{name.capitalize()} Lv. {level}' for owned, level, _ in self.inventory if owned == name]
+            if not copies:
+                self.client.incoming(chat_id, constants.HEXA_BOT_ID, f"You don't have any {name}.", reply_to=command_id)
+                return
+            buttons = [copies[index:index + 2] for index in range(0, len(copies), 2)]
+        self.client.incoming(chat_id, constants.HEXA_BOT_ID, f'Choose the pokemon to release ({name}):', buttons=buttons,
+                             reply_to=command_id)
+
+    def _remove_owned(self, confirmation: str) -> None:
+        """Forgets the copy named by `Release <Name> Lv. <level>?`."""
+        name, _, level = confirmation[len('Release '):].rstrip('?').rpartition(' Lv. ')
+        for index, (owned, owned_level, _) in enumerate(self.inventory):
+            if owned == name.lower() and owned_level == int(level):
+                del self.inventory[index]
+                return
+
+    def _inventory_page(self, page: int):
+        pages = max(1, -(-len(self.inventory) // INVENTORY_PAGE_SIZE))
+        first = (page - 1) * INVENTORY_PAGE_SIZE
+        lines = [f'Your Pokémon (page {page}/{pages})']
+        for index, (name, level, iv) in enumerate(self.inventory[first:first + INVENTORY_PAGE_SIZE], first + 1):
+            lines.append(f'{index}. {name.capitalize()} Lv. {level} • IV {iv}%')
+        return '\n'.join(lines), [['⬅️', constants.INVENTORY_NEXT_BUTTON]] if page < pages else [['⬅️']]
+
+    def _list_inventory(self, chat_id: int, command_id: int) -> None:
+        text, buttons = self._inventory_page(1)
+        self.client.incoming(chat_id, constants.HEXA_BOT_ID, text, buttons=buttons, reply_to=command_id)
+
+
+async def replay_transcript(client: FakeTelegramClient, transcript: List[dict]) -> None:
+    """Replays recorded updates (see `FakeTelegramClient.transcript`) at their recorded times.
+
+    Entries are dicts with `at`, `kind` ('new' or 'edit'), `id`, `chat_id`,
+    `sender_id`, `text` and `buttons`; edits refer to an earlier `id`.
+    """
+    messages: Dict[int, FakeMessage] = {}
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for entry in sorted(transcript, key=lambda entry: entry['at']):
+        delay = started + entry['at'] - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if entry.get('sender_id') == client.me.id:
+            continue  # Our own side of the conversation is produced by the engines
+        buttons = entry.get('buttons') or None
+        if entry['kind'] == 'edit' and entry['id'] in messages:
+            client.edit_incoming(messages[entry['id']], entry['text'], buttons)
+        else:
+            messages[entry['id']] = client.incoming(entry['chat_id'], entry['sender_id'], entry['text'], buttons=buttons)
@@ -1,6 +1,4 @@
 import os
-import json
-import random
 
 # Pokémon Categories
 SAFARI = set([])
@@ -58,11 +56,12 @@ ALIVE_IMG_PATH = "https://i.ibb.co/0RSMVT70/ctt5azyvrcyc1.jpg"
 
 # Commands
 PING_COMMAND_REGEX = r'^\.ping$'
+PROF_COMMAND_REGEX = r'^\.prof(?: (reset))?$'
 ALIVE_COMMAND_REGEX = r'^\.alive$'
 HELP_COMMAND_REGEX = r'^\.help(?: (.*))?$'
 EVAL_COMMAND_REGEX = r'^\.eval (.+)'
-GUESSER_COMMAND_REGEX = r'^\.guess (on|off|stats)$'
-HUNTER_COMMAND_REGEX = r'^\.hunt (on|off|stats)$'
+GUESSER_COMMAND_REGEX = r'^\.guess (on|off|stats|history)$'
+HUNTER_COMMAND_REGEX = r'^\.hunt (on|off|stats|history)$'
 LIST_COMMAND_REGEX = r'^\.list(?:\s+(\w+))?$'  # Now supports `.list <category>`
 
 # AFK Commands
@@ -71,10 +70,32 @@ UNAFK_COMMAND_REGEX = r'^\.unafk$'  # Matches `.unafk`
 
 # Timing and Limits
 
-COOLDOWN = lambda: random.randint(2, 3)  # Random cooldown between 3 and 6 seconds
+PACING_INITIAL_INTERVAL_SECONDS = 2.5  # Starting gap between Telegram actions, adapted at runtime
+PACING_MIN_INTERVAL_SECONDS = 1.0  # Never act faster than this
+PACING_MAX_INTERVAL_SECONDS = 30  # Upper bound after repeated flood waits
 PERIODICALLY_GUESS_SECONDS = 120  # Guess cooldown
-PERIODICALLY_HUNT_SECONDS = 300  # Hunt cooldown (5 minutes)
+PERIODICALLY_HUNT_SECONDS = 300  # Idle hunt re-kick (5 minutes)
+HUNT_REPLY_TIMEOUT_SECONDS = 30  # Re-send /hunt if Hexa does not answer it in time
+BATTLE_TIMEOUT_SECONDS = 120  # Give up on a battle that stops receiving updates
+CLICK_CONFIRM_TIMEOUT_SECONDS = 10  # Re-click a button if Hexa neither edits the message nor answers in time
+CLICK_MAX_ATTEMPTS = 3  # Clicks per button before giving up
+RELEASE_REPLY_TIMEOUT_SECONDS = 15  # Wait for Hexa's answer to `/release <name>` before retrying the name
+RELEASE_MAX_ATTEMPTS = 3  # Attempts per release order before giving up on it until the next `.release on`
+SPAM_SEND_ATTEMPTS = 3  # Tries per spam message when flood waits interrupt it
+RELEASE_PROGRESS_SECONDS = 30  # How often a running release plan edits its progress message
+PURGE_CHUNK_SIZE = 100  # Message IDs per delete request (Telegram's maximum)
+PURGE_MAX_CONCURRENCY = 4  # Delete requests in flight at most
+PURGE_PREFETCH_CHUNKS = 8  # Chunks of history fetched ahead of the deletes
+PURGE_PROGRESS_SECONDS = 5  # How often a running purge edits its progress into the command message
+PURGE_CONFIRMATION_SECONDS = 3  # How long the purge summary stays before it is deleted
+MUTE_DELETE_BATCH_SECONDS = 1  # Messages of muted users collected per chat before one delete request
 HEXA_BOT_ID = 572621020  # ID of the Hexa bot
+HEXA_STALE_SECONDS = 600  # A hunting account with no Hexa update for this long is reported not ready
+HEALTH_PORT = int(os.getenv('PORT', '8080'))  # Health and metrics HTTP server
+RECONNECT_INITIAL_SECONDS = 1  # First delay before logging in again; doubles per failed attempt
+RECONNECT_MAX_SECONDS = 300  # Upper bound of the reconnect delay
+RECONNECT_STABLE_SECONDS = 60  # A connection that lasted this long resets the reconnect delay
+FLOOD_SLEEP_THRESHOLD = 0  # Flood waits Telethon sleeps through itself; 0 raises every one, so the pacers see and honour it
 
 # Auto-Battle Constants
 HUNT_DAILY_LIMIT_REACHED = "Daily hunt limit reached. Auto-battle stopped."
@@ -84,12 +105,44 @@ SHINY_FOUND = "Shiny Pokémon found! Auto-battle stopped for {0}."
 API_ID = int(os.getenv('API_ID'))
 API_HASH = os.getenv('API_HASH')
 SESSION = os.getenv('SESSION')
+SESSIONS = os.getenv('SESSIONS', '').split() or [SESSION]  # Whitespace-separated string sessions, one account each
 
 # Chat ID
 CHAT_ID = int(os.getenv('CHAT_ID'))
 
-# Load Pokémon Data
-with open('pokemon.json', 'r') as f:
-    POKEMON = json.load(f)
+# Logging (see `log_pipeline.py`)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_MODULE_LEVELS = {'telethon': 'WARNING', **dict(item.split('=', 1) for item in os.getenv('LOG_LEVELS', '').split())}  # e.g. "hunter=DEBUG"
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # `json` (one object per line) or `text`
+LOG_SAMPLE_LIMIT = 5  # Records each sampled call site may log per window
+LOG_SAMPLE_SECONDS = 60  # Sampling window
+
+# Subsystems loaded at startup instead of on their first command (see `plugins.py`)
+PRELOAD_PLUGINS = os.getenv('PRELOAD_PLUGINS', '').split()
+
+# Pokémon Data (binary species database, see `species.py`)
+POKEMON_DATABASE_PATH = 'pokemon.bin'
+POKEMON_JOURNAL_PATH = 'learned_pokemon.jsonl'  # Species learned from reveals, merged on startup
+
+# Hexa's paged listing of the account's Pokémon, scanned by `.release scan` (see `inventory.py`)
+INVENTORY_COMMAND = '/pokemon'
+INVENTORY_NEXT_BUTTON = '➡️'  # Text of the button showing the next page
+
+# Battle strategy (see `strategy.py`)
+BATTLE_POLICY = os.getenv('BATTLE_POLICY', 'expected_rate')  # `expected_rate` (learned) or `configured` (the ball lists above)
+BATTLE_JOURNAL_PATH = os.getenv('BATTLE_JOURNAL_PATH', 'battles.jsonl')  # Finished battles, learned from at startup
+BATTLE_JOURNAL_LIMIT = 20000  # Newest battles kept in the journal
+POKEBALL_PRICES = {  # PD per ball in the Hexa shop; throws are charged against the PD they earn
+    "Regular": 10,
+    "Great": 25,
+    "Ultra": 50,
+    "Repeat": 40,
+    "Nest": 40,
+}
+
+# Engine state kept across restarts (see `state_store.py`); put it on a volume to survive redeploys
+STATE_DATABASE_PATH = os.getenv('STATE_PATH', 'state.db')
+STATE_CHECKPOINT_SECONDS = 15  # How often every account checkpoints its subsystems
+STATE_FLUSH_SECONDS = 1  # Checkpoints queued within this window are written in one transaction
 
 __version__ = '1.0.0'
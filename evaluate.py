@@ -10,6 +10,7 @@ from meval import meval
 from telethon import events
 
 import constants
+from profiler import PROFILER
 from utility import delete_if_exists
 
 class ExpressionEvaluator:
@@ -31,9 +32,7 @@ class ExpressionEvaluator:
         for handler in self.event_handlers:
             callback = handler.get('callback')
             event = handler.get('event')
-            self._client.add_event_handler(
-               callback=callback, event=event
-            )
+            PROFILER.add_event_handler(self._client, callback, event)
             logger.info(f'[{self.__class__.__name__}] Added event handler: `{callback.__name__}`')
 
     async def _get_namespaces(self, event) -> dict:
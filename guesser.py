@@ -1,13 +1,18 @@
 import asyncio
-import json
-from typing import List, Dict, Callable, Optional
+from typing import Any, List, Dict, Callable, Optional
 
 from loguru import logger
 from telethon import events
+from telethon.errors import FloodWaitError
 from telethon.tl.types import PhotoStrippedSize
 
 import constants
-from utility import delete_if_exists
+import metrics
+from pacing import PacingScheduler
+from profiler import PROFILER
+from telemetry import TimeSeries
+from similarity import SimilarityIndex
+from species import SpeciesIndex, SpeciesJournal, get_species_database
 
 
 IDENTIFICATION_TRIGGER_REGEX = r"^Who's that pokemon\?$"
@@ -21,6 +26,15 @@ TELEMETRY_REPORT = """Telemetry Report:
   - Unsuccessful identifications: {0.unsuccessful_identifications}
   - Pokè Dollar (PD) accrued: {1}"""
 
+# Fields of the guessing history (see `telemetry.py`), and how `.guess history` names them
+HISTORY_LABELS = {
+    'guesses': 'guesses',
+    'identified': 'identified',
+    'missed': 'missed',
+    'poke_dollars': 'PD',
+}
+POKE_DOLLARS_PER_IDENTIFICATION = 5
+
 
 class AutomationOrchestrator:
     """Manages the lifecycle and operational state of the automated identification process."""
@@ -44,6 +58,12 @@ class AutomationOrchestrator:
         """Returns the current automation state (active or inactive)."""
         return self._is_active
 
+    def checkpoint(self) -> Dict[str, Any]:
+        return {'active': self._is_active}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self._is_active = bool(state.get('active'))
+
 class ActivityMonitor:
     """Monitors and meticulously records key performance indicators of the identification process."""
 
@@ -51,14 +71,19 @@ class ActivityMonitor:
         '_messages_sent',
         '_responses_received',
         '_successful_identifications',
-        '_unsuccessful_identifications'
+        '_unsuccessful_identifications',
+        '_counters'
     )
     
-    def __init__(self):
+    def __init__(self, account: str = 'default'):
         self._messages_sent: int = 0
         self._responses_received: int = 0
         self._successful_identifications: int = 0
         self._unsuccessful_identifications: int = 0
+        self._counters = tuple(
+            metrics.GUESS_ACTIVITY.labels(account, activity)
+            for activity in ('guesses_sent', 'responses_received', 'successful_identifications', 'unsuccessful_identifications')
+        )
 
     def record_activity(
       self,
@@ -68,14 +93,19 @@ class ActivityMonitor:
       unsuccessful_identification: bool = False
     ) -> None:
         """Records specific activity events, incrementing the corresponding counters."""
+        sent, received, successful, unsuccessful = self._counters
         if message_sent:
             self._messages_sent += 1
+            sent.inc()
         if response_received:
             self._responses_received += 1
+            received.inc()
         if successful_identification:
             self._successful_identifications += 1
+            successful.inc()
         if unsuccessful_identification:
             self._unsuccessful_identifications += 1
+            unsuccessful.inc()
 
     def reset_metrics(self) -> None:
         """Resets all recorded performance metrics to their initial zero values."""
@@ -84,6 +114,21 @@ class ActivityMonitor:
         self._successful_identifications = 0
         self._unsuccessful_identifications = 0
 
+    def checkpoint(self) -> Dict[str, int]:
+        return {
+            'messages_sent': self._messages_sent,
+            'responses_received': self._responses_received,
+            'successful_identifications': self._successful_identifications,
+            'unsuccessful_identifications': self._unsuccessful_identifications,
+        }
+
+    def restore(self, state: Dict[str, int]) -> None:
+        """Continues the report from a checkpoint; the exported counters start from zero in every process."""
+        self._messages_sent = int(state.get('messages_sent', 0))
+        self._responses_received = int(state.get('responses_received', 0))
+        self._successful_identifications = int(state.get('successful_identifications', 0))
+        self._unsuccessful_identifications = int(state.get('unsuccessful_identifications', 0))
+
     @property
     def messages_sent(self) -> int:
         return self._messages_sent
@@ -107,59 +152,158 @@ class ImageMetadataCache:
     __slots__ = ('_metadata',)
 
     def __init__(self):
-        self._metadata: Optional[list[str]] = None
+        self._metadata: Optional[PhotoStrippedSize] = None
 
-    def store_metadata(self, dimensions: list[str]) -> None:
+    def store_metadata(self, dimensions: PhotoStrippedSize) -> None:
         """Stores image metadata, including dimensions and the associated message identifier."""
         self._metadata = dimensions
 
-    def retrieve_metadata(self) -> Optional[str]:
+    def retrieve_metadata(self) -> Optional[PhotoStrippedSize]:
         """Retrieves the stored image metadata and subsequently clears the cache to prevent stale data."""
         metadata = self._metadata
         self._metadata = None
         return metadata
 
 
+class SpeciesCatalog:
+    """Species knowledge shared by every account in the process.
+
+    The exact index, the journal and the similarity index are built once; a species
+    learned from one account's reveal is immediately known to all of them.
+    """
+
+    __slots__ = ('index', 'journal', 'similarity_index', '_similarity_task')
+
+    def __init__(self, database_path: str, journal_path: str) -> None:
+        self.index = SpeciesIndex(get_species_database(database_path))
+        self.journal = SpeciesJournal(journal_path, database_path)
+        for name, data in self.journal.replay():
+            self.index.learn(name, data)
+        self.similarity_index: Optional[SimilarityIndex] = None
+        self._similarity_task: Optional[asyncio.Task] = None
+
+    def build_similarity_index(self) -> None:
+        """Schedules the similarity index build unless it is already built or building."""
+        if self._similarity_task is None:
+            self._similarity_task = asyncio.create_task(self._build_similarity_index())
+
+    async def _build_similarity_index(self) -> None:
+        """Hashes every known species off the event loop for the fuzzy fallback."""
+        try:
+            self.similarity_index = await asyncio.to_thread(SimilarityIndex.from_items, list(self.index.items()))
+        except Exception as e:
+            self._similarity_task = None
+            logger.exception(f'[{self.__class__.__name__}] Failed to build similarity index: {e}')
+
+    def lookup(self, data: bytes) -> Optional[str]:
+        """Exact digest lookup with the perceptual fallback once it is available."""
+        pokemon_name = self.index.lookup(data)
+        if pokemon_name is None and self.similarity_index is not None:
+            match = self.similarity_index.nearest(data)
+            if match is not None:
+                pokemon_name, confidence = match
+                logger.info(f'[{self.__class__.__name__}] Fuzzy match: {pokemon_name} ({confidence:.2%})')
+        return pokemon_name
+
+    async def learn(self, name: str, data: bytes) -> None:
+        """Indexes a revealed species and journals it; raises OSError when journaling fails."""
+        self.index.learn(name, data)
+        if self.similarity_index is not None:
+            self.similarity_index.learn(name, data)
+        await self.journal.append(name, data, self.index)
+
+
+_catalogs: Dict[str, SpeciesCatalog] = {}
+
+
+def get_species_catalog(database_path: Optional[str] = None, journal_path: Optional[str] = None) -> SpeciesCatalog:
+    """Returns the process-wide catalog for `database_path`, building it on first use.
+
+    Paths default to the ones configured in `constants` at call time.
+    """
+    database_path = database_path or constants.POKEMON_DATABASE_PATH
+    journal_path = journal_path or constants.POKEMON_JOURNAL_PATH
+    catalog = _catalogs.get(database_path)
+    if catalog is None:
+        catalog = _catalogs[database_path] = SpeciesCatalog(database_path, journal_path)
+    return catalog
+
+
 class PokemonIdentificationEngine:
     """The core engine for identifying Pokemon and managing automation."""
 
     __slots__ = (
         '_client',
+        '_pacer',
         'automation_orchestrator',
         'activity_monitor',
-        'metadata_cache'
+        'metadata_cache',
+        'catalog',
+        'history',
+        '_tasks'
     )
 
 
-    def __init__(self, client) -> None:
+    def __init__(self, client, pacer: PacingScheduler) -> None:
         self._client = client
+        self._pacer = pacer
         self.automation_orchestrator = AutomationOrchestrator()
-        self.activity_monitor = ActivityMonitor()
+        self.activity_monitor = ActivityMonitor(metrics.account_label(client))
         self.metadata_cache = ImageMetadataCache()
+        self.catalog = get_species_catalog()
+        self.history = TimeSeries(HISTORY_LABELS)
+        self._tasks: List[asyncio.Task] = []
 
   
     def start(self) -> None:
         """Starts the Pokemon identification engine."""
         logger.info('Initializing Pokemon Identification Engine')
-
-        asyncio.create_task(self._periodically_transmit_guess_commands())
-        logger.info(f'[{self.__class__.__name__}] Created task: `_periodically_transmit_guess_commands`')
+        self.start_tasks()
+        self.catalog.build_similarity_index()
 
         for handler in self.event_handlers:
             callback = handler.get('callback')
             event = handler.get('event')
-            self._client.add_event_handler(
-               callback=callback, event=event
-            )
+            PROFILER.add_event_handler(self._client, callback, event)
             logger.info(f'[{self.__class__.__name__}] Added event handler: `{callback.__name__}`')
 
+    def checkpoint(self) -> Optional[Dict[str, Any]]:
+        """State kept across restarts (see `state_store.py`); nothing while guessing is off and has no history."""
+        history = self.history.checkpoint()
+        if not self.automation_orchestrator.is_automation_active and history is None:
+            return None
+        return {
+            'automation': self.automation_orchestrator.checkpoint(),
+            'activity': self.activity_monitor.checkpoint(),
+            'history': history,
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.automation_orchestrator.restore(state.get('automation', {}))
+        self.activity_monitor.restore(state.get('activity', {}))
+        self.history.restore(state.get('history') or {})
+
+    def start_tasks(self) -> None:
+        """Starts the background tasks; called again after a reconnect."""
+        self._tasks.append(asyncio.create_task(self._periodically_transmit_guess_commands()))
+        logger.info(f'[{self.__class__.__name__}] Created task: `_periodically_transmit_guess_commands`')
+
+    async def stop_tasks(self) -> None:
+        """Cancels the background tasks and waits for them to finish, e.g. before a reconnect."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
   
     async def _transmit_guess_command(self) -> None:
         """Transmits the guess command (/guess) to the designated chat."""
-        await asyncio.sleep(constants.COOLDOWN())
+        await self._pacer.wait()
         if self.automation_orchestrator.is_automation_active:
-            await self._client.send_message(entity=constants.CHAT_ID, message='/guess')
+            async with self._pacer.measure():
+                await self._client.send_message(entity=constants.CHAT_ID, message='/guess')
             self.activity_monitor.record_activity(message_sent=True)
+            self.history.add('guesses')
 
   
     async def _periodically_transmit_guess_commands(self) -> None:
@@ -169,8 +313,10 @@ class PokemonIdentificationEngine:
                 await asyncio.sleep(constants.PERIODICALLY_GUESS_SECONDS)
                 if self.automation_orchestrator.is_automation_active:
                     await self._transmit_guess_command()
-            except (asyncio.CancelledError, ConnectionError) as e:
+            except ConnectionError as e:
                 logger.warning(f'[{self.__class__.__name__}] An error occurred during periodic command transmission: {e}', exc_info=True)
+            except FloodWaitError as e:
+                logger.warning(f'[{self.__class__.__name__}] Flood wait of {e.seconds}s when sending /guess.')
 
   
     async def handle_automation_control_request(self, event) -> None:
@@ -184,31 +330,33 @@ class PokemonIdentificationEngine:
                 await event.edit('Automated identification has been activated.')
         elif action == 'off':
             if self.automation_orchestrator.is_automation_active:
-                telemetry_report = TELEMETRY_REPORT.format(self.activity_monitor, self.activity_monitor.successful_identifications * 5)
+                telemetry_report = TELEMETRY_REPORT.format(self.activity_monitor, self.activity_monitor.successful_identifications * POKE_DOLLARS_PER_IDENTIFICATION)
                 message = f'Automated identification has been deactivated.\n{telemetry_report}'
                 self.automation_orchestrator.deactivate_automation(self.activity_monitor)
                 await event.edit(message)
             else:
               await event.edit('Automated identification already deactivate.')
         elif action == 'stats':
-            telemetry_report = TELEMETRY_REPORT.format(self.activity_monitor, self.activity_monitor.successful_identifications * 5)
+            telemetry_report = TELEMETRY_REPORT.format(self.activity_monitor, self.activity_monitor.successful_identifications * POKE_DOLLARS_PER_IDENTIFICATION)
             await event.edit(telemetry_report)
+        elif action == 'history':
+            await event.edit(self.history.generate_report('📈 Guessing history', HISTORY_LABELS, 'poke_dollars'))
 
   
     async def _handle_daily_quota_exceeded(self, event) -> None:
         """Handles the event of exceeding the daily identification quota, suspending automation."""
         if self.automation_orchestrator.is_automation_active:
             warning = 'daily guess allocation has been exhausted.\nAutomated identification procedures have been suspended.'
-            telemetry_report = TELEMETRY_REPORT.format(self.activity_monitor, self.activity_monitor.successful_identifications * 5)
+            telemetry_report = TELEMETRY_REPORT.format(self.activity_monitor, self.activity_monitor.successful_identifications * POKE_DOLLARS_PER_IDENTIFICATION)
             message = f"{self._client.me.mention}'s {warning}\n{telemetry_report}"
             await self._client.send_message(entity=constants.CHAT_ID, message=message)
             self.automation_orchestrator.deactivate_automation(self.activity_monitor)
             logger.warning(f"[{self.__class__.__name__}] {self._client.me.mention}'s {'- @' + self._client.me.username if self._client.me.username else ''} {warning}")
 
   
-    def _get_stripped_size(self, photo) -> str:
+    def _get_stripped_size(self, photo) -> Optional[PhotoStrippedSize]:
         try:
-            return [str(size) for size in photo.sizes if isinstance(size, PhotoStrippedSize)][0]
+            return [size for size in photo.sizes if isinstance(size, PhotoStrippedSize)][0]
         except IndexError as ie:
             logger.exception(f'cannot find stripped size: {ie}')
             return None
@@ -219,8 +367,8 @@ class PokemonIdentificationEngine:
         if not self.automation_orchestrator.is_automation_active:
             return
 
-        if not constants.POKEMON:
-            logger.warning(f'[{self.__class__.__name__}] `constants.POKEMON` is not configured. Identification procedures cannot proceed.')
+        if not self.catalog.index:
+            logger.warning(f'[{self.__class__.__name__}] species database is empty. Identification procedures cannot proceed.')
             return
 
         self.activity_monitor.record_activity(response_received=True)
@@ -229,19 +377,22 @@ class PokemonIdentificationEngine:
         if not stripped_size:
             await event.reply(message='something went wrong')
             return
-        pokemon_name = None
-        for name, expected_sizes in constants.POKEMON.items():
-            if stripped_size == expected_sizes:
-              pokemon_name = name
-              break
+        pokemon_name = self.catalog.lookup(stripped_size.bytes)
 
         if pokemon_name is not None:
-            await asyncio.sleep(constants.COOLDOWN())
-            await event.reply(pokemon_name)
+            try:
+                async with self._pacer.pace():
+                    await event.reply(pokemon_name)
+            except FloodWaitError as e:
+                logger.warning(f'[{self.__class__.__name__}] Flood wait of {e.seconds}s, guess of {pokemon_name} not sent.')
+                return
             self.activity_monitor.record_activity(successful_identification=True)
+            self.history.add('identified')
+            self.history.add('poke_dollars', POKE_DOLLARS_PER_IDENTIFICATION)
         else:
             self.metadata_cache.store_metadata(stripped_size)
             self.activity_monitor.record_activity(unsuccessful_identification=True)
+            self.history.add('missed')
             logger.warning(f'[{self.__class__.__name__}] pokemon name not matching')
             
 
@@ -251,16 +402,9 @@ class PokemonIdentificationEngine:
         metadata = self.metadata_cache.retrieve_metadata()
         if metadata is not None:
             try:
-                filename = 'new_pokemon.json'
-                delete_if_exists(filename)
-                NEW_POKEMON = constants.POKEMON
-                NEW_POKEMON[revealed_name] = metadata
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(NEW_POKEMON, f, indent=4)
-                await event.reply(file=filename)
-                delete_if_exists(filename)
-            except Exception as e:
-                logger.warning(f'[{self.__class__.__name__}] An error occurred during sending metadata: {e}')
+                await self.catalog.learn(revealed_name, metadata.bytes)
+            except OSError as e:
+                logger.warning(f'[{self.__class__.__name__}] An error occurred while journaling `{revealed_name}`: {e}')
 
         await self._transmit_guess_command()
 
@@ -1,14 +1,98 @@
-from flask import Flask, render_template
-from threading import Thread
+"""Health and metrics HTTP endpoints served from the bot's own event loop.
 
-app = Flask(__name__)
-@app.route('/')
-def index():
-    return "Alive"
+    GET /         "Alive" while the process runs
+    GET /health   JSON readiness of every account; 503 unless all are ready
+    GET /metrics  Prometheus metrics (see `metrics.py`)
+"""
+import asyncio
+import json
+from typing import Dict, List, Optional, Tuple
 
-def run():
-    app.run(host='0.0.0.0',port=8080)
+from loguru import logger
 
-def check():
-    t = Thread(target=run)
-    t.start()
+import constants
+import metrics
+
+REQUEST_TIMEOUT_SECONDS = 5
+MAX_HEADER_LINES = 100
+
+STATUS_TEXT = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed', 503: 'Service Unavailable'}
+
+
+class HealthServer:
+    """Minimal asyncio HTTP server reporting the state of the registered accounts."""
+
+    __slots__ = ('_host', '_port', '_managers', '_server')
+
+    def __init__(self, host: str = '0.0.0.0', port: int = constants.HEALTH_PORT) -> None:
+        self._host = host
+        self._port = port
+        self._managers: List = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def register(self, manager) -> None:
+        self._managers.append(manager)
+
+    def unregister(self, manager) -> None:
+        if manager in self._managers:
+            self._managers.remove(manager)
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self._host, self._port)
+        logger.info(f'[{self.__class__.__name__}] Serving health checks on {self._host}:{self._port}')
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def readiness(self) -> Tuple[bool, Dict]:
+        """Ready when at least one account runs and every account is ready."""
+        accounts = [manager.health() for manager in self._managers]
+        ready = bool(accounts) and all(account['ready'] for account in accounts)
+        return ready, {'ready': ready, 'accounts': accounts}
+
+    def _respond(self, path: str) -> Tuple[int, str, str]:
+        if path == '/':
+            return 200, 'text/plain; charset=utf-8', 'Alive'
+        if path == '/health':
+            ready, payload = self.readiness()
+            return 200 if ready else 503, 'application/json', json.dumps(payload)
+        if path == '/metrics':
+            return 200, 'text/plain; version=0.0.4; charset=utf-8', metrics.REGISTRY.render()
+        return 404, 'text/plain; charset=utf-8', 'Not Found'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT_SECONDS)
+            for _ in range(MAX_HEADER_LINES):
+                line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT_SECONDS)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                return
+            method, path = parts[0], parts[1].split('?', 1)[0]
+            if method not in ('GET', 'HEAD'):
+                status, content_type, body = 405, 'text/plain; charset=utf-8', 'Method Not Allowed'
+            else:
+                status, content_type, body = self._respond(path)
+
+            payload = body.encode('utf-8')
+            writer.write(
+                f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Length: {len(payload)}\r\n'
+                'Connection: close\r\n\r\n'.encode('latin-1')
+            )
+            if method != 'HEAD':
+                writer.write(payload)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.exception(f'[{self.__class__.__name__}] Failed to answer health request: {e}')
+        finally:
+            writer.close()
@@ -0,0 +1,101 @@
+"""Single-pass parser for the Hexa bot's hunt and battle messages."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+import regex
+
+# Every marker the hunter reacts to, as one alternation scanned once with `finditer`.
+# Markers that may contain other markers (encounter and battle blocks, mega stone lines)
+# are matched with lookaheads so the scan keeps going inside them.
+HEXA_MESSAGE_REGEX = regex.compile(
+    r"A wild (?=(?P<encounter_name>.+?) \((?:Lv\. (?P<encounter_level>\d+))?)"
+    r"|(?P<battle_started>Battle begins!)"
+    r"|Wild (?=(?P<battle_name>[^\[\n]+?)\s*\[.*\]\nLv\. (?P<battle_level>\d+)\s+•\s+HP (?P<hp>\d+)/(?P<max_hp>\d+))"
+    r"|(?:\+(?P<pokedollars>\d+) )?(?P<pokedollar_sign>💵)"
+    r"|(?P<caught>You caught)"
+    r"|(?P<fled>fled)"
+    r"|(?P<trainer>(?i:expert trainer))"
+    r"|TM(?P<tm>\d+) 💿 found!"
+    r"|(?P<daily_limit>(?i:daily hunt limit reached))"
+    r"|(?P<switch_requested>Choose your next pokemon\.)"
+    r"|(?P<shiny>(?i:shiny))"
+    r"|^(?=(?P<mega_stone>.+) (?i:mega stone found!))",
+    regex.MULTILINE
+)
+
+
+@dataclass(frozen=True, slots=True)
+class HexaMessage:
+    """Everything the hunter needs to know about one Hexa bot message."""
+
+    encounter: bool = False
+    name: Optional[str] = None
+    level: Optional[int] = None
+    hp: Optional[int] = None
+    max_hp: Optional[int] = None
+    battle_started: bool = False
+    shiny: bool = False
+    caught: bool = False
+    fled: bool = False
+    pokedollar_sign: bool = False
+    pokedollars: Optional[int] = None
+    tm: Optional[str] = None
+    mega_stone: Optional[str] = None
+    trainer: bool = False
+    daily_limit: bool = False
+    switch_requested: bool = False
+
+    @property
+    def in_battle(self) -> bool:
+        """Whether the message carries the wild Pokemon's battle block (name, level and HP)."""
+        return self.max_hp is not None
+
+    @property
+    def battle_over(self) -> bool:
+        """Whether the message reports the end of an encounter (fled, caught or rewarded)."""
+        return self.fled or self.caught or self.pokedollar_sign
+
+
+@lru_cache(maxsize=64)
+def parse_hexa_message(text: str) -> HexaMessage:
+    """Parses a Hexa bot message in a single scan.
+
+    Results are cached by text, so handlers reacting to the same message share one parse.
+
+    Args:
+        text: The raw text of the message.
+
+    Returns:
+        The parsed message; fields whose marker is absent keep their defaults.
+    """
+    fields = {}
+    for match in HEXA_MESSAGE_REGEX.finditer(text):
+        group = match.lastgroup
+        if match.group('encounter_name') is not None:
+            fields['encounter'] = True
+            fields.setdefault('name', match.group('encounter_name').strip())
+            if match.group('encounter_level') is not None:
+                fields.setdefault('level', int(match.group('encounter_level')))
+        elif match.group('battle_name') is not None:
+            if 'max_hp' not in fields:
+                fields['name'] = match.group('battle_name').strip()
+                fields['level'] = int(match.group('battle_level'))
+                fields['hp'] = int(match.group('hp'))
+                fields['max_hp'] = int(match.group('max_hp'))
+        elif match.group('pokedollar_sign') is not None:
+            fields['pokedollar_sign'] = True
+            if match.group('pokedollars') is not None:
+                fields.setdefault('pokedollars', int(match.group('pokedollars')))
+        elif match.group('tm') is not None:
+            fields.setdefault('tm', f"TM{match.group('tm')}")
+        elif match.group('mega_stone') is not None:
+            fields.setdefault('mega_stone', match.group('mega_stone'))
+        elif group is not None:
+            fields[group] = True
+
+    if fields.get('shiny') and text[-6:].lower() != 'found!':
+        fields['shiny'] = False
+    return HexaMessage(**fields)
@@ -0,0 +1,174 @@
+"""Routes Hexa bot updates to hunter actions through one handler per event type."""
+from __future__ import annotations
+
+import asyncio
+import time
+from enum import Enum, auto
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from telethon import events
+
+import constants
+import metrics
+from hexa_parser import HexaMessage, parse_hexa_message
+
+ROUTE_REPORT_LINE = "  {route}: {count} calls, avg {average_ms:.1f}ms, max {max_ms:.1f}ms"
+
+
+class HexaRoute(Enum):
+    DAILY_LIMIT = auto()
+    ENCOUNTER = auto()
+    BATTLE_START = auto()
+    TRAINER_OR_ITEM = auto()
+    SWITCH_REQUEST = auto()
+    BATTLE_OVER = auto()
+    BATTLE_TURN = auto()
+    IGNORED = auto()
+
+
+def classify_new_message(parsed: HexaMessage) -> HexaRoute:
+    """Picks the route of a new Hexa message; earlier checks win."""
+    if parsed.daily_limit:
+        return HexaRoute.DAILY_LIMIT
+    if parsed.shiny or parsed.encounter:
+        return HexaRoute.ENCOUNTER
+    if parsed.battle_started:
+        return HexaRoute.BATTLE_START
+    if parsed.trainer or parsed.tm or parsed.mega_stone:
+        return HexaRoute.TRAINER_OR_ITEM
+    return HexaRoute.IGNORED
+
+
+def classify_edited_message(parsed: HexaMessage) -> HexaRoute:
+    """Picks the route of an edited Hexa message; earlier checks win."""
+    if parsed.switch_requested:
+        return HexaRoute.SWITCH_REQUEST
+    if parsed.battle_over:
+        return HexaRoute.BATTLE_OVER
+    if parsed.in_battle:
+        return HexaRoute.BATTLE_TURN
+    return HexaRoute.IGNORED
+
+
+class RouteStats:
+    """Call count and wall-clock latency of one route."""
+
+    __slots__ = ('count', 'total_seconds', 'max_seconds')
+
+    def __init__(self):
+        self.count: int = 0
+        self.total_seconds: float = 0.0
+        self.max_seconds: float = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    @property
+    def average_seconds(self) -> float:
+        return self.total_seconds / self.count if self.count else 0.0
+
+
+class BotReactions:
+    """Futures resolved when the Hexa bot edits a given message or sends a new one.
+
+    A button click waits on one of these to learn that the bot reacted, instead of
+    sleeping and polling.
+    """
+
+    __slots__ = ('_pending',)
+
+    def __init__(self):
+        self._pending: Dict[int, Set[asyncio.Future]] = {}
+
+    def expect(self, message_id: int) -> asyncio.Future:
+        """Returns a future resolved with the next Hexa update reacting to `message_id`."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(message_id, set()).add(future)
+        return future
+
+    def discard(self, message_id: int, future: asyncio.Future) -> None:
+        waiters = self._pending.get(message_id)
+        if waiters is not None:
+            waiters.discard(future)
+            if not waiters:
+                del self._pending[message_id]
+
+    def resolve(self, message_id: int, event) -> None:
+        """Wakes the waiters of an edited message."""
+        for future in self._pending.pop(message_id, ()):
+            if not future.done():
+                future.set_result(event)
+
+    def resolve_all(self, event) -> None:
+        """Wakes every waiter; a new bot message answers whatever was clicked."""
+        for message_id in list(self._pending):
+            self.resolve(message_id, event)
+
+
+RouteAction = Callable[[events.common.EventCommon, HexaMessage], Awaitable[None]]
+
+
+class HexaEventRouter:
+    """Parses every Hexa update once and dispatches it to the action registered for its route."""
+
+    __slots__ = ('_routes', '_stats', '_latency', 'reactions', 'last_update')
+
+    def __init__(self, account: str, routes: Dict[HexaRoute, RouteAction]) -> None:
+        self._routes = routes
+        self._stats: Dict[HexaRoute, RouteStats] = {route: RouteStats() for route in HexaRoute}
+        self._latency = {route: metrics.ROUTE_LATENCY.labels(account, route.name.lower()) for route in HexaRoute}
+        self.reactions = BotReactions()
+        self.last_update: Optional[float] = None  # `time.monotonic()` of the latest Hexa update
+
+    async def _dispatch(self, event, route: HexaRoute, parsed: HexaMessage) -> None:
+        action = self._routes.get(route)
+        started = time.perf_counter()
+        try:
+            if action is not None:
+                await action(event, parsed)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stats[route].record(elapsed)
+            self._latency[route].observe(elapsed)
+
+    async def on_new_message(self, event: events.NewMessage.Event) -> None:
+        """Single `NewMessage` entry point for the Hexa bot chat."""
+        self.last_update = time.monotonic()
+        self.reactions.resolve_all(event)
+        parsed = parse_hexa_message(event.raw_text)
+        await self._dispatch(event, classify_new_message(parsed), parsed)
+
+    async def on_message_edited(self, event: events.MessageEdited.Event) -> None:
+        """Single `MessageEdited` entry point for the Hexa bot chat."""
+        self.last_update = time.monotonic()
+        self.reactions.resolve(event.id, event)
+        parsed = parse_hexa_message(event.raw_text)
+        await self._dispatch(event, classify_edited_message(parsed), parsed)
+
+    @property
+    def stats(self) -> Dict[HexaRoute, RouteStats]:
+        return self._stats
+
+    def generate_report(self) -> str:
+        """Formats the per-route counters and latency."""
+        lines = [
+            ROUTE_REPORT_LINE.format(
+                route=route.name.lower(),
+                count=stats.count,
+                average_ms=stats.average_seconds * 1000,
+                max_ms=stats.max_seconds * 1000
+            )
+            for route, stats in self._stats.items() if stats.count
+        ]
+        return "\n".join(lines) if lines else "  No Hexa updates routed yet."
+
+    @property
+    def event_handlers(self) -> List[Dict[str, Callable | events.NewMessage]]:
+        """Returns one handler per event type, both limited to what Hexa sends in its chat."""
+        return [
+            {'callback': self.on_new_message, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID, incoming=True)},
+            {'callback': self.on_message_edited, 'event': events.MessageEdited(chats=constants.HEXA_BOT_ID, incoming=True)},
+        ]
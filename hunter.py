@@ -1,19 +1,27 @@
 from __future__ import annotations
 
 import asyncio
-import regex
-from typing import TYPE_CHECKING, List, Dict, Callable, Optional, Tuple
+from collections import deque
+from typing import TYPE_CHECKING, Any, List, Dict, Callable, Optional, Set, Tuple
 from enum import Enum, auto
 import time
 
 from loguru import logger
 from telethon import events
-from telethon.errors import DataInvalidError, MessageIdInvalidError
+from telethon.errors import DataInvalidError, FloodWaitError, MessageIdInvalidError
 
 import constants
+import metrics
+from pacing import PacingScheduler
+from profiler import PROFILER
+from telemetry import DAY, TimeSeries
+from hexa_parser import HexaMessage
+from hexa_router import HexaEventRouter, HexaRoute
+from log_pipeline import sampled_logger
+from strategy import ATTACK, BattleRecord, configured_ball, get_battle_strategy, hp_band
 
 if TYPE_CHECKING:
-    from telethon.tl import BotCallbackAnswer, Message
+    from telethon.tl import BotCallbackAnswer
 
 TELEMETRY_REPORT = """
  ✨ Hunting Report 📊
@@ -50,6 +58,17 @@ POKEBALL_BUTTON_TEXT_MAP = {
     "Regular"
 }
 
+# Fields of the hunting history (see `telemetry.py`), and how `.hunt history` names them
+HISTORY_LABELS = {
+    "hunts": "hunts",
+    "encounters": "encounters",
+    "catches": "catches",
+    "fled": "fled",
+    "poke_dollars": "PD",
+}
+CAUGHT_BY_BALL = {ball: f"caught_{ball.lower()}" for ball in sorted(POKEBALL_BUTTON_TEXT_MAP)}
+HISTORY_FIELDS = (*HISTORY_LABELS, *CAUGHT_BY_BALL.values())
+
 
 class AutomationOrchestrator:
     """Manages automation lifecycle and state."""
@@ -84,12 +103,87 @@ class AutomationOrchestrator:
         """Returns automation status."""
         return self._is_active
 
+    def checkpoint(self) -> Dict[str, Any]:
+        return {'active': self._is_active, 'start_time': self._start_time}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self._is_active = bool(state.get('active'))
+        self._start_time = state.get('start_time') if self._is_active else None
+
     @property
     def start_time(self) -> Optional[float]:
         """Returns automation start time."""
         return self._start_time
 
 
+class HuntState(Enum):
+    IDLE = auto()
+    AWAITING_ENCOUNTER = auto()
+    IN_BATTLE = auto()
+    AWAITING_RESULT = auto()
+
+
+class HuntStateMachine:
+    """Tracks the outstanding /hunt of one account so it is never sent twice."""
+
+    __slots__ = ('_state', '_deadline', '_changed', '_concluded_message_ids')
+
+    def __init__(self):
+        self._state: HuntState = HuntState.IDLE
+        self._deadline: Optional[float] = None
+        self._changed = asyncio.Event()
+        self._concluded_message_ids: deque = deque(maxlen=16)
+
+    def transition(self, state: HuntState, timeout: Optional[float] = None) -> None:
+        """Moves to `state`, re-arming the deadline by which the next Hexa reply is expected."""
+        if state is not self._state:
+            sampled_logger.debug("Hunt state: {} -> {}", self._state.name, state.name)
+        self._state = state
+        self._deadline = time.monotonic() + timeout if timeout is not None else None
+        self._changed.set()
+
+    def begin_hunt(self, timeout: float) -> bool:
+        """Claims the right to send /hunt; fails while another hunt is in flight and not overdue."""
+        if self._state is not HuntState.IDLE and not self.expired:
+            return False
+        self.transition(HuntState.AWAITING_ENCOUNTER, timeout)
+        return True
+
+    def conclude(self, message_id: int) -> bool:
+        """Ends the hunt answered by `message_id`; False when that message already ended one."""
+        if message_id in self._concluded_message_ids:
+            return False
+        self._concluded_message_ids.append(message_id)
+        self.transition(HuntState.IDLE)
+        return True
+
+    def reset(self) -> None:
+        self.transition(HuntState.IDLE)
+
+    async def wait_for_change(self, timeout: Optional[float]) -> bool:
+        """Waits up to `timeout` seconds for a transition; returns False on timeout."""
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    @property
+    def state(self) -> HuntState:
+        return self._state
+
+    @property
+    def expired(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    @property
+    def seconds_until_deadline(self) -> Optional[float]:
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+
+
 class ActivityType(Enum):
     MESSAGE_SENT = auto()
     RESPONSE_RECEIVED = auto()
@@ -108,122 +202,109 @@ class ActivityMonitor:
     """Monitors and records hunting activities."""
 
     __slots__ = (
-        '_messages_sent',
-        '_responses_received',
-        '_responses_skipped',
-        '_successful_encounter',
-        '_unsuccessful_encounter',
-        '_skipped_encounter',
-        '_skipped_trainers',
-        '_switched_pokemon',
+        '_counts',
         '_poke_dollars_accrued',
         '_items_found',
-        '_pokeball_usage'
+        '_pokeball_usage',
+        '_activity_counters',
+        '_poke_dollars_counter'
     )
 
-    def __init__(self):
-        self._messages_sent: int = 0
-        self._responses_received: int = 0
-        self._responses_skipped: int = 0
-        self._successful_encounter: int = 0
-        self._unsuccessful_encounter: int = 0
-        self._skipped_encounter: int = 0
-        self._skipped_trainers: int = 0
-        self._switched_pokemon: int = 0
+    def __init__(self, account: str = 'default'):
+        self._counts: Dict[ActivityType, int] = dict.fromkeys(COUNTED_ACTIVITIES, 0)
         self._poke_dollars_accrued: int = 0
         self._items_found: list = []
         self._pokeball_usage: Dict[str, int] = {}
+        self._activity_counters = {
+            activity_type: metrics.HUNT_ACTIVITY.labels(account, activity_type.name.lower()) for activity_type in ActivityType
+        }
+        self._poke_dollars_counter = metrics.POKE_DOLLARS.labels(account)
 
     def record_activity(self, activity_type: ActivityType, value=None) -> None:
         """Records activity events, incrementing counters and handling values."""
         try:
-            if activity_type == ActivityType.MESSAGE_SENT:
-                self._messages_sent += 1
-            elif activity_type == ActivityType.RESPONSE_RECEIVED:
-                self._responses_received += 1
-            elif activity_type == ActivityType.RESPONSE_SKIPPED:
-                self._responses_skipped += 1
-            elif activity_type == ActivityType.SUCCESSFUL_ENCOUNTER:
-                self._successful_encounter += 1
-            elif activity_type == ActivityType.UNSUCCESSFUL_ENCOUNTER:
-                self._unsuccessful_encounter += 1
-            elif activity_type == ActivityType.SKIPPED_ENCOUNTER:
-                self._skipped_encounter += 1
-            elif activity_type == ActivityType.SKIPPED_TRAINER:
-                self._skipped_trainers += 1
-            elif activity_type == ActivityType.SWITCHED_POKEMON:
-                self._switched_pokemon += 1
-            elif activity_type == ActivityType.POKE_DOLLARS_ACCRUED:
-                if not isinstance(value, (int, float)):
-                    raise ValueError(f"Value for {activity_type.name} must be numeric.")
-                self._poke_dollars_accrued += int(value)
-            elif activity_type == ActivityType.ITEM_FOUND:
-                if not isinstance(value, str):
-                    raise ValueError(f"Value for {activity_type.name} must be a string (item name).")
-                self._items_found.append(value)
-            elif activity_type == ActivityType.POKEBALL_USED:
-                if not isinstance(value, str):
-                    raise ValueError(f"Value for {activity_type.name} must be a string (ball name).")
-                ball_name = value.strip()
-                if not ball_name:
-                    logger.warning(f"Empty pokeball name provided for recording.")
+            recorder = VALUE_RECORDERS.get(activity_type)
+            if recorder is not None:
+                if recorder(self, value) is False:
                     return
-                self._pokeball_usage[ball_name] = self._pokeball_usage.get(ball_name, 0) + 1
+            elif activity_type in self._counts:
+                self._counts[activity_type] += 1
             else:
                 raise ValueError(f'Invalid ActivityType: {activity_type.name}')
+            self._activity_counters[activity_type].inc()
         except ValueError as ve:
             logger.exception(f"Error recording activity {activity_type.name}: {ve}")
         except Exception as e:
             logger.exception(f"Unexpected error during activity recording for {activity_type.name}")
 
+    def _record_poke_dollars(self, value) -> None:
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"Value for {ActivityType.POKE_DOLLARS_ACCRUED.name} must be numeric.")
+        self._poke_dollars_accrued += int(value)
+        self._poke_dollars_counter.inc(int(value))
+
+    def _record_item(self, value) -> None:
+        if not isinstance(value, str):
+            raise ValueError(f"Value for {ActivityType.ITEM_FOUND.name} must be a string (item name).")
+        self._items_found.append(value)
+
+    def _record_pokeball(self, value) -> None:
+        if not isinstance(value, str):
+            raise ValueError(f"Value for {ActivityType.POKEBALL_USED.name} must be a string (ball name).")
+        ball_name = value.strip()
+        if not ball_name:
+            logger.warning(f"Empty pokeball name provided for recording.")
+            return False
+        self._pokeball_usage[ball_name] = self._pokeball_usage.get(ball_name, 0) + 1
+
 
     def reset_metrics(self) -> None:
-        """Resets all activity metrics."""
-        self._messages_sent = 0
-        self._responses_received = 0
-        self._responses_skipped = 0
-        self._successful_encounter = 0
-        self._unsuccessful_encounter = 0
-        self._skipped_encounter = 0
-        self._skipped_trainers = 0
-        self._switched_pokemon = 0
+        """Resets the report's activity metrics; the exported counters keep growing."""
+        self._counts = dict.fromkeys(COUNTED_ACTIVITIES, 0)
         self._poke_dollars_accrued = 0
         self._items_found = []
         self._pokeball_usage = {}
         logger.debug("Activity metrics reset.")
 
+    def checkpoint(self) -> Dict[str, Any]:
+        return {
+            'counts': {activity_type.name: count for activity_type, count in self._counts.items()},
+            'poke_dollars': self._poke_dollars_accrued,
+            'items': list(self._items_found),
+            'pokeballs': dict(self._pokeball_usage),
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Continues the report from a checkpoint; the exported counters start from zero in every process."""
+        for name, count in state.get('counts', {}).items():
+            activity_type = ActivityType.__members__.get(name)
+            if activity_type in self._counts:
+                self._counts[activity_type] = int(count)
+        self._poke_dollars_accrued = int(state.get('poke_dollars', 0))
+        self._items_found = list(state.get('items', []))
+        self._pokeball_usage = {name: int(count) for name, count in state.get('pokeballs', {}).items()}
+
+    def poke_dollars_per_hour(self, start_time: Optional[float]) -> float:
+        """PD earned per hour since `start_time`."""
+        if not start_time:
+            return 0.0
+        duration_seconds = time.time() - start_time
+        if duration_seconds > 0 and self._poke_dollars_accrued > 0:
+            return (self._poke_dollars_accrued / duration_seconds) * 3600
+        return 0.0
+
 
     def generate_telemetry_report(self, start_time: Optional[float]) -> str:
         """Generates formatted telemetry report with detailed metrics and calculations."""
-        report_lines = []
-
-        report_lines.append(
-            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["hunt_commands_sent"], value=self._messages_sent)
-        )
-        report_lines.append(
-            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["responses_processed"], value=self._responses_received)
-        )
-        report_lines.append(
-            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["responses_skipped"], value=self._responses_skipped)
-        )
-        report_lines.append(
-            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["successful_encounters"], value=self._successful_encounter)
-        )
-        report_lines.append(
-            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["unsuccessful_encounters"], value=self._unsuccessful_encounter)
-        )
-        report_lines.append(
-            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["skipped_encounters"], value=self._skipped_encounter)
-        )
-        report_lines.append(
-            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["skipped_trainers"], value=self._skipped_trainers)
-        )
-        report_lines.append(
-            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["pokemon_switched"], value=self._switched_pokemon)
-        )
+        counts = self._counts
+        report_lines = [
+            TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES[metric], value=counts[activity_type])
+            for activity_type, metric in REPORTED_COUNTS.items()
+        ]
 
-        if self._responses_received > 0:
-            encounter_rate = (self._successful_encounter / self._responses_received) * 100
+        responses_received = counts[ActivityType.RESPONSE_RECEIVED]
+        if responses_received > 0:
+            encounter_rate = (counts[ActivityType.SUCCESSFUL_ENCOUNTER] / responses_received) * 100
             report_lines.append(
                 TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["encounter_success_rate"], value=f"{encounter_rate:.2f}%")
             )
@@ -232,8 +313,9 @@ class ActivityMonitor:
                 TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["encounter_success_rate"], value="N/A")
             )
 
-        if self._messages_sent > 0:
-            response_skip_rate = (self._responses_skipped / self._messages_sent) * 100
+        messages_sent = counts[ActivityType.MESSAGE_SENT]
+        if messages_sent > 0:
+            response_skip_rate = (counts[ActivityType.RESPONSE_SKIPPED] / messages_sent) * 100
             report_lines.append(
                 TELEMETRY_REPORT_LINE.format(metric_name=METRIC_NAMES["response_skip_rate"], value=f"{response_skip_rate:.2f}%")
             )
@@ -266,59 +348,136 @@ class ActivityMonitor:
             minutes = int((duration_seconds % 3600) // 60)
             seconds = int(duration_seconds % 60)
             formatted_duration = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
-            if duration_seconds > 0 and self._poke_dollars_accrued > 0:
-                pd_per_hour = (self._poke_dollars_accrued / duration_seconds) * 3600
-            else:
-                pd_per_hour = 0.0
         else:
             formatted_duration = "N/A"
-            pd_per_hour = 0.0
 
 
         report_string = TELEMETRY_REPORT.format(
             report_lines="\n".join(report_lines),
             poke_dollars_accrued=self._poke_dollars_accrued,
             formatted_duration=formatted_duration,
-            pd_per_hour=pd_per_hour
+            pd_per_hour=self.poke_dollars_per_hour(start_time)
         )
         return report_string
 
 
+# Activities that only increment a counter, in report order, and those that carry a value.
+REPORTED_COUNTS = {
+    ActivityType.MESSAGE_SENT: "hunt_commands_sent",
+    ActivityType.RESPONSE_RECEIVED: "responses_processed",
+    ActivityType.RESPONSE_SKIPPED: "responses_skipped",
+    ActivityType.SUCCESSFUL_ENCOUNTER: "successful_encounters",
+    ActivityType.UNSUCCESSFUL_ENCOUNTER: "unsuccessful_encounters",
+    ActivityType.SKIPPED_ENCOUNTER: "skipped_encounters",
+    ActivityType.SKIPPED_TRAINER: "skipped_trainers",
+    ActivityType.SWITCHED_POKEMON: "pokemon_switched",
+}
+COUNTED_ACTIVITIES = tuple(REPORTED_COUNTS)
+VALUE_RECORDERS = {
+    ActivityType.POKE_DOLLARS_ACCRUED: ActivityMonitor._record_poke_dollars,
+    ActivityType.ITEM_FOUND: ActivityMonitor._record_item,
+    ActivityType.POKEBALL_USED: ActivityMonitor._record_pokeball,
+}
+
+
 
 class PokemonHuntingEngine:
     """Engine for Pokemon hunting automation."""
 
     __slots__ = (
         '_client',
+        '_pacer',
         'automation_orchestrator',
-        'activity_monitor'
+        'activity_monitor',
+        'hunt_state',
+        'router',
+        'history',
+        'strategy',
+        '_battle',
+        '_last_battle_ended',
+        '_tasks'
     )
 
-    def __init__(self, client) -> None:
+    def __init__(self, client, pacer: PacingScheduler) -> None:
         """Initializes the hunting engine."""
         self._client = client
+        self._pacer = pacer
         self.automation_orchestrator = AutomationOrchestrator()
-        self.activity_monitor = ActivityMonitor()
+        account = metrics.account_label(client)
+        self.activity_monitor = ActivityMonitor(account)
+        self.hunt_state = HuntStateMachine()
+        self.history = TimeSeries(HISTORY_FIELDS)
+        self.strategy = get_battle_strategy()
+        self._battle: Optional[BattleRecord] = None
+        self._last_battle_ended: Optional[float] = None  # Monotonic time the previous battle ended
+        self._tasks: List[asyncio.Task] = []
+        metrics.POKE_DOLLARS_PER_HOUR.labels(account).set_function(
+            lambda: self.activity_monitor.poke_dollars_per_hour(self.automation_orchestrator.start_time)
+        )
+        self.router = HexaEventRouter(account, {
+            HexaRoute.DAILY_LIMIT: self.handle_daily_quota_exceeded,
+            HexaRoute.ENCOUNTER: self.hunt_or_pass,
+            HexaRoute.BATTLE_START: self.battlefirst,
+            HexaRoute.TRAINER_OR_ITEM: self.skip,
+            HexaRoute.SWITCH_REQUEST: self.pokeSwitch,
+            HexaRoute.BATTLE_OVER: self.handle_after_battle,
+            HexaRoute.BATTLE_TURN: self.battle,
+        })
 
 
     def start(self) -> None:
         """Starts the hunting engine and periodic tasks."""
         logger.info('Initializing Pokemon Hunting Engine...')
-        asyncio.create_task(self._periodically_transmit_hunt_commands())
-        logger.info(f'[{self.__class__.__name__}] Created task: `_periodically_transmit_hunt_commands`')
+        self.start_tasks()
         self._register_event_handlers()
         logger.info('Pokemon Hunting Engine started.')
 
 
+    def checkpoint(self) -> Optional[Dict[str, Any]]:
+        """State kept across restarts (see `state_store.py`); nothing while hunting is off and has no history."""
+        history = self.history.checkpoint()
+        if not self.automation_orchestrator.is_automation_active and history is None:
+            return None
+        return {
+            'automation': self.automation_orchestrator.checkpoint(),
+            'activity': self.activity_monitor.checkpoint(),
+            'history': history,
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Resumes hunting from a checkpoint; the deadline watchdog sends the next /hunt."""
+        self.automation_orchestrator.restore(state.get('automation', {}))
+        self.activity_monitor.restore(state.get('activity', {}))
+        self.history.restore(state.get('history') or {})
+
+    def generate_history_report(self) -> str:
+        """Recent windows and trends of the hunting history, with catches per ball over the last day."""
+        report = self.history.generate_report('📈 Hunting history', HISTORY_LABELS, 'poke_dollars')
+        totals = self.history.totals(DAY)
+        caught = ', '.join(f'{ball} {totals[field]}' for ball, field in CAUGHT_BY_BALL.items() if totals[field])
+        return f'{report}\n  Catches per ball (24h): {caught or "None"}'
+
+
+    def start_tasks(self) -> None:
+        """Starts the background tasks; called again after a reconnect."""
+        self._tasks.append(asyncio.create_task(self._watch_hunt_deadlines()))
+        logger.info(f'[{self.__class__.__name__}] Created task: `_watch_hunt_deadlines`')
+
+
+    async def stop_tasks(self) -> None:
+        """Cancels the background tasks and waits for them to finish, e.g. before a reconnect."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
     def _register_event_handlers(self) -> None:
         """Registers event handlers to the client."""
         for handler in self.event_handlers:
             callback = handler.get('callback')
             event = handler.get('event')
-            self._client.add_event_handler(
-                callback=callback, event=event
-            )
+            PROFILER.add_event_handler(self._client, callback, event)
             logger.info(f'[{self.__class__.__name__}] Registered event handler: `{callback.__name__}`')
 
 
@@ -332,67 +491,107 @@ class PokemonHuntingEngine:
         return health_percentage
 
 
-    async def _reload_message(self, event) -> Optional[Message]:
-        try:
-            await asyncio.sleep(1)
-            msg = await self._client.get_messages(constants.HEXA_BOT_ID, ids=event.id)
-        except ValueError:
-            return
-        return msg
+    async def _measured_click(self, event, *args, **kwargs) -> Optional[BotCallbackAnswer]:
+        """Clicks a button, feeding the round trip to the pacer; the caller waits for the slot."""
+        async with self._pacer.measure():
+            return await event.click(*args, **kwargs)
+
+    async def _click_button(self, event, i=None, j=None, text=None) -> Optional[BotCallbackAnswer]:
+        """Clicks a button and returns as soon as Hexa reacts to it.
 
-    async def _click_button(self, event, i=None, j=None, text=None, data=None) -> Optional[BotCallbackAnswer]:
+        Hexa reacts by editing the clicked message, sending a new message or answering
+        the callback with a text. The click is repeated only when none of these happens
+        within `CLICK_CONFIRM_TIMEOUT_SECONDS`, or when Hexa asks to wait.
+        """
         response = None
-        count = 0
-        while count <= 5:
-            count += 1
-            await asyncio.sleep(constants.COOLDOWN())
-            response = await event.click(i=i, j=j, text=text, data=None)
-            if not response:
-               await asyncio.sleep(1)
-               continue
-
-            response_text = str(response.message).lower() if response and response.message else ""
-            if any(
-                   substring in response_text for substring
-                   in ["none", "fled", "caught", "in battle", "catching", "failed", "choose", "go, "]
-               ):
-               break
-            elif any(
-                   substring in response_text for substring
-                   in ["wait", "try again"]
-               ):
-               await asyncio.sleep(1)
-            else:
-               logger.debug(response)
+        loop = asyncio.get_running_loop()
+        for _ in range(constants.CLICK_MAX_ATTEMPTS):
+            await self._pacer.wait()
+            reaction = self.router.reactions.expect(event.id)
+            click = asyncio.ensure_future(self._measured_click(event, i=i, j=j, text=text))
+            deadline = loop.time() + constants.CLICK_CONFIRM_TIMEOUT_SECONDS
+            try:
+                await asyncio.wait({reaction, click}, timeout=constants.CLICK_CONFIRM_TIMEOUT_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+                if click.done():
+                    try:
+                        response = click.result()
+                    except FloodWaitError:
+                        continue  # Recorded by the pacer, whose `wait` sits it out before the next click
+                    response_text = response.message.lower() if response and response.message else ''
+                    if 'wait' in response_text or 'try again' in response_text:
+                        self._pacer.observe_flood(1)
+                        continue
+                    if response_text:
+                        return response
+                    await asyncio.wait({reaction}, timeout=max(0.0, deadline - loop.time()))
+                if reaction.done():
+                    return response
+                sampled_logger.debug("[{}] No reaction to click on message {}, retrying.", self.__class__.__name__, event.id)
+            finally:
+                self.router.reactions.discard(event.id, reaction)
+                if not click.done():
+                    # The edit arrived before the callback answer; let the request finish on its own.
+                    click.add_done_callback(lambda task: task.cancelled() or task.exception())
         return response
 
+    @staticmethod
+    def _button_texts(event) -> Set[str]:
+        """Returns the texts of the inline buttons currently attached to a message."""
+        markup = event.reply_markup
+        if markup is None or not hasattr(markup, 'rows'):
+            return set()
+        return {button.text.strip() for row in markup.rows for button in row.buttons}
+
     async def _transmit_hunt_command(self) -> None:
-        """Transmits the /hunt command, handling potential connection issues."""
+        """Transmits the /hunt command unless one is already in flight, handling potential connection issues."""
         try:
-            await asyncio.sleep(constants.COOLDOWN())
-            if self.automation_orchestrator.is_automation_active:
+            await self._pacer.wait()
+            if not self.automation_orchestrator.is_automation_active:
+                return
+            if not self.hunt_state.begin_hunt(constants.HUNT_REPLY_TIMEOUT_SECONDS):
+                sampled_logger.debug("/hunt already in flight ({}), not sending another.", self.hunt_state.state.name)
+                return
+            async with self._pacer.measure():
                 await self._client.send_message(entity=constants.HEXA_BOT_ID, message='/hunt')
-                self.activity_monitor.record_activity(activity_type=ActivityType.MESSAGE_SENT)
+            self.activity_monitor.record_activity(activity_type=ActivityType.MESSAGE_SENT)
+            self.history.add('hunts')
         except ConnectionError as ce:
+            self.hunt_state.reset()
             logger.warning(f"Connection error when sending /hunt command: {ce}")
+        except FloodWaitError as e:
+            self.hunt_state.reset()  # The deadline watchdog sends the next /hunt once the pacer's wait is over
+            logger.warning(f"Flood wait of {e.seconds}s when sending /hunt command.")
         except Exception as e:
+            self.hunt_state.reset()
             logger.exception(f"Unexpected error during /hunt command transmission: {e}")
 
 
-    async def _periodically_transmit_hunt_commands(self) -> None:
-        """Periodically sends hunt commands while automation is active, with error handling."""
+    async def _watch_hunt_deadlines(self) -> None:
+        """Re-sends /hunt when the expected Hexa reply does not arrive before the state's deadline.
+
+        While idle, a hunt is kicked off every `PERIODICALLY_HUNT_SECONDS`.
+        """
         while self._client.is_connected():
             try:
-                await asyncio.sleep(constants.PERIODICALLY_HUNT_SECONDS)
-                if self.automation_orchestrator.is_automation_active:
+                timeout = self.hunt_state.seconds_until_deadline
+                if timeout is None:
+                    timeout = constants.PERIODICALLY_HUNT_SECONDS
+                if await self.hunt_state.wait_for_change(timeout):
+                    continue
+                if not self.automation_orchestrator.is_automation_active:
+                    continue
+                if self.hunt_state.expired:
+                    logger.warning(f"No Hexa reply while {self.hunt_state.state.name}, recovering with a new /hunt.")
+                    self.hunt_state.reset()
+                if self.hunt_state.state is HuntState.IDLE:
                     await self._transmit_hunt_command()
             except asyncio.CancelledError:
-                logger.info("Periodic hunt command task cancelled.")
+                logger.info("Hunt deadline watchdog cancelled.")
                 break
             except ConnectionError:
-                logger.warning("Connection error during periodic hunt command transmission. Retrying...")
+                logger.warning("Connection error in hunt deadline watchdog. Retrying...")
             except Exception as e:
-                logger.exception(f"Unexpected error in periodic hunt command task: {e}")
+                logger.exception(f"Unexpected error in hunt deadline watchdog: {e}")
 
 
     async def handle_automation_control_request(self, event: events.NewMessage.Event) -> None:
@@ -411,10 +610,16 @@ class PokemonHuntingEngine:
             telemetry_report = self.activity_monitor.generate_telemetry_report(self.automation_orchestrator.start_time)
             message = f'Automated hunting has been deactivated.\n{telemetry_report}'
             self.automation_orchestrator.deactivate_automation(self.activity_monitor)
+            self.hunt_state.reset()
             await event.edit(message)
         elif action == 'stats':
             telemetry_report = self.activity_monitor.generate_telemetry_report(self.automation_orchestrator.start_time)
-            await event.edit(telemetry_report)
+            await event.edit(
+                f'{telemetry_report}\n{self.strategy.generate_report()}\n{self._pacer.generate_report()}\n'
+                f'⏱️ Hexa routes:\n{self.router.generate_report()}'
+            )
+        elif action == 'history':
+            await event.edit(self.generate_history_report())
         else:
             await event.respond("Invalid action. Use: `.hunt on|off|stats`")
 
@@ -425,184 +630,170 @@ class PokemonHuntingEngine:
         await event.edit(f"Pokèmon List: {pokemon}")
 
 
-    async def handle_daily_quota_exceeded(self, event: events.NewMessage.Event) -> None:
+    async def handle_daily_quota_exceeded(self, event: events.NewMessage.Event, parsed: HexaMessage) -> None:
         """Handles daily quota exceeded messages, deactivating automation."""
-        substring = 'daily hunt limit reached'
-        if substring in event.raw_text.lower() and self.automation_orchestrator.is_automation_active:
+        if self.automation_orchestrator.is_automation_active:
             self.activity_monitor.record_activity(activity_type=ActivityType.RESPONSE_RECEIVED)
             warning = 'Daily hunt quota reached. Automated hunting deactivated.'
             telemetry_report = self.activity_monitor.generate_telemetry_report(self.automation_orchestrator.start_time)
             message = f"<a href='tg://user?id={self._client.me.id}'>{self._client.me.first_name}</a> {warning}\n{telemetry_report}"
             await self._client.send_message(entity=constants.CHAT_ID, message=message)
             self.automation_orchestrator.deactivate_automation(self.activity_monitor)
+            self.hunt_state.reset()
             logger.warning(f"[{self.__class__.__name__}] @{self._client.me.username}'s {warning}")
 
 
 
-    async def hunt_or_pass(self, event: events.NewMessage.Event) -> None:
+    async def hunt_or_pass(self, event: events.NewMessage.Event, parsed: HexaMessage) -> None:
         """Handles wild Pokemon encounters, deciding to hunt or pass based on config."""
         if not self.automation_orchestrator.is_automation_active:
             return
 
-        if ('shiny' in event.raw_text.lower() and
-                event.raw_text.lower().endswith('found!')):
+        if parsed.shiny:
             self.activity_monitor.record_activity(activity_type=ActivityType.RESPONSE_RECEIVED)
             warning = 'Shiny Pokèmon found! Automated hunting deactivated.'
-            telemetry_report = self.activity_monitor.generate_telemetry_report()
+            telemetry_report = self.activity_monitor.generate_telemetry_report(self.automation_orchestrator.start_time)
             message = f"<a href='tg://user?id={self._client.me.id}'>{self._client.me.first_name}</a> {warning}\n{telemetry_report}"
             await self._client.send_message(entity=constants.CHAT_ID, message=message)
             self.automation_orchestrator.deactivate_automation(self.activity_monitor)
+            self.hunt_state.reset()
             logger.warning(f"[{self.__class__.__name__}] @{self._client.me.username}'s {warning}")
 
-        elif "A wild" in event.raw_text:
+        elif parsed.encounter:
             self.activity_monitor.record_activity(activity_type=ActivityType.RESPONSE_RECEIVED)
-            name_match = regex.search(r"A wild (.+?) \(", event.raw_text)
-            pok_name = name_match.group(1).strip()
-            logger.debug(f"Wild Pokemon encountered: {pok_name}")
-            for ball_name in POKEBALL_BUTTON_TEXT_MAP:
-                if pok_name in getattr(constants, f'{ball_name.upper()}_BALL', []):
-                    await asyncio.sleep(constants.COOLDOWN())
-                    try:
-                        await self._click_button(event=event, i=0, j=0)
-                        break
-                    except (DataInvalidError, MessageIdInvalidError) as e:
-                        logger.warning(f'Failed to click button for {pok_name}: {e}')
-                    except Exception as e:
-                        logger.exception(f"Unexpected error clicking button for {pok_name}: {e}")
+            self.history.add('encounters')
+            pok_name = parsed.name
+            sampled_logger.debug("Wild Pokemon encountered: {}", pok_name)
+            if configured_ball(pok_name) is not None:
+                self.hunt_state.transition(HuntState.IN_BATTLE, constants.BATTLE_TIMEOUT_SECONDS)
+                try:
+                    await self._click_button(event=event, i=0, j=0)
+                except (DataInvalidError, MessageIdInvalidError) as e:
+                    logger.warning(f'Failed to click button for {pok_name}: {e}')
+                except Exception as e:
+                    logger.exception(f"Unexpected error clicking button for {pok_name}: {e}")
             else:
                 self.activity_monitor.record_activity(activity_type=ActivityType.SKIPPED_ENCOUNTER)
-                await self._transmit_hunt_command()
+                if self.hunt_state.conclude(event.id):
+                    await self._transmit_hunt_command()
 
     
-    async def battlefirst(self, event):
-        substring = 'Battle begins!'
-        if substring in event.raw_text and self.automation_orchestrator.is_automation_active:
-          wild_pokemon_name_match = regex.search(r"Wild ([^\[]+?)\s*\[.*\]\nLv\. \d+\s+•\s+HP \d+/\d+", event.raw_text)
-          
-          if wild_pokemon_name_match:
-            pok_name = wild_pokemon_name_match.group(1).strip()
-            
-            wild_pokemon_hp_match = regex.search(r"Wild .* \[.*\]\nLv\. \d+\s+•\s+HP (\d+)/(\d+)", event.raw_text)
-
-            if wild_pokemon_hp_match:
-                wild_max_hp = int(wild_pokemon_hp_match.group(2))
-                if wild_max_hp <= 90:
-                    logger.debug(f"{pok_name} is low level (HP: {wild_max_hp}), using Poke Balls directly.")
-                    await asyncio.sleep(constants.COOLDOWN())
-                    try:
-                        await event.click(text="Poke Balls")
-                        logger.info('clicked on btn poke balls')
-                    except (DataInvalidError, MessageIdInvalidError) as e:
-                        logger.warning(f'Failed to click "Poke Balls" for {pok_name}: {e}')
-                    except Exception as e:
-                        logger.exception(f'Unexpected error clicking "Poke Balls" for {pok_name}: {e}')
-                else:
-                    await asyncio.sleep(2)
-                    try:
-                        await event.click(0, 0)
-                    except (DataInvalidError, MessageIdInvalidError) as e:
-                        logger.warning(f'Failed to click first option for high-level {pok_name}: {e}')
-                    except Exception as e:
-                        logger.exception(f'Unexpected error clicking first option for high-level {pok_name}: {e}')
+    async def battlefirst(self, event: events.NewMessage.Event, parsed: HexaMessage) -> None:
+        """Plays the first turn of a battle."""
+        if self.automation_orchestrator.is_automation_active:
+            self.hunt_state.transition(HuntState.IN_BATTLE, constants.BATTLE_TIMEOUT_SECONDS)
+            if parsed.in_battle:
+                await self._play_turn(event, parsed)
+            else:
+                logger.warning(f"Wild Pokemon HP info not found in battle message for {parsed.name}.")
+
+    async def battle(self, event: events.MessageEdited.Event, parsed: HexaMessage) -> None:
+        """Plays one battle turn per edit: the click's own edit brings the next turn."""
+        if self.automation_orchestrator.is_automation_active:
+            self.hunt_state.transition(HuntState.IN_BATTLE, constants.BATTLE_TIMEOUT_SECONDS)
+            if parsed.name is None:
+                sampled_logger.warning("Wild Pokemon name not found in the battle description.")
+            elif not parsed.in_battle:
+                sampled_logger.warning("Wild Pokemon {} HP not found in the battle description.", parsed.name)
             else:
-                logger.warning(f"Wild Pokemon HP info not found in battle message for {pok_name}.")
-
-    async def battle(self, event):
-        substring = 'Wild'
-        if substring in event.raw_text and self.automation_orchestrator.is_automation_active:
-            wild_pokemon_name_match = regex.search(r"Wild ([^\[]+?)\s*\[.*\]\nLv\. \d+\s+•\s+HP \d+/\d+", event.raw_text)
-            if wild_pokemon_name_match:
-                pok_name = wild_pokemon_name_match.group(1).strip()
-                wild_pokemon_hp_match = regex.search(r"Wild .* \[.*\]\nLv\. \d+  •  HP (\d+)/(\d+)", event.raw_text)
-                if wild_pokemon_hp_match:
-                    wild_max_hp = int(wild_pokemon_hp_match.group(2))
-                    wild_current_hp = int(wild_pokemon_hp_match.group(1))
-                    wild_health_percentage = (wild_current_hp / wild_max_hp) * 100
-
-                    if wild_current_hp > 90:
-                        await asyncio.sleep(1)
-                        try:
-                        # Click the first option 5 times
-                            for _ in range(5):
-                                await event.click(0, 0)
-                                await asyncio.sleep(1)  # Add a small delay between clicks
-                        except Exception as e:
-                            if not isinstance(e, MessageIdInvalidError):  # Suppress MessageIdInvalidError
-                                logger.warning(f'Failed to click first option for high-level {pok_name}: {e}')
-
-                    if wild_current_hp <= 90:
-                        await asyncio.sleep(1)
-                        try:
-                            # Click "Poke Balls" 5 times
-                            for _ in range(5):
-                                await event.click(text="Poke Balls")
-                                await asyncio.sleep(1)  # Add a small delay between clicks
-
-                            if pok_name in constants.REGULAR_BALL:
-                                await asyncio.sleep(1)
-                                # Click "Regular" 5 times
-                                for _ in range(5):
-                                    await event.click(text="Regular")
-                                    await asyncio.sleep(1)  # Add a small delay between clicks
-
-                            elif pok_name in constants.REPEAT_BALL:
-                                await asyncio.sleep(1)
-                                # Click "Repeat" 5 times
-                                for _ in range(5):
-                                    await event.click(text="Repeat")
-                                    await asyncio.sleep(1)  # Add a small delay between clicks
-
-                        except Exception as e:
-                            if not isinstance(e, MessageIdInvalidError):  # Suppress MessageIdInvalidError
-                                logger.exception(f"Failed to click buttons for {pok_name} with low health: {e}")
-
-                    logger.info(f"{pok_name} health percentage: {wild_health_percentage}%")
-                else:
-                    logger.info(f"Wild Pokemon {pok_name} HP not found in the battle description.")
+                await self._play_turn(event, parsed)
+
+    async def _play_turn(self, event, parsed: HexaMessage) -> None:
+        """Takes the action the battle strategy picks, opening the menu it is on first.
+
+        A click that only opens a menu leaves the action planned, and the edit
+        showing the menu carries it out.
+        """
+        battle = self._battle
+        if battle is None or battle.message_id != event.id:
+            search_seconds = time.monotonic() - self._last_battle_ended if self._last_battle_ended is not None else None
+            battle = self._battle = BattleRecord(parsed.name, parsed.max_hp, event.id, search_seconds)
+
+        buttons = self._button_texts(event)
+        ball_menu = not buttons.isdisjoint(POKEBALL_BUTTON_TEXT_MAP)
+        action = battle.planned or self.strategy.choose(parsed.name, parsed.hp, parsed.max_hp, buttons if ball_menu else None)
+        battle.planned = None
+        if action != ATTACK and action not in buttons and "Poke Balls" not in buttons:
+            # A plan or exploration pick this menu cannot play: choose again among what it offers
+            action = self.strategy.choose(parsed.name, parsed.hp, parsed.max_hp, buttons)
+            if action != ATTACK and action not in buttons:
+                ball = configured_ball(parsed.name)
+                action = ball if ball in buttons else ATTACK
+        sampled_logger.debug("{} at {}/{} HP: {}", parsed.name, parsed.hp, parsed.max_hp, action)
+
+        if action == ATTACK:
+            if ball_menu:
+                battle.planned, click = action, {'text': '🔙'}
             else:
-                logger.info("Wild Pokemon name not found in the battle description.")
+                battle.decide(hp_band(parsed.hp, parsed.max_hp), action)
+                click = {'i': 0, 'j': 0}
+        elif action in buttons:
+            battle.decide(hp_band(parsed.hp, parsed.max_hp), action)
+            self.activity_monitor.record_activity(activity_type=ActivityType.POKEBALL_USED, value=action)
+            # The result edit can arrive before the click returns.
+            self.hunt_state.transition(HuntState.AWAITING_RESULT, constants.BATTLE_TIMEOUT_SECONDS)
+            click = {'text': action}
+        else:
+            battle.planned, click = action, {'text': "Poke Balls"}
+
+        try:
+            await self._click_button(event=event, **click)
+        except MessageIdInvalidError:
+            pass  # The battle is already over
+        except DataInvalidError as e:
+            logger.warning(f'Failed to play `{action}` against {parsed.name}: {e}')
+        except Exception as e:
+            logger.exception(f"Unexpected error playing `{action}` against {parsed.name}: {e}")
 
-   
-    async def handle_after_battle(self, event: events.MessageEdited.Event) -> None:
-        """Handles messages indicating encounter skipped (fled, caught, etc.), and records Pokeball usage on catch."""
+    async def handle_after_battle(self, event: events.MessageEdited.Event, parsed: HexaMessage) -> None:
+        """Handles messages indicating encounter skipped (fled, caught, etc.), and teaches the battle's outcome to the strategy."""
         if not self.automation_orchestrator.is_automation_active:
             return
-
-        if any(
-              substring in event.raw_text for substring
-              in ["fled", "💵", "You caught"]
-           ):
-            pd_match = regex.search(r"\+(\d+) 💵", event.raw_text)
-            if pd_match:
-                pd = pd_match.group(1)
-                self.activity_monitor.record_activity(activity_type=ActivityType.POKE_DOLLARS_ACCRUED, value=int(pd))
-            await self._transmit_hunt_command()
-  
-    async def skip(self, event: events.NewMessage.Event) -> None:
+        if not self.hunt_state.conclude(event.id):
+            return  # Another edit of this battle already ended it
+
+        battle, self._battle = self._battle, None
+        if parsed.caught:
+            self.history.add('catches')
+            self.activity_monitor.record_activity(activity_type=ActivityType.SUCCESSFUL_ENCOUNTER)
+            if battle is not None and battle.last_action in CAUGHT_BY_BALL:
+                self.history.add(CAUGHT_BY_BALL[battle.last_action])
+        elif parsed.fled:
+            self.history.add('fled')
+            self.activity_monitor.record_activity(activity_type=ActivityType.UNSUCCESSFUL_ENCOUNTER)
+        if parsed.pokedollars is not None:
+            self.activity_monitor.record_activity(activity_type=ActivityType.POKE_DOLLARS_ACCRUED, value=parsed.pokedollars)
+            self.history.add('poke_dollars', parsed.pokedollars)
+        self._last_battle_ended = time.monotonic()
+        await self._transmit_hunt_command()
+        if battle is not None:
+            outcome = 'caught' if parsed.caught else 'fled' if parsed.fled else 'fainted' if parsed.pokedollars else 'ended'
+            battle.finish(outcome, parsed.pokedollars or 0)
+            await self.strategy.record(battle)
+
+    async def skip(self, event: events.NewMessage.Event, parsed: HexaMessage) -> None:
         """Handles trainer encounter skip."""
         if not self.automation_orchestrator.is_automation_active:
             return
 
-        trainer_match = regex.search(r"expert trainer", event.raw_text.lower())
-        tm_match = regex.search(r"TM(\d+) 💿 found!", event.raw_text)
-        stone_match = regex.search(r"(.+) mega stone found!", event.raw_text.lower())
+        if not self.hunt_state.conclude(event.id):
+            return
 
-        if trainer_match:
+        if parsed.trainer:
             self.activity_monitor.record_activity(activity_type=ActivityType.SKIPPED_TRAINER)
             await self._transmit_hunt_command()
-        elif tm_match:
-            tm = tm_match.group(1)
-            self.activity_monitor.record_activity(activity_type=ActivityType.ITEM_FOUND, value=f"TM{tm}")
+        elif parsed.tm:
+            self.activity_monitor.record_activity(activity_type=ActivityType.ITEM_FOUND, value=parsed.tm)
             await self._transmit_hunt_command()
-        elif stone_match:
-            stone = stone_match.group(1)
+        elif parsed.mega_stone:
+            stone = parsed.mega_stone
             self.activity_monitor.record_activity(activity_type=ActivityType.ITEM_FOUND, value=f"{stone.capitalize()} stone")
             await self._transmit_hunt_command()
 
-    async def pokeSwitch(self, event: events.MessageEdited.Event) -> None:
+    async def pokeSwitch(self, event: events.MessageEdited.Event, parsed: HexaMessage) -> None:
         """Handles Pokemon switch requests during battle."""
-        substring = 'Choose your next pokemon.'
-        if substring in event.raw_text and self.automation_orchestrator.is_automation_active:
+        if self.automation_orchestrator.is_automation_active:
+            self.hunt_state.transition(HuntState.IN_BATTLE, constants.BATTLE_TIMEOUT_SECONDS)
             self.activity_monitor.record_activity(activity_type=ActivityType.SWITCHED_POKEMON)
             buttons_to_click: List[str] = []
             for row in event.reply_markup.rows:
@@ -616,7 +807,7 @@ class PokemonHuntingEngine:
                 await event.reply(message=warning)
                 return
             button_clicked = buttons_to_click[0]
-            logger.debug(f"Switching to Pokemon: {button_clicked}")
+            sampled_logger.debug("Switching to Pokemon: {}", button_clicked)
             try:
                 await self._click_button(event=event, text=button_clicked)
             except (DataInvalidError, MessageIdInvalidError) as e:
@@ -627,12 +818,4 @@ class PokemonHuntingEngine:
     @property
     def event_handlers(self) -> List[Dict[str, Callable | events.NewMessage]]:
         """Returns a list of event handler definitions."""
-        return [
-            {'callback': self.handle_daily_quota_exceeded, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.hunt_or_pass, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.battlefirst, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.battle, 'event': events.MessageEdited(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.handle_after_battle, 'event': events.MessageEdited(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.skip, 'event': events.NewMessage(chats=constants.HEXA_BOT_ID)},
-            {'callback': self.pokeSwitch, 'event': events.MessageEdited(chats=constants.HEXA_BOT_ID)}
-        ]
+        return self.router.event_handlers
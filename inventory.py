@@ -0,0 +1,299 @@
+"""The account's Pokémon collection as listed by Hexa, and rules selecting which copies to release.
+
+`parse_inventory_page` reads one page of Hexa's collection listing:
+
+    Your Pokémon (page 2/7)
+    21. Pikachu Lv. 23 • IV 78%
+    22. Charmander ✨ Lv. 5 • IV 41.5%
+
+A scan pages through the listing once (see `release.py`) and indexes every copy
+in an `Inventory`, best copy of each species first. A release rule is a boolean
+expression over one copy, e.g.
+
+    duplicate and level < 10 and not team
+
+using `name`, `level`, `iv`, `shiny`, `count` (copies of the species), `rank`
+(1 for the best copy), `best` (rank 1), `duplicate` (not the best) and `team`
+(listed in `constants.POKEMON_TEAM`), with `and`, `or`, `not`, comparisons and
+`in (...)`. Rules are parsed with `ast` into closures; nothing is `eval`ed.
+`Inventory.plan` turns a rule into a `ReleasePlan` of (name, level) orders,
+leaving out copies Hexa's release buttons could not tell from a kept copy.
+"""
+from __future__ import annotations
+
+import ast
+import operator
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import regex
+
+import constants
+
+INVENTORY_PAGE_REGEX = regex.compile(r'page\s*(?P<page>\d+)\s*/\s*(?P<pages>\d+)', regex.IGNORECASE)
+INVENTORY_ENTRY_REGEX = regex.compile(
+    r'^\s*(?:(?P<index>\d+)[.)]\s*)?(?P<name>[^\n\d•|✨][^\n•|✨]*?)\s*(?P<shiny>✨)?\s*[•|-]?\s*Lv\.?\s*(?P<level>\d+)'
+    r'(?:[^\n]*?IVs?:?\s*(?P<iv>\d+(?:\.\d+)?)\s*%)?',
+    regex.MULTILINE
+)
+
+RULE_FIELDS = ('name', 'level', 'iv', 'shiny', 'count', 'rank', 'best', 'duplicate', 'team')
+FIELD_KINDS = {
+    'name': 'text', 'level': 'number', 'iv': 'number', 'shiny': 'bool', 'count': 'number', 'rank': 'number',
+    'best': 'bool', 'duplicate': 'bool', 'team': 'bool',
+}
+ORDERINGS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+COMPARISONS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b,
+}
+
+ReleaseOrder = Tuple[str, Optional[int]]  # (lowercase name, level); no level releases whichever copy Hexa lists first
+
+
+class OwnedPokemon(NamedTuple):
+    name: str  # Lowercase
+    level: int
+    iv: Optional[float] = None
+    shiny: bool = False
+
+
+class InventoryPage(NamedTuple):
+    page: int
+    pages: int
+    entries: List[Tuple[Optional[int], OwnedPokemon]]  # (listing index, copy)
+
+
+def parse_inventory_page(text: str) -> Optional[InventoryPage]:
+    """One page of the collection listing, or None if `text` is not one."""
+    header = INVENTORY_PAGE_REGEX.search(text)
+    if header is None:
+        return None
+    entries = []
+    for match in INVENTORY_ENTRY_REGEX.finditer(text, header.end()):
+        iv = match.group('iv')
+        entries.append((
+            int(match.group('index')) if match.group('index') else None,
+            OwnedPokemon(match.group('name').strip().lower(), int(match.group('level')), float(iv) if iv else None,
+                         match.group('shiny') is not None),
+        ))
+    return InventoryPage(int(header.group('page')), int(header.group('pages')), entries)
+
+
+def _quality(pokemon: OwnedPokemon) -> Tuple:
+    """Sort key putting the best copy first: shiny, then IV, then level."""
+    return (not pokemon.shiny, -(pokemon.iv if pokemon.iv is not None else -1.0), -pokemon.level)
+
+
+class Inventory:
+    """Owned Pokémon by species, best copy first."""
+
+    __slots__ = ('species', 'scanned_at', 'pages')
+
+    def __init__(self, pokemon: Iterable[OwnedPokemon] = (), pages: int = 0) -> None:
+        self.species: Dict[str, List[OwnedPokemon]] = {}
+        for copy in pokemon:
+            self.species.setdefault(copy.name, []).append(copy)
+        for copies in self.species.values():
+            copies.sort(key=_quality)
+        self.scanned_at = time.time()
+        self.pages = pages
+
+    def __len__(self) -> int:
+        return sum(len(copies) for copies in self.species.values())
+
+    @property
+    def duplicates(self) -> int:
+        return sum(len(copies) - 1 for copies in self.species.values())
+
+    def remove(self, name: str, level: Optional[int]) -> None:
+        """Forgets a released copy: the worst one of that level, or the first listed without a level."""
+        copies = self.species.get(name)
+        if not copies:
+            return
+        matching = [index for index, copy in enumerate(copies) if level is None or copy.level == level]
+        if matching:
+            del copies[matching[-1] if level is not None else 0]
+        if not copies:
+            del self.species[name]
+
+    def select(self, rule: Callable[[Dict], bool]) -> List[OwnedPokemon]:
+        """The copies matching `rule`, by species."""
+        team = {name.lower() for name in constants.POKEMON_TEAM}
+        selected = []
+        for name, copies in self.species.items():
+            for rank, copy in enumerate(copies, 1):
+                fields = {
+                    'name': name, 'level': copy.level, 'iv': copy.iv, 'shiny': copy.shiny, 'count': len(copies),
+                    'rank': rank, 'best': rank == 1, 'duplicate': rank > 1, 'team': name in team,
+                }
+                if rule(fields):
+                    selected.append(copy)
+        return selected
+
+    def plan(self, rule_text: str) -> 'ReleasePlan':
+        """The release orders of the copies `rule_text` selects."""
+        rule = compile_rule(rule_text)
+        selected = self.select(rule)
+        chosen = Counter((copy.name, copy.level) for copy in selected)
+        orders, ambiguous = [], 0
+        for (name, level), count in chosen.items():
+            # Release buttons show name and level only: a level shared with a kept copy could release that one
+            kept = sum(1 for copy in self.species[name] if copy.level == level) - count
+            if kept > 0:
+                ambiguous += count
+            else:
+                orders.extend([(name, level)] * count)
+        return ReleasePlan(rule_text, orders, ambiguous=ambiguous)
+
+
+class ReleasePlan:
+    """A batch of release orders and its progress."""
+
+    __slots__ = ('rule', 'orders', 'pending', 'ambiguous', 'released', 'failed', 'started_at', 'chat_id', 'message_id')
+
+    def __init__(self, rule: str, orders: List[ReleaseOrder], ambiguous: int = 0) -> None:
+        self.rule = rule
+        self.orders = orders
+        self.pending = Counter(orders)  # Orders not finished yet
+        self.ambiguous = ambiguous  # Selected copies left out, see `Inventory.plan`
+        self.released = 0
+        self.failed = 0
+        self.started_at: Optional[float] = None
+        self.chat_id: Optional[int] = None  # The message reporting progress
+        self.message_id: Optional[int] = None
+
+    @property
+    def total(self) -> int:
+        return len(self.orders)
+
+    @property
+    def finished(self) -> bool:
+        return not self.pending
+
+    def finish(self, order: ReleaseOrder, released: bool) -> None:
+        if self.pending[order] <= 0:
+            return
+        self.pending[order] -= 1
+        if not self.pending[order]:
+            del self.pending[order]
+        if released:
+            self.released += 1
+        else:
+            self.failed += 1
+
+    def preview(self, limit: int = 10) -> str:
+        species = Counter(name for name, _ in self.orders)
+        shown = ', '.join(f'{name.capitalize()} ×{count}' for name, count in species.most_common(limit))
+        more = f' and {len(species) - limit} more species' if len(species) > limit else ''
+        skipped = f'\nSkipped {self.ambiguous} copies sharing a level with a kept copy.' if self.ambiguous else ''
+        return f"**Release plan** `{self.rule}`: {self.total} Pokémon of {len(species)} species\n{shown or 'Nothing'}{more}{skipped}"
+
+    def progress(self) -> str:
+        done = self.released + self.failed
+        elapsed = time.time() - self.started_at if self.started_at is not None else 0.0
+        remaining = elapsed / done * (self.total - done) if done else 0.0
+        state = 'finished' if self.finished else f'~{remaining / 60:.0f} min left'
+        return f"**Releasing** `{self.rule}`: {done}/{self.total} ({self.released} released, {self.failed} failed), {state}"
+
+    def checkpoint(self) -> Dict:
+        """The orders not finished yet; a restored plan starts over with those."""
+        return {'rule': self.rule, 'orders': [list(order) for order in self.pending.elements()],
+                'chat_id': self.chat_id, 'message_id': self.message_id}
+
+    @classmethod
+    def restore(cls, state: Dict) -> 'ReleasePlan':
+        plan = cls(state['rule'], [(name, level) for name, level in state.get('orders', [])])
+        plan.chat_id = state.get('chat_id')
+        plan.message_id = state.get('message_id')
+        return plan
+
+
+def compile_rule(text: str) -> Callable[[Dict], bool]:
+    """Compiles a release rule into a predicate over the fields of one copy; raises ValueError if it is not one."""
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f'Invalid rule: {e.msg}') from None
+    predicate = _compile(tree.body)
+    return lambda fields: bool(predicate(fields))
+
+
+def _compile(node: ast.AST) -> Callable[[Dict], object]:
+    if isinstance(node, ast.BoolOp):
+        operands = [_compile(value) for value in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda fields: all(operand(fields) for operand in operands)
+        return lambda fields: any(operand(fields) for operand in operands)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile(node.operand)
+        return lambda fields: not operand(fields)
+    if isinstance(node, ast.Compare):
+        operands = [_compile(node.left), *(_compile(comparator) for comparator in node.comparators)]
+        comparisons = []
+        for op, left, right in zip(node.ops, [node.left, *node.comparators], node.comparators):
+            if type(op) not in COMPARISONS:
+                raise ValueError(f'Unsupported comparison: {op.__class__.__name__}')
+            _check_kinds(op, left, right)
+            comparisons.append(COMPARISONS[type(op)])
+
+        def compare(fields):
+            left = operands[0](fields)
+            for compare_op, operand in zip(comparisons, operands[1:]):
+                right = operand(fields)
+                if left is None or right is None:
+                    return False  # Unknown values (a missing IV) match no comparison
+                try:
+                    if not compare_op(left, right):
+                        return False
+                except TypeError:
+                    raise ValueError(f'Cannot compare {left!r} with {right!r}') from None
+                left = right
+            return True
+        return compare
+    if isinstance(node, ast.Name):
+        if node.id not in RULE_FIELDS:
+            raise ValueError(f"Unknown field `{node.id}`; use one of: {', '.join(RULE_FIELDS)}")
+        name = node.id
+        return lambda fields: fields[name]
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+        value = node.value.lower() if isinstance(node.value, str) else node.value
+        return lambda fields: value
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        items = frozenset(_literal(element) for element in node.elts)
+        return lambda fields: items
+    raise ValueError(f'Unsupported expression: {ast.unparse(node)}')
+
+
+def _kind(node: ast.AST) -> str:
+    """What an operand of the rule evaluates to: text, number, bool or collection."""
+    if isinstance(node, ast.Name):
+        return FIELD_KINDS.get(node.id, 'unknown')
+    if isinstance(node, ast.Constant):
+        return 'text' if isinstance(node.value, str) else 'number'
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        return 'collection'
+    return 'bool'
+
+
+def _check_kinds(op: ast.cmpop, left: ast.AST, right: ast.AST) -> None:
+    """Rejects comparisons that could only fail when the rule runs, e.g. `name > 5`."""
+    left_kind, right_kind = _kind(left), _kind(right)
+    if isinstance(op, ORDERINGS):
+        valid = left_kind == right_kind and left_kind in ('text', 'number')
+    elif isinstance(op, (ast.In, ast.NotIn)):
+        valid = right_kind == 'collection' or left_kind == right_kind == 'text'
+    else:
+        valid = True
+    if not valid:
+        raise ValueError(f'Cannot compare `{ast.unparse(left)}` ({left_kind}) with `{ast.unparse(right)}` ({right_kind})')
+
+
+def _literal(node: ast.AST) -> object:
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+        return node.value.lower() if isinstance(node.value, str) else node.value
+    if isinstance(node, ast.Name):
+        return node.id.lower()  # Bare species names inside `in (...)`
+    raise ValueError(f'Unsupported list item: {ast.unparse(node)}')
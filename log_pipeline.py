@@ -0,0 +1,175 @@
+"""One logging pipeline for the whole process: loguru, queued, with per-module levels and sampling.
+
+`configure` replaces loguru's default synchronous stderr sink with a single
+enqueued sink. Log calls made on the event loop only filter and format the
+record and hand it to a queue; a worker thread serializes it and writes it
+out, so a slow stdout never stalls a handler. Records go out as one compact
+JSON object per line (`LOG_FORMAT=json`) or as loguru's usual text.
+
+Levels are set per module with the longest matching dotted prefix winning,
+e.g. `LOG_LEVELS="hunter=DEBUG telethon=WARNING"`. Libraries logging through
+the standard `logging` module (Telethon) are routed into the same pipeline.
+
+High-frequency lines are logged through `sampled_logger`: each of its call
+sites logs at most `LOG_SAMPLE_LIMIT` records per `LOG_SAMPLE_SECONDS`, and the
+next record it lets through carries the number suppressed in between.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import time
+import traceback
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from loguru import logger
+
+import constants
+
+TEXT_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+)
+SUPPRESSED_SUFFIX = " <dim>(+{extra[suppressed]} similar suppressed)</dim>"
+
+# Records logged through this logger are rate limited per call site
+sampled_logger = logger.bind(sampled=True)
+
+
+class LogFilter:
+    """Drops records below their module's level, and sampled records over their call site's budget."""
+
+    __slots__ = ('_default', '_levels', '_resolved', '_limit', '_period', '_windows')
+
+    def __init__(self, default: str, levels: Dict[str, str], limit: int, period: float) -> None:
+        self._default = logger.level(default.upper()).no
+        self._levels = {module: logger.level(level.upper()).no for module, level in levels.items()}
+        self._resolved: Dict[str, int] = {}  # Level of every module name seen so far
+        self._limit = limit
+        self._period = period
+        self._windows: Dict[Tuple[str, int], List[float]] = {}  # Call site -> [window start, logged, suppressed]
+
+    @property
+    def lowest_level(self) -> int:
+        """The lowest level any module logs at; the sink must accept it."""
+        return min(self._default, *self._levels.values())
+
+    def level_of(self, name: str) -> int:
+        level = self._resolved.get(name)
+        if level is None:
+            level = self._default
+            prefix = name
+            while prefix:
+                if prefix in self._levels:
+                    level = self._levels[prefix]
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._resolved[name] = level
+        return level
+
+    def __call__(self, record) -> bool:
+        name = record['name'] or ''
+        if record['level'].no < self.level_of(name):
+            return False
+        if not record['extra'].get('sampled'):
+            return True
+
+        now = time.monotonic()
+        window = self._windows.get((name, record['line']))
+        if window is None or now - window[0] >= self._period:
+            suppressed = window[2] if window is not None else 0
+            self._windows[(name, record['line'])] = [now, 1, 0]
+        elif window[1] < self._limit:
+            window[1] += 1
+            suppressed = 0
+        else:
+            window[2] += 1
+            return False
+        if suppressed:
+            record['extra']['suppressed'] = int(suppressed)
+        return True
+
+
+class JsonSink:
+    """Writes each record as one compact JSON line; runs on loguru's queue worker thread."""
+
+    __slots__ = ('_stream',)
+
+    def __init__(self, stream: TextIO) -> None:
+        self._stream = stream
+
+    def __call__(self, message) -> None:
+        record = message.record
+        entry = {
+            'time': record['time'].isoformat(),
+            'level': record['level'].name,
+            'module': record['name'],
+            'function': record['function'],
+            'line': record['line'],
+            'message': record['message'],
+        }
+        extra = {key: value for key, value in record['extra'].items() if key != 'sampled' and key != 'traceback'}
+        if extra:
+            entry['extra'] = extra
+        if 'traceback' in record['extra']:
+            entry['exception'] = record['extra']['traceback']
+        self._stream.write(json.dumps(entry, default=str, ensure_ascii=False) + '\n')
+        self._stream.flush()
+
+
+def _format_traceback(record) -> None:
+    """Formats a logged exception on the logging thread; tracebacks do not survive the queue."""
+    if record['exception'] is not None:
+        kind, value, tb = record['exception']
+        record['extra']['traceback'] = ''.join(traceback.format_exception(kind, value, tb))
+
+
+def _text_format(record) -> str:
+    suffix = SUPPRESSED_SUFFIX if 'suppressed' in record['extra'] else ''
+    return TEXT_FORMAT + suffix + "\n{exception}"
+
+
+class InterceptHandler(logging.Handler):
+    """Hands records of the standard `logging` module to loguru, attributed to their original caller."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        frame, depth = sys._getframe(1), 1
+        while frame is not None and frame.f_code.co_filename == logging.__file__:
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+def configure(
+    level: str = constants.LOG_LEVEL,
+    module_levels: Optional[Dict[str, str]] = None,
+    log_format: str = constants.LOG_FORMAT,
+    stream: TextIO = sys.stderr,
+) -> None:
+    """Routes every log record of the process through one queued sink."""
+    module_levels = constants.LOG_MODULE_LEVELS if module_levels is None else module_levels
+    log_filter = LogFilter(level, module_levels, constants.LOG_SAMPLE_LIMIT, constants.LOG_SAMPLE_SECONDS)
+
+    logger.remove()
+    options = dict(level=log_filter.lowest_level, filter=log_filter, enqueue=True, backtrace=False, diagnose=False)
+    logger.configure(patcher=_format_traceback if log_format == 'json' else None)
+    if log_format == 'json':
+        logger.add(JsonSink(stream), **options)
+    else:
+        logger.add(stream, format=_text_format, colorize=None, **options)
+
+    # Standard `logging` records are created only at or above their module's level
+    logging.basicConfig(handlers=[InterceptHandler()], level=logging.getLevelName(level.upper()), force=True)
+    for module, module_level in module_levels.items():
+        logging.getLogger(module).setLevel(module_level.upper())
+
+
+def shutdown() -> None:
+    """Writes out every queued record and stops the queue's worker thread."""
+    logger.complete()
+    logger.remove()
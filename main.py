@@ -1,4 +1,8 @@
 import asyncio
+import os
+import time
+
+import psutil
 import uvloop
 from loguru import logger
 from telethon import TelegramClient
@@ -7,54 +11,120 @@ from telethon.sessions import StringSession
 
 import constants
 import health_checker
+import log_pipeline
 from manager import Manager
+from profiler import PROFILER
+from reconnect import Backoff
+from state_store import get_state_store
+
+# Accounts log in one at a time, so the startup timings logged for each are its own.
+# Memory per account is measured by `benchmarks.bench_engines` (engines load on first use).
+_login_lock = asyncio.Lock()
+_process = psutil.Process(os.getpid())
+
+log_pipeline.configure()
+
+
+async def run_account(account: int, session: str, health: health_checker.HealthServer):
+    """Keeps the account logged in. After a disconnect or error it logs in again with a new
+    client and resumes the same Manager, so activation state and telemetry survive."""
+    manager = None
+    backoff = Backoff()
+    try:
+        while True:  # Keep the account running
+            client = None
+            error = None
+            connected_at = None
+            try:
+                async with _login_lock:
+                    login_started = time.perf_counter()
+
+                    # Initialize the Telegram client
+                    client = TelegramClient(
+                        session=StringSession(session),
+                        api_id=constants.API_ID,
+                        api_hash=constants.API_HASH,
+                        app_version=constants.__version__,
+                        auto_reconnect=True,
+                        flood_sleep_threshold=constants.FLOOD_SLEEP_THRESHOLD
+                    )
+
+                    # Start the client and fetch the bot's profile
+                    await client.start()
+                    me = await client.get_me()
+                    client.me = me
+                    client.parse_mode = 'html'
+                    manager_started = time.perf_counter()
+
+                    if manager is None:
+                        # Initialize the Manager and start automations
+                        manager = Manager(client)
+                        manager.start()
+                        await manager.restore()
+                        health.register(manager)
+                        logger.info(f'[account {account}] Userbot Login successful: {me.first_name} - @{me.username} ({me.id})')
+                    else:
+                        manager.resume(client)
+                        logger.info(f'[account {account}] Reconnected as @{me.username} ({me.id})')
+                    logger.info(
+                        f'[account {account}] Startup: login {(manager_started - login_started) * 1000:.0f}ms, '
+                        f'manager {(time.perf_counter() - manager_started) * 1000:.0f}ms'
+                    )
+
+                # Keep the client running until disconnected
+                connected_at = time.monotonic()
+                await client.run_until_disconnected()
+                logger.warning(f'[account {account}] Disconnected.')
+
+            except AuthKeyDuplicatedError as e:
+                logger.error(f"[account {account}] AuthKeyDuplicatedError: Invalid session. Please update SESSIONS.")
+                error = e
+
+            except (ApiIdInvalidError, FloodError) as e:
+                logger.exception(f'[account {account}] Error occurred when logging in: {e}')
+                error = e
+
+            except Exception as e:
+                logger.exception(f"[account {account}] Unexpected error: {e}")
+                error = e
+
+            # Nothing may keep running against the dead client
+            if manager is not None:
+                await manager.suspend()
+            if client is not None:
+                await client.disconnect()
+
+            if connected_at is not None and time.monotonic() - connected_at > constants.RECONNECT_STABLE_SECONDS:
+                backoff.reset()
+            delay = backoff.next_delay(error)
+            logger.info(f'[account {account}] Logging in again in {delay:.1f}s.')
+            await asyncio.sleep(delay)
+
+    finally:
+        if manager is not None:
+            manager.checkpoint()
+            health.unregister(manager)
+
 
 async def main():
-    while True:  # Keep the bot running
-        try:
-            # Initialize the Telegram client
-            client = TelegramClient(
-                session=StringSession(constants.SESSION),
-                api_id=constants.API_ID,
-                api_hash=constants.API_HASH,
-                app_version=constants.__version__,
-                auto_reconnect=True
-            )
-
-            # Start the client and fetch the bot's profile
-            await client.start()
-            me = await client.get_me()
-            client.me = me
-            client.parse_mode = 'html'
-
-            # Initialize the Manager and start automations
-            manager = Manager(client)
-            manager.start()
-
-            logger.info(f'Userbot Login successful: {me.first_name} - @{me.username} ({me.id})')
-
-            # Keep the client running until disconnected
-            await client.run_until_disconnected()
-
-        except AuthKeyDuplicatedError:
-            logger.error("AuthKeyDuplicatedError: Invalid session. Please update SESSION.")
-            await asyncio.sleep(10)  # Prevent crash loops
-            continue  # Restart the loop with a new session
-
-        except (ApiIdInvalidError, FloodError) as e:
-            logger.exception(f'Error occurred when logging in: {e}')
-            await asyncio.sleep(10)  # Prevent crash loops
-            continue
-
-        except Exception as e:
-            logger.exception(f"Unexpected error: {e}")
-            await asyncio.sleep(10)  # Prevent crash loops
-            continue
-
-# Run health checker and start the bot
-health_checker.check()
+    logger.info(
+        f'Starting {len(constants.SESSIONS)} account(s) on one event loop; '
+        f'interpreter and imports took {time.time() - _process.create_time():.2f}s.'
+    )
+    health = health_checker.HealthServer()
+    await health.start()
+    PROFILER.start()
+    try:
+        await asyncio.gather(*(run_account(account, session, health) for account, session in enumerate(constants.SESSIONS, start=1)))
+    finally:
+        PROFILER.stop()
+        await health.close()
+        await get_state_store().close()
+
 try:
     with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
         runner.run(main())
 except KeyboardInterrupt:
     logger.info("Bot stopped manually.")
+finally:
+    log_pipeline.shutdown()
@@ -1,19 +1,19 @@
+import asyncio
 import time
-from typing import List, Dict, Callable
+from typing import List, Dict, Callable, Optional
 
 from loguru import logger
 from telethon import events
 
 import constants
-from evaluate import ExpressionEvaluator
-from guesser import PokemonIdentificationEngine
-from hunter import PokemonHuntingEngine
-from afk import AFKManager
-from alive import AliveHandler
-from release import PokemonReleaseManager
-from admin import AdminManager
-from purge import PurgeManager
-from spam import Spam  # Import the Spam class
+import metrics
+from pacing import PacingScheduler
+from plugins import PLUGINS, PluginRegistry
+from profiler import PROFILER
+from reconnect import ClientHandle
+from state_store import get_state_store
+
+PROCESS_STARTED = time.time()  # Stands in for the activation time of hunting restored without one
 
 HELP_MESSAGE = """**Help Menu**
 
@@ -22,6 +22,7 @@ HELP_MESSAGE = """**Help Menu**
 
 **Utility Commands**
 • `.ping` - Pong
+• `.prof` (reset) - Event loop profile
 • `.alive` - Bot status
 • `.help` - Help menu
 • `.afk` (message) - Set AFK status
@@ -40,6 +41,7 @@ HELP_MESSAGE = """**Help Menu**
 **Purge Commands**
 • `.purge` - Delete all messages in a chat
 • `.purge (count)` - Delete a specific number of messages
+• `.purge (selectors)` - Delete matching messages, e.g. `from:me since:2d media:photo contains:"/hunt"`
 
 **Spam Commands**
 • `.spam` - Spam commands menu
@@ -47,8 +49,8 @@ HELP_MESSAGE = """**Help Menu**
 
 POKEMON_HELP = """**Pokémon Commands**
 
-• `.guess` (on/off/stats) - Guess Pokémon
-• `.hunt` (on/off/stats) - Hunt for Pokémon
+• `.guess` (on/off/stats/history) - Guess Pokémon
+• `.hunt` (on/off/stats/history) - Hunt for Pokémon
 • `.list <category>` - List Pokémon by category
 • `.release` - Pokémon release menu
 """
@@ -57,9 +59,12 @@ RELEASE_HELP = """**Release Commands**
 
 • `.release on` - Start auto-releasing Pokémon
 • `.release off` - Stop auto-releasing Pokémon
-• `.release add <name>` - Add a Pokémon to the release list
+• `.release add <name>[, <name>...]` - Add Pokémon to the release list; every copy is released until none is left
 • `.release remove <name>` - Remove a Pokémon from the release list
 • `.release list` - Show the Pokémon in the release list
+• `.release scan` - Index your Pokémon from Hexa's collection
+• `.release select <rule>` - Plan releasing the scanned Pokémon matching a rule, e.g. `duplicate and level < 10 and not team`
+• `.release run` - Release the planned Pokémon, reporting progress
 """
 
 ADMIN_HELP = """**Admin Commands**
@@ -77,6 +82,7 @@ PURGE_HELP = """**Purge Commands**
 
 • `.purge` - Delete all messages in a chat
 • `.purge (count)` - Delete a specific number of messages
+• `.purge (selectors)` - Delete matching messages, e.g. `from:me since:2d media:photo contains:"/hunt"`
 """
 
 SPAM_HELP = """**Spam Commands**
@@ -92,52 +98,116 @@ class Manager:
 
     __slots__ = (
         '_client',
-        '_guesser',
-        '_hunter',
-        '_evaluator',
-        '_afk_manager',
-        '_alive_handler',
-        '_release_manager',
-        '_admin_manager',
-        '_purge_manager',
-        '_spam_manager',  # Add SpamManager
+        '_pacer',
+        '_plugins',
+        '_state',
+        '_account',
+        '_checkpoint_task',
     )
 
     def __init__(self, client) -> None:
-        self._client = client
-        self._guesser = PokemonIdentificationEngine(client)
-        self._hunter = PokemonHuntingEngine(client)
-        self._evaluator = ExpressionEvaluator(client)
-        self._afk_manager = AFKManager(client)
-        self._alive_handler = AliveHandler(client)
-        self._release_manager = PokemonReleaseManager(client)
-        self._admin_manager = AdminManager(client)
-        self._purge_manager = PurgeManager(client)
-        self._spam_manager = Spam(client)  # Initialize SpamManager
+        self._client = ClientHandle(client)  # Subsystems keep working with the next client after a reconnect
+        self._pacer = PacingScheduler(account=metrics.account_label(client))  # Shared by every subsystem that talks to Telegram
+        self._plugins = PluginRegistry(self._client, self._pacer)  # Subsystems are loaded on first use, see `plugins.py`
+        self._state = get_state_store()
+        self._account: Optional[str] = None  # State store key: the account ID, see `_account_key`
+        self._checkpoint_task = None
+
+    @property
+    def plugins(self) -> PluginRegistry:
+        return self._plugins
+
+    def health(self) -> Dict[str, object]:
+        """Reports whether this account is connected and, while hunting, still hearing from Hexa."""
+        connected = self._client.is_connected()
+        hunter = self._plugins.get('hunter')
+        guesser = self._plugins.get('guesser')
+        hunting = hunter is not None and hunter.automation_orchestrator.is_automation_active
+        last_update = hunter.router.last_update if hunter is not None else None
+        hexa_age = time.monotonic() - last_update if last_update is not None else None
+        if hexa_age is None and hunting:
+            activated = hunter.automation_orchestrator.start_time
+            # Nothing heard since activation, or since this process started
+            hexa_age_or_uptime = time.time() - (activated if activated is not None else PROCESS_STARTED)
+        else:
+            hexa_age_or_uptime = hexa_age
+        stale = hunting and hexa_age_or_uptime > constants.HEXA_STALE_SECONDS
+        return {
+            'account': metrics.account_label(self._client),
+            'ready': connected and not stale,
+            'connected': connected,
+            'hunting': hunting,
+            'guessing': guesser is not None and guesser.automation_orchestrator.is_automation_active,
+            'last_hexa_update_seconds': round(hexa_age, 1) if hexa_age is not None else None,
+        }
 
     def start(self) -> None:
         """Starts the Userbot's automations."""
         logger.info('Initializing Userbot')
-        self._guesser.start()
-        self._hunter.start()
-        self._evaluator.start()
-        self._alive_handler.register()
-
-        # Add AFK event handlers
-        for handler in self._afk_manager.get_event_handlers():
-            self._client.add_event_handler(handler['callback'], handler['event'])
-            logger.debug(f'[{self.__class__.__name__}] Added AFK event handler: `{handler["callback"].__name__}`')
-
-        # Register AdminManager event handlers
-        for handler in self._admin_manager.get_event_handlers():
-            self._client.add_event_handler(handler['callback'], handler['event'])
-            logger.debug(f'[{self.__class__.__name__}] Added admin event handler: `{handler["callback"].__name__}`')
-
-        # Register other event handlers
+        self._plugins.preload(constants.PRELOAD_PLUGINS)
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_periodically())
+
         for handler in self.event_handlers:
-            self._client.add_event_handler(handler['callback'], handler['event'])
+            PROFILER.add_event_handler(self._client, handler['callback'], handler['event'])
             logger.debug(f'[{self.__class__.__name__}] Added event handler: `{handler["callback"].__name__}`')
 
+    def _account_key(self) -> Optional[str]:
+        """The account ID once the client knows who it is logged in as, else None."""
+        if self._account is None:
+            me = getattr(self._client, 'me', None)
+            if me is not None:
+                self._account = str(me.id)
+        return self._account
+
+    async def restore(self) -> None:
+        """Restores the subsystems checkpointed by the previous process, loading those that have state."""
+        if self._account_key() is None:
+            self._account = str((await self._client.get_me()).id)
+        for name, state in (await self._state.load(self._account)).items():
+            if name not in PLUGINS:
+                continue
+            try:
+                self._plugins.load(name).restore(state)
+                logger.info(f'[{self.__class__.__name__}] Restored `{name}` from the last checkpoint.')
+            except Exception as e:
+                logger.exception(f'[{self.__class__.__name__}] Failed to restore `{name}`: {e}')
+
+    def checkpoint(self) -> None:
+        """Queues a snapshot of every loaded subsystem; unchanged ones are not written again."""
+        account = self._account_key()
+        if account is None:
+            logger.debug(f'[{self.__class__.__name__}] Not checkpointing: the account is not known yet.')
+            return
+        for name, instance in self._plugins.loaded():
+            checkpoint = getattr(instance, 'checkpoint', None)
+            if checkpoint is not None:
+                self._state.put(account, name, checkpoint())
+
+    async def _checkpoint_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(constants.STATE_CHECKPOINT_SECONDS)
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.exception(f'[{self.__class__.__name__}] Checkpoint failed: {e}')
+
+    async def suspend(self) -> None:
+        """Stops the background tasks once the client is gone, so none of them runs against it."""
+        self.checkpoint()
+        task, self._checkpoint_task = self._checkpoint_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self._plugins.stop_tasks()
+
+    def resume(self, client) -> None:
+        """Moves the account to a freshly logged-in `client`, keeping all engine state."""
+        self._client.rebind(client)
+        if self._checkpoint_task is None:
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_periodically())
+        self._plugins.start_tasks()
+        logger.info(f'[{self.__class__.__name__}] Resumed on a new client with {len(self._plugins.load_seconds)} subsystem(s) loaded.')
+
     async def ping_command(self, event) -> None:
         """Handles the `.ping` command."""
         start = time.time()
@@ -145,6 +215,14 @@ class Manager:
         ping_ms = (time.time() - start) * 1000
         await event.edit(f'Pong!!\n{ping_ms:.2f}ms')
 
+    async def profile_command(self, event) -> None:
+        """Handles the `.prof` command: shows the loop profile, or clears it with `.prof reset`."""
+        if event.pattern_match.group(1):
+            PROFILER.reset()
+            await event.edit('Profile reset.')
+            return
+        await event.edit(PROFILER.generate_report())
+
     async def help_command(self, event) -> None:
         """Handles the `.help` command."""
         await event.edit(HELP_MESSAGE)
@@ -169,14 +247,6 @@ class Manager:
         """Shows the `.spam` menu."""
         await event.edit(SPAM_HELP)
 
-    async def handle_guesser_automation_control_request(self, event) -> None:
-        """Handles user requests to enable/disable guesser automation."""
-        await self._guesser.handle_automation_control_request(event)
-
-    async def handle_hunter_automation_control_request(self, event) -> None:
-        """Handles user requests to enable/disable hunter automation."""
-        await self._hunter.handle_automation_control_request(event)
-
     async def list_pokemon(self, event) -> None:
         """Handles the `.list` command by showing Pokémon based on the specified category."""
         args = event.pattern_match.group(1)
@@ -230,7 +300,7 @@ class Manager:
                 await event.reply("Maximum spam limit is 100 messages.")
                 return
 
-            await self._spam_manager.spam_message(event.chat_id, message, count, event)
+            await self._plugins.load('spam').spam_message(event.chat_id, message, count, event)
         except Exception as e:
             await event.reply(f"Error: {e}")
 
@@ -249,46 +319,58 @@ class Manager:
                 await event.reply("Maximum spam limit is 100 messages.")
                 return
 
-            await self._spam_manager.delayspam_message(event.chat_id, message, count, delay, event)
+            await self._plugins.load('spam').delayspam_message(event.chat_id, message, count, delay, event)
         except Exception as e:
             await event.reply(f"Error: {e}")
 
     @property
     def event_handlers(self) -> List[Dict[str, Callable | events.NewMessage]]:
         """Returns a list of event handlers, including admin, spam, and Pokémon commands."""
+        plugin = self._plugins.handler
         return [
             # General commands
             {'callback': self.ping_command, 'event': events.NewMessage(pattern=constants.PING_COMMAND_REGEX, outgoing=True)},
+            {'callback': self.profile_command, 'event': events.NewMessage(pattern=constants.PROF_COMMAND_REGEX, outgoing=True)},
             {'callback': self.help_command, 'event': events.NewMessage(pattern=constants.HELP_COMMAND_REGEX, outgoing=True)},
             {'callback': self.pokemon_menu, 'event': events.NewMessage(pattern=r"\.pokemon$", outgoing=True)},
+            {'callback': plugin('alive', 'alive_command'), 'event': events.NewMessage(pattern=constants.ALIVE_COMMAND_REGEX, outgoing=True)},
+            {'callback': plugin('evaluator', 'eval_command'), 'event': events.NewMessage(pattern=constants.EVAL_COMMAND_REGEX, outgoing=True)},
+
+            # AFK commands
+            {'callback': plugin('afk', 'afk_command'), 'event': events.NewMessage(pattern=constants.AFK_COMMAND_REGEX, outgoing=True)},
+            {'callback': plugin('afk', 'unafk_command'), 'event': events.NewMessage(pattern=constants.UNAFK_COMMAND_REGEX, outgoing=True)},
+            {'callback': plugin('afk', 'handle_afk_messages', loaded_only=True), 'event': events.NewMessage(incoming=True)},
 
             # Pokémon commands
-            {'callback': self.handle_guesser_automation_control_request, 'event': events.NewMessage(pattern=constants.GUESSER_COMMAND_REGEX, outgoing=True)},
-            {'callback': self.handle_hunter_automation_control_request, 'event': events.NewMessage(pattern=constants.HUNTER_COMMAND_REGEX, outgoing=True)},
+            {'callback': plugin('guesser', 'handle_automation_control_request'), 'event': events.NewMessage(pattern=constants.GUESSER_COMMAND_REGEX, outgoing=True)},
+            {'callback': plugin('hunter', 'handle_automation_control_request'), 'event': events.NewMessage(pattern=constants.HUNTER_COMMAND_REGEX, outgoing=True)},
             {'callback': self.list_pokemon, 'event': events.NewMessage(pattern=constants.LIST_COMMAND_REGEX, outgoing=True)},
             {'callback': self.release_menu, 'event': events.NewMessage(pattern=r"\.release$", outgoing=True)},
-            {'callback': self._release_manager.start_releasing, 'event': events.NewMessage(pattern=r"\.release on", outgoing=True)},
-            {'callback': self._release_manager.stop_releasing, 'event': events.NewMessage(pattern=r"\.release off", outgoing=True)},
-            {'callback': self._release_manager.add_pokemon, 'event': events.NewMessage(pattern=r"\.release add (.+)", outgoing=True)},
-            {'callback': self._release_manager.remove_pokemon, 'event': events.NewMessage(pattern=r"\.release remove (.+)", outgoing=True)},
-            {'callback': self._release_manager.list_pokemon, 'event': events.NewMessage(pattern=r"\.release list", outgoing=True)},
+            {'callback': plugin('release', 'start_releasing'), 'event': events.NewMessage(pattern=r"\.release on", outgoing=True)},
+            {'callback': plugin('release', 'stop_releasing'), 'event': events.NewMessage(pattern=r"\.release off", outgoing=True)},
+            {'callback': plugin('release', 'add_pokemon'), 'event': events.NewMessage(pattern=r"\.release add (.+)", outgoing=True)},
+            {'callback': plugin('release', 'remove_pokemon'), 'event': events.NewMessage(pattern=r"\.release remove (.+)", outgoing=True)},
+            {'callback': plugin('release', 'list_pokemon'), 'event': events.NewMessage(pattern=r"\.release list", outgoing=True)},
+            {'callback': plugin('release', 'scan_inventory'), 'event': events.NewMessage(pattern=r"\.release scan$", outgoing=True)},
+            {'callback': plugin('release', 'select_pokemon'), 'event': events.NewMessage(pattern=r"\.release select (.+)", outgoing=True)},
+            {'callback': plugin('release', 'run_plan'), 'event': events.NewMessage(pattern=r"\.release run$", outgoing=True)},
 
             # Admin commands
             {'callback': self.admin_menu, 'event': events.NewMessage(pattern=r"\.admin$", outgoing=True)},
-            {'callback': self._admin_manager.mute_user, 'event': events.NewMessage(pattern=r"\.mute(?: (\d+))?$", outgoing=True)},
-            {'callback': self._admin_manager.unmute_user, 'event': events.NewMessage(pattern=r"\.unmute(?: (\d+))?$", outgoing=True)},
-            {'callback': self._admin_manager.ban_user, 'event': events.NewMessage(pattern=r"\.ban(?: (\d+))?$", outgoing=True)},
-            {'callback': self._admin_manager.unban_user, 'event': events.NewMessage(pattern=r"\.unban(?: (\d+))?$", outgoing=True)},
-            {'callback': self._admin_manager.kick_user, 'event': events.NewMessage(pattern=r"\.kick(?: (\d+))?$", outgoing=True)},
-            {'callback': self._admin_manager.promote_user, 'event': events.NewMessage(pattern=r"\.promote(?: (\d+))?$", outgoing=True)},
-            {'callback': self._admin_manager.demote_user, 'event': events.NewMessage(pattern=r"\.demote(?: (\d+))?$", outgoing=True)},
+            {'callback': plugin('admin', 'mute_user'), 'event': events.NewMessage(pattern=r"\.mute(?: (\d+))?$", outgoing=True)},
+            {'callback': plugin('admin', 'unmute_user'), 'event': events.NewMessage(pattern=r"\.unmute(?: (\d+))?$", outgoing=True)},
+            {'callback': plugin('admin', 'ban_user'), 'event': events.NewMessage(pattern=r"\.ban(?: (\d+))?$", outgoing=True)},
+            {'callback': plugin('admin', 'unban_user'), 'event': events.NewMessage(pattern=r"\.unban(?: (\d+))?$", outgoing=True)},
+            {'callback': plugin('admin', 'kick_user'), 'event': events.NewMessage(pattern=r"\.kick(?: (\d+))?$", outgoing=True)},
+            {'callback': plugin('admin', 'promote_user'), 'event': events.NewMessage(pattern=r"\.promote(?: (\d+))?$", outgoing=True)},
+            {'callback': plugin('admin', 'demote_user'), 'event': events.NewMessage(pattern=r"\.demote(?: (\d+))?$", outgoing=True)},
 
             # Purge commands
-            {'callback': self._purge_manager.purge_messages, 'event': events.NewMessage(pattern=r"\.purge(?: \d+)?$", outgoing=True)},
+            {'callback': plugin('purge', 'purge_messages'), 'event': events.NewMessage(pattern=r"\.purge(?: .+)?$", outgoing=True)},
 
             # Spam commands
             {'callback': self.spam_menu, 'event': events.NewMessage(pattern=r"\.spam$", outgoing=True)},
             {'callback': self.handle_spam_command, 'event': events.NewMessage(pattern=r"\.spam (\d+) (.+)", outgoing=True)},
             {'callback': self.handle_delayspam_command, 'event': events.NewMessage(pattern=r"\.delayspam (\d+) (\d+) (.+)", outgoing=True)},
-            {'callback': self._spam_manager.stop_spam, 'event': events.NewMessage(pattern=r"\.stopspam$", outgoing=True)},
+            {'callback': plugin('spam', 'stop_spam'), 'event': events.NewMessage(pattern=r"\.stopspam$", outgoing=True)},
         ]
@@ -0,0 +1,200 @@
+"""In-process metrics registry rendered in the Prometheus text exposition format.
+
+Metrics are created once at import time; engines bind their labels once and keep
+the returned children, so recording is a dictionary-free attribute update.
+"""
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def account_label(client) -> str:
+    """The label identifying an account in metrics: its username, or its id."""
+    me = getattr(client, 'me', None)
+    if me is None:
+        return 'unknown'
+    return getattr(me, 'username', None) or str(me.id)
+
+
+class CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value: float = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ('_value', '_function')
+
+    def __init__(self):
+        self._value: float = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self._value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Computes the value on every scrape instead of storing it."""
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+
+class HistogramChild:
+    __slots__ = ('_upper_bounds', 'bucket_counts', 'sum', 'count')
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self._upper_bounds = upper_bounds
+        self.bucket_counts: List[int] = [0] * (len(upper_bounds) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect_left(self._upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str, **labels: str):
+        """Returns the child for these label values, creating it on first use; keep it for hot paths."""
+        key = tuple(str(value) for value in values) or tuple(str(labels[name]) for name in self.labelnames)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {key}')
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, *values: str) -> None:
+        self._children.pop(tuple(str(value) for value in values), None)
+
+    def _samples(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}'
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}', *self._samples()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.upper_bounds = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.upper_bounds)
+
+    def _samples(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (math.inf,), child.bucket_counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(child.sum)}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, key)} {child.count}'
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them for a scrape."""
+
+    __slots__ = ('_metrics',)
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric `{metric.name}` is already registered.')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HUNT_ACTIVITY = REGISTRY.counter('hexa_hunt_activity_total', 'Hunting events by kind (hunts sent, encounters, ...).', ('account', 'activity'))
+POKE_DOLLARS = REGISTRY.counter('hexa_poke_dollars_total', 'Poke Dollars earned while hunting.', ('account',))
+POKE_DOLLARS_PER_HOUR = REGISTRY.gauge('hexa_poke_dollars_per_hour', 'Poke Dollars per hour since hunting was activated.', ('account',))
+GUESS_ACTIVITY = REGISTRY.counter('hexa_guess_activity_total', 'Guessing events by kind.', ('account', 'activity'))
+ROUTE_LATENCY = REGISTRY.histogram('hexa_route_latency_seconds', 'Wall time of Hexa update handlers by route.', ('account', 'route'))
+TELEGRAM_ACTIONS = REGISTRY.counter('telegram_actions_total', 'Paced Telegram requests that succeeded.', ('account',))
+TELEGRAM_RTT = REGISTRY.histogram('telegram_rtt_seconds', 'Round-trip time of paced Telegram requests.', ('account',))
+FLOOD_WAITS = REGISTRY.counter('telegram_flood_waits_total', 'Flood waits and "try again" answers received.', ('account',))
+FLOOD_WAIT_SECONDS = REGISTRY.counter('telegram_flood_wait_seconds_total', 'Seconds spent honouring flood waits.', ('account',))
+PACING_INTERVAL = REGISTRY.gauge('telegram_pacing_interval_seconds', 'Current gap between paced Telegram requests.', ('account',))
+# Fed by the profiler's heartbeat (see `profiler.py`)
+LOOP_LAG = REGISTRY.gauge('event_loop_lag_seconds', 'Delay of the latest event loop heartbeat.')
+LOOP_LAG_HISTOGRAM = REGISTRY.histogram('event_loop_lag_histogram_seconds', 'Delay of event loop heartbeats.')
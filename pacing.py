@@ -0,0 +1,219 @@
+"""Adaptive pacing of Telegram actions for one account.
+
+`PacingScheduler` spaces out single actions (sends and button clicks);
+`RequestLimiter` paces bulk requests of one kind (deletes) that may overlap.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+from telethon.errors import FloodWaitError
+
+import constants
+import metrics
+
+PACING_REPORT = "⏩ Pacing: interval {interval:.2f}s, RTT {rtt}, {actions_per_minute:.1f} actions/min, flood waits {flood_waits} ({flood_seconds}s)"
+
+RTT_SMOOTHING = 0.2  # Weight of the newest round trip in the moving average
+RTT_MULTIPLIER = 2.0  # Never pace faster than this many round trips
+SHRINK_FACTOR = 0.9  # Interval decay after each successful action
+GROWTH_FACTOR = 2.0  # Interval growth after a flood signal
+JITTER = 0.1  # Up to this fraction of the interval is added at random
+RETRY_MARGIN = 1.1  # A request limiter stays this much slower than the last pace that caused a flood wait
+UNSAFE_GROWTH = 1.25  # Growth of that pace when a flood wait hits a limiter already pacing just above it
+
+
+class PacingScheduler:
+    """Spaces out Telegram actions, shrinking the interval towards the smallest safe value.
+
+    The interval decays after every successful action but never below a multiple
+    of the observed round-trip time, and it doubles on every flood signal, whose
+    wait is always honoured before the next action.
+    """
+
+    __slots__ = (
+        '_min_interval',
+        '_max_interval',
+        '_interval',
+        '_rtt',
+        '_next_slot',
+        '_not_before',
+        '_recent_actions',
+        '_flood_waits',
+        '_flood_seconds',
+        '_metrics'
+    )
+
+    def __init__(
+        self,
+        min_interval: float = constants.PACING_MIN_INTERVAL_SECONDS,
+        max_interval: float = constants.PACING_MAX_INTERVAL_SECONDS,
+        initial_interval: float = constants.PACING_INITIAL_INTERVAL_SECONDS,
+        account: str = 'default'
+    ) -> None:
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = initial_interval
+        self._rtt: Optional[float] = None
+        self._next_slot: float = 0.0
+        self._not_before: float = 0.0
+        self._recent_actions: deque = deque()
+        self._flood_waits: int = 0
+        self._flood_seconds: int = 0
+        self._metrics = (
+            metrics.TELEGRAM_ACTIONS.labels(account),
+            metrics.TELEGRAM_RTT.labels(account),
+            metrics.FLOOD_WAITS.labels(account),
+            metrics.FLOOD_WAIT_SECONDS.labels(account)
+        )
+        metrics.PACING_INTERVAL.labels(account).set_function(lambda: self._interval)
+
+    async def wait(self) -> None:
+        """Waits for, and reserves, the next free action slot."""
+        now = time.monotonic()
+        slot = max(now, self._next_slot, self._not_before)
+        self._next_slot = slot + self._interval * (1 + random.uniform(0, JITTER))
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    @asynccontextmanager
+    async def measure(self) -> AsyncIterator[None]:
+        """Times the wrapped request and learns from its outcome; `FloodWaitError` is re-raised."""
+        started = time.monotonic()
+        try:
+            yield
+        except FloodWaitError as e:
+            self.observe_flood(e.seconds)
+            raise
+        self.observe_rtt(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def pace(self) -> AsyncIterator[None]:
+        """Waits for a slot, then measures the wrapped request."""
+        await self.wait()
+        async with self.measure():
+            yield
+
+    def observe_rtt(self, seconds: float) -> None:
+        """Records a successful round trip and shrinks the interval."""
+        self._rtt = seconds if self._rtt is None else (1 - RTT_SMOOTHING) * self._rtt + RTT_SMOOTHING * seconds
+        floor = max(self._min_interval, self._rtt * RTT_MULTIPLIER)
+        self._interval = min(self._max_interval, max(floor, self._interval * SHRINK_FACTOR))
+        actions, rtt, _, _ = self._metrics
+        actions.inc()
+        rtt.observe(seconds)
+        now = time.monotonic()
+        self._recent_actions.append(now)
+        while self._recent_actions and self._recent_actions[0] < now - 60:
+            self._recent_actions.popleft()
+
+    def observe_flood(self, seconds: float) -> None:
+        """Honours a flood wait (or a bot's "try again") and grows the interval."""
+        self._flood_waits += 1
+        self._flood_seconds += int(seconds)
+        _, _, flood_waits, flood_seconds = self._metrics
+        flood_waits.inc()
+        flood_seconds.inc(seconds)
+        self._not_before = max(self._not_before, time.monotonic() + seconds)
+        self._interval = min(self._max_interval, max(self._min_interval, self._interval * GROWTH_FACTOR))
+        logger.warning(f"[{self.__class__.__name__}] Flood signal ({seconds}s), interval now {self._interval:.2f}s.")
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @property
+    def actions_per_minute(self) -> float:
+        """Successful actions completed during the last minute."""
+        cutoff = time.monotonic() - 60
+        return sum(1 for timestamp in self._recent_actions if timestamp >= cutoff)
+
+    def generate_report(self) -> str:
+        return PACING_REPORT.format(
+            interval=self._interval,
+            rtt=f"{self._rtt * 1000:.0f}ms" if self._rtt is not None else "N/A",
+            actions_per_minute=self.actions_per_minute,
+            flood_waits=self._flood_waits,
+            flood_seconds=self._flood_seconds
+        )
+
+
+class RequestLimiter:
+    """Bounds concurrent requests of one kind and spaces out their starts.
+
+    Requests start back to back until the first flood wait. Every flood wait is
+    honoured by every request before it starts, and doubles the spacing observed
+    over the last few starts. Successes then shrink the spacing again, but never
+    below the pace that caused a flood wait, which grows with every further
+    flood wait, so the pace settles just under the server's limit after a few.
+    """
+
+    __slots__ = ('_max_concurrency', '_active', '_interval', '_unsafe_interval', '_next_start', '_not_before',
+                 '_flooded_at', '_starts', '_freed', 'flood_waits', 'flood_seconds')
+
+    def __init__(self, max_concurrency: int) -> None:
+        self._max_concurrency = max_concurrency
+        self._active = 0
+        self._interval = 0.0
+        self._unsafe_interval = 0.0  # Spacing of the starts that led to the last flood wait
+        self._next_start = 0.0
+        self._not_before = 0.0
+        self._flooded_at = 0.0
+        self._starts: deque = deque(maxlen=8)
+        self._freed = asyncio.Event()
+        self.flood_waits = 0
+        self.flood_seconds = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Waits until a request may start; `FloodWaitError` of the wrapped request is re-raised."""
+        while self._active >= self._max_concurrency:
+            self._freed.clear()
+            await self._freed.wait()
+        self._active += 1
+        try:
+            start = self._reserve()
+            while start > time.monotonic():
+                await asyncio.sleep(start - time.monotonic())
+                if self._not_before > start:  # A flood wait arrived while this request waited
+                    start = self._reserve()
+            self._starts.append(start)
+            yield
+        except FloodWaitError as e:
+            if start >= self._flooded_at:  # Requests already in flight at a flood wait add nothing new
+                self.observe_flood(e.seconds)
+            raise
+        else:
+            self._interval = max(self._unsafe_interval * RETRY_MARGIN, self._interval * SHRINK_FACTOR)
+        finally:
+            self._active -= 1
+            self._freed.set()
+
+    def _reserve(self) -> float:
+        """Reserves the next start time."""
+        start = max(time.monotonic(), self._next_start, self._not_before)
+        self._next_start = start + self._interval
+        return start
+
+    def observe_flood(self, seconds: float) -> None:
+        self.flood_waits += 1
+        self.flood_seconds += int(seconds)
+        if len(self._starts) >= 2:
+            observed = (self._starts[-1] - self._starts[0]) / (len(self._starts) - 1)
+            self._unsafe_interval = max(observed, self._unsafe_interval * UNSAFE_GROWTH)
+            self._interval = max(self._interval, observed * GROWTH_FACTOR)
+        self._flooded_at = time.monotonic()
+        self._not_before = max(self._not_before, self._flooded_at + seconds)
+        self._next_start = self._not_before
+        self._starts.clear()
+        logger.warning(f"[{self.__class__.__name__}] Flood signal ({seconds}s), one request per {self._interval:.2f}s now.")
+
+    @property
+    def interval(self) -> float:
+        return self._interval
@@ -0,0 +1,113 @@
+"""Userbot subsystems, imported and constructed on first use.
+
+The Manager registers the command patterns of every subsystem at startup, but
+a subsystem's module is only imported, and the subsystem only constructed, when
+one of its commands first arrives, or at startup when it is listed in
+`constants.PRELOAD_PLUGINS`. Logging in therefore pays for the command table
+only, not for meval, psutil or the species database.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import time
+from typing import Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from pacing import PacingScheduler
+
+
+class PluginSpec(NamedTuple):
+    module: str
+    attribute: str
+    uses_pacer: bool = False  # Constructed as `attribute(client, pacer)` instead of `attribute(client)`
+    on_load: Optional[str] = None  # Method called once constructed, e.g. to register its own handlers
+
+
+PLUGINS: Dict[str, PluginSpec] = {
+    'guesser': PluginSpec('guesser', 'PokemonIdentificationEngine', uses_pacer=True, on_load='start'),
+    'hunter': PluginSpec('hunter', 'PokemonHuntingEngine', uses_pacer=True, on_load='start'),
+    'evaluator': PluginSpec('evaluate', 'ExpressionEvaluator'),
+    'afk': PluginSpec('afk', 'AFKManager'),
+    'alive': PluginSpec('alive', 'AliveHandler'),
+    'release': PluginSpec('release', 'PokemonReleaseManager', uses_pacer=True, on_load='start'),
+    'admin': PluginSpec('admin', 'AdminManager', on_load='start'),
+    'purge': PluginSpec('purge', 'PurgeManager'),
+    'spam': PluginSpec('spam', 'Spam', uses_pacer=True),
+}
+
+
+class PluginRegistry:
+    """The subsystems of one account, loaded on demand."""
+
+    __slots__ = ('_client', '_pacer', '_instances', 'load_seconds')
+
+    def __init__(self, client, pacer: PacingScheduler) -> None:
+        self._client = client
+        self._pacer = pacer
+        self._instances: Dict[str, object] = {}
+        self.load_seconds: Dict[str, float] = {}  # Import and construction time of each loaded subsystem
+
+    def get(self, name: str) -> Optional[object]:
+        """Returns the subsystem if it is loaded, without loading it."""
+        return self._instances.get(name)
+
+    def load(self, name: str) -> object:
+        """Returns the subsystem, importing and constructing it on first use."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        spec = PLUGINS[name]
+        started = time.perf_counter()
+        cls = getattr(importlib.import_module(spec.module), spec.attribute)
+        instance = cls(self._client, self._pacer) if spec.uses_pacer else cls(self._client)
+        self._instances[name] = instance
+        if spec.on_load is not None:
+            getattr(instance, spec.on_load)()
+        self.load_seconds[name] = time.perf_counter() - started
+        logger.info(f'[{self.__class__.__name__}] Loaded `{name}` in {self.load_seconds[name] * 1000:.1f}ms')
+        return instance
+
+    def loaded(self) -> Iterator[Tuple[str, object]]:
+        """The loaded subsystems, by name."""
+        return iter(list(self._instances.items()))
+
+    def preload(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.load(name)
+
+    def start_tasks(self) -> None:
+        """Restarts the background tasks of the loaded subsystems that have any."""
+        for instance in self._instances.values():
+            start_tasks = getattr(instance, 'start_tasks', None)
+            if start_tasks is not None:
+                start_tasks()
+
+    async def stop_tasks(self) -> None:
+        """Cancels the background tasks of the loaded subsystems and waits for them."""
+        await asyncio.gather(*(
+            instance.stop_tasks() for instance in self._instances.values() if hasattr(instance, 'stop_tasks')
+        ))
+
+    def handler(self, name: str, method: str, loaded_only: bool = False) -> Callable:
+        """An event callback running `method` of the subsystem `name`, loading it first.
+
+        With `loaded_only`, events are ignored until something else loaded the
+        subsystem; used for catch-all handlers that only matter once one of its
+        commands was used (AFK replies).
+        """
+        spec = PLUGINS[name]
+
+        async def callback(event):
+            instance = self._instances.get(name)
+            if instance is None:
+                if loaded_only:
+                    return
+                instance = self.load(name)
+            return await getattr(instance, method)(event)
+
+        callback.__name__ = method
+        callback.__qualname__ = f'{spec.attribute}.{method}'
+        return callback
@@ -0,0 +1,231 @@
+"""Always-on profiling of the shared event loop: per-handler timings, loop lag and stalled stacks.
+
+Every event handler is registered through `instrument`, which times each run
+of the handler and, separately, each step it executes on the loop (the time
+between two awaits, during which nothing else can run). A watchdog thread
+samples the loop thread's stack whenever the loop stops ticking, so the code
+responsible for a stall shows up in the `.prof` report.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+import metrics
+
+HEARTBEAT_SECONDS = 0.05  # How often the loop proves it is alive
+STALL_THRESHOLD_SECONDS = 0.1  # A heartbeat older than this is a stall worth sampling
+STACK_DEPTH = 4  # Innermost frames kept per sampled stack
+REPORT_LIMIT = 5
+
+HANDLER_BUSY = metrics.REGISTRY.histogram('handler_busy_seconds', 'Longest single step of an event handler on the loop.', ('handler',))
+
+PROFILE_REPORT = """📈 Profile (since {since})
+Handlers by time on the loop:
+{handlers}
+Loop lag: last {lag_ms:.1f}ms, worst {worst_lag_ms:.1f}ms
+Stalled stacks:
+{stacks}"""
+
+HANDLER_LINE = "  {name}: {calls} calls, busy {busy_ms:.1f}ms (max step {max_step_ms:.1f}ms), wall avg {wall_ms:.1f}ms"
+STACK_LINE = "  {count}× up to {max_ms:.0f}ms:\n{frames}"
+
+
+class HandlerStats:
+    """Timings of one handler: total wall time per call and time spent holding the loop."""
+
+    __slots__ = ('calls', 'wall_seconds', 'busy_seconds', 'max_step_seconds', 'errors', '_busy_histogram')
+
+    def __init__(self, name: str):
+        self.calls: int = 0
+        self.wall_seconds: float = 0.0
+        self.busy_seconds: float = 0.0
+        self.max_step_seconds: float = 0.0
+        self.errors: int = 0
+        self._busy_histogram = HANDLER_BUSY.labels(name)
+
+    def record_step(self, seconds: float) -> None:
+        self.busy_seconds += seconds
+        if seconds > self.max_step_seconds:
+            self.max_step_seconds = seconds
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.max_step_seconds = 0.0
+        self.errors = 0
+
+    def record_call(self, wall_seconds: float, max_step_seconds: float) -> None:
+        self.calls += 1
+        self.wall_seconds += wall_seconds
+        self._busy_histogram.observe(max_step_seconds)
+
+
+class _SteppedCoroutine:
+    """Drives a coroutine and times each step it runs on the loop."""
+
+    __slots__ = ('_coroutine', '_stats', 'max_step')
+
+    def __init__(self, coroutine, stats: HandlerStats) -> None:
+        self._coroutine = coroutine
+        self._stats = stats
+        self.max_step: float = 0.0
+
+    def __await__(self):
+        iterator = self._coroutine.__await__()
+        value, error = None, None
+        while True:
+            started = time.perf_counter()
+            try:
+                yielded = iterator.throw(error) if error is not None else iterator.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                step = time.perf_counter() - started
+                self._stats.record_step(step)
+                if step > self.max_step:
+                    self.max_step = step
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class LoopProfiler:
+    """Process-wide profiler of the event loop all accounts share."""
+
+    __slots__ = ('_handlers', '_stalls', '_started_at', '_heartbeat', '_loop_thread_id', '_worst_lag', '_stop', '_tasks')
+
+    def __init__(self):
+        self._handlers: Dict[str, HandlerStats] = {}
+        self._stalls: Dict[Tuple[str, ...], List[float]] = {}  # stack -> [count, max seconds]
+        self._started_at: float = time.time()
+        self._heartbeat: float = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._worst_lag: float = 0.0
+        self._stop = threading.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def instrument(self, callback: Callable) -> Callable:
+        """Wraps an event handler so every run is timed; keeps its name for logging."""
+        name = getattr(callback, '__qualname__', callback.__name__)
+        stats = self._handlers.get(name)
+        if stats is None:
+            stats = self._handlers[name] = HandlerStats(name)
+
+        @functools.wraps(callback)
+        async def instrumented(event):
+            started = time.perf_counter()
+            stepped = _SteppedCoroutine(callback(event), stats)
+            try:
+                return await stepped
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.record_call(time.perf_counter() - started, stepped.max_step)
+
+        return instrumented
+
+    def add_event_handler(self, client, callback: Callable, event) -> None:
+        """Registers an instrumented `callback` on `client`."""
+        client.add_event_handler(self.instrument(callback), event)
+
+    def start(self) -> None:
+        """Starts the heartbeat on the running loop and the stall watchdog thread."""
+        if self._loop_thread_id is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._tasks.append(asyncio.create_task(self._beat()))
+        threading.Thread(target=self._watch, name='loop-stall-watchdog', daemon=True).start()
+        logger.info(f'[{self.__class__.__name__}] Loop profiling started.')
+
+    def stop(self) -> None:
+        self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        self._loop_thread_id = None
+
+    async def _beat(self) -> None:
+        """Ticks every `HEARTBEAT_SECONDS`; how late each tick wakes up is the loop lag in `metrics`."""
+        lag = metrics.LOOP_LAG.labels()
+        histogram = metrics.LOOP_LAG_HISTOGRAM.labels()
+        self._heartbeat = time.perf_counter()
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            now = time.perf_counter()
+            delay = max(0.0, now - self._heartbeat - HEARTBEAT_SECONDS)
+            self._heartbeat = now
+            lag.set(delay)
+            histogram.observe(delay)
+
+    def _watch(self) -> None:
+        """Samples the loop thread's stack while the heartbeat is overdue; one sample per stall."""
+        sampled_stall_at = None
+        while not self._stop.wait(STALL_THRESHOLD_SECONDS / 2):
+            heartbeat = self._heartbeat
+            lag = time.perf_counter() - heartbeat - HEARTBEAT_SECONDS
+            if lag > self._worst_lag:
+                self._worst_lag = lag
+            if lag < STALL_THRESHOLD_SECONDS:
+                sampled_stall_at = None
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = tuple(
+                f'{summary.filename.rsplit("/", 1)[-1]}:{summary.lineno} {summary.name}'
+                for summary in traceback.extract_stack(frame)[-STACK_DEPTH:]
+            )
+            if sampled_stall_at == heartbeat:
+                entry = self._stalls.get(stack)
+                if entry is not None and lag > entry[1]:
+                    entry[1] = lag
+                continue
+            sampled_stall_at = heartbeat
+            entry = self._stalls.setdefault(stack, [0, 0.0])
+            entry[0] += 1
+            entry[1] = max(entry[1], lag)
+
+    def reset(self) -> None:
+        for stats in self._handlers.values():
+            stats.reset()
+        self._stalls.clear()
+        self._worst_lag = 0.0
+        self._started_at = time.time()
+
+    def generate_report(self, limit: int = REPORT_LIMIT) -> str:
+        """Top handlers by loop time and the most frequent stalled stacks."""
+        handlers = sorted((item for item in self._handlers.items() if item[1].calls), key=lambda item: item[1].busy_seconds, reverse=True)
+        handler_lines = [
+            HANDLER_LINE.format(
+                name=name, calls=stats.calls, busy_ms=stats.busy_seconds * 1000,
+                max_step_ms=stats.max_step_seconds * 1000, wall_ms=stats.wall_seconds / stats.calls * 1000
+            )
+            for name, stats in handlers[:limit]
+        ]
+        stalls = sorted(self._stalls.items(), key=lambda item: (item[1][0], item[1][1]), reverse=True)
+        stack_lines = [
+            STACK_LINE.format(count=count, max_ms=max_seconds * 1000, frames='\n'.join(f'    {frame}' for frame in stack))
+            for stack, (count, max_seconds) in stalls[:limit]
+        ]
+        return PROFILE_REPORT.format(
+            since=time.strftime('%H:%M:%S', time.localtime(self._started_at)),
+            handlers='\n'.join(handler_lines) or '  None yet.',
+            lag_ms=metrics.LOOP_LAG.labels().value * 1000,
+            worst_lag_ms=self._worst_lag * 1000,
+            stacks='\n'.join(stack_lines) or '  None.'
+        )
+
+
+PROFILER = LoopProfiler()
@@ -1,86 +1,151 @@
+"""Bulk message deletion for `.purge`.
+
+A purge is a small pipeline: one producer pages through the chat history and
+hands chunks of message IDs to a bounded queue, while up to
+`PURGE_MAX_CONCURRENCY` consumers delete chunks. The next pages are fetched
+while deletes are in flight, and the deletes are paced by Telegram's flood
+waits (see `pacing.RequestLimiter`) instead of fixed sleeps. The command
+message is kept until the end and edited with the progress.
+
+Which messages go is a `PurgeQuery` (see `purge_query.py`) for `.purge <count>`
+and `.purge <selectors>`; `.purge` in reply to a message walks everything since.
+"""
 import asyncio
-from telethon import events
-from telethon.errors import ChatAdminRequiredError, MessageDeleteForbiddenError
-from loguru import logger
+import time
+from typing import AsyncIterator, List, Optional
 
-class PurgeManager:
-    """Handles message purging functionality."""
+from loguru import logger
+from telethon.errors import ChatAdminRequiredError, FloodWaitError, MessageDeleteForbiddenError
 
-    def __init__(self, client):
-        self._client = client
+import constants
+from pacing import RequestLimiter
+from purge_query import PURGE_QUERY_USAGE, PurgeQuery
 
-    async def purge_messages(self, event):
-        """Handles the `.purge <count>` and `.purge` (in reply) commands."""
-        logger.info(f"Purge command received: {event.raw_text}")
-        args = event.raw_text.split()
-        reply_msg = await event.get_reply_message()
+PURGE_PROGRESS = "🧹 Purging... {deleted:,} deleted ({rate:,.0f} msg/s, {flood_waits} flood waits)"
+PURGE_DONE = "🧹 Deleted {deleted:,} {what} in {seconds:.1f}s ({rate:,.0f} msg/s)."
 
-        if reply_msg:
-            logger.info("Purging up to replied message...")
-            await self._purge_up_to_reply(event, reply_msg)
-        elif len(args) == 2 and args[1].isdigit():
-            count = int(args[1])
-            logger.info(f"Purging {count} of your messages...")
-            await self._purge_own_messages(event, count)
-        else:
-            logger.warning("Invalid purge command usage.")
-            await event.reply("Usage: `.purge <count>` (your messages) or reply with `.purge` (delete all till replied message)")
 
-    async def _purge_up_to_reply(self, event, reply_msg):
-        """Deletes all messages from the replied message up to the latest message."""
-        chat = event.chat_id
-        to_delete = []
-        deleted_count = 0
+class PurgeJob:
+    """One running purge: the history it walks and its progress."""
 
-        try:
-            async for message in self._client.iter_messages(chat, min_id=reply_msg.id - 1, reverse=True):
-                to_delete.append(message.id)
-                deleted_count += 1
-                if len(to_delete) >= 100:
-                    await self._client.delete_messages(chat, to_delete)
-                    to_delete.clear()
-                    await asyncio.sleep(1)  # Prevents rate limiting
+    __slots__ = ('chat_id', 'keep_id', 'deleted', 'started', 'limiter')
 
-            if to_delete:
-                await self._client.delete_messages(chat, to_delete)
+    def __init__(self, chat_id: int, keep_id: int) -> None:
+        self.chat_id = chat_id
+        self.keep_id = keep_id  # The command message, edited with the progress and deleted last
+        self.deleted = 0
+        self.started = time.monotonic()
+        self.limiter = RequestLimiter(constants.PURGE_MAX_CONCURRENCY)
 
-            confirmation = await event.respond(f" Deleted {deleted_count} messages up to the replied message.")
-            await asyncio.sleep(3)
-            await confirmation.delete()
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.deleted / elapsed if elapsed > 0 else 0.0
 
-        except (ChatAdminRequiredError, MessageDeleteForbiddenError):
-            await event.reply("⚠️ Error: I need 'Delete Messages' permission!")
 
-    async def _purge_own_messages(self, event, count):
-        """Deletes only the user's own messages."""
-        if count <= 0:
-            return await event.reply("⚠️ Count must be greater than 0.")
-
-        chat = event.chat_id
-        to_delete = []
-        deleted_count = 0
+class PurgeManager:
+    """Handles message purging functionality."""
 
-        try:
-            async for message in self._client.iter_messages(chat, from_user=event.sender_id, limit=count):
-                to_delete.append(message.id)
-                deleted_count += 1
-                if len(to_delete) >= 100:
-                    await self._client.delete_messages(chat, to_delete)
-                    to_delete.clear()
-                    await asyncio.sleep(1)  # Prevents rate limiting
+    __slots__ = ('_client',)
 
-            if to_delete:
-                await self._client.delete_messages(chat, to_delete)
+    def __init__(self, client):
+        self._client = client
 
-            confirmation = await event.respond(f" Deleted {deleted_count} of your messages!")
-            await asyncio.sleep(3)
-            await confirmation.delete()
+    async def purge_messages(self, event):
+        """Handles the `.purge <count>`, `.purge <selectors>` and `.purge` (in reply) commands."""
+        args = event.raw_text.split(maxsplit=1)
+        selectors = args[1].strip() if len(args) == 2 else ''
+        reply_msg = await event.get_reply_message()
 
+        if not selectors and reply_msg:
+            logger.info(f'[{self.__class__.__name__}] Purging up to the replied message in {event.chat_id}...')
+            history = self._client.iter_messages(event.chat_id, min_id=reply_msg.id - 1, reverse=True)
+            await self._purge(event, history, 'messages up to the replied message')
+        elif selectors.isdigit():
+            count = int(selectors)
+            if count <= 0:
+                return await event.reply("⚠️ Count must be greater than 0.")
+            logger.info(f'[{self.__class__.__name__}] Purging {count} own messages in {event.chat_id}...')
+            await self._purge_query(event, PurgeQuery(from_user=event.sender_id, limit=count), 'of your messages')
+        elif selectors:
+            try:
+                query = PurgeQuery.parse(selectors, me=event.sender_id)
+            except ValueError as e:
+                return await event.reply(f"⚠️ {e}\n{PURGE_QUERY_USAGE}")
+            if reply_msg:
+                query.min_id = reply_msg.id - 1
+            logger.info(f'[{self.__class__.__name__}] Purging `{selectors}` in {event.chat_id}: {query.request()}')
+            await self._purge_query(event, query, f'messages matching `{selectors}`')
+        else:
+            await event.reply(
+                "Usage: `.purge <count>` (your messages), `.purge <selectors>` or reply with `.purge` "
+                f"(delete all till replied message)\n{PURGE_QUERY_USAGE}"
+            )
+
+    async def _purge_query(self, event, query: PurgeQuery, what: str) -> None:
+        history = query.select(self._client.iter_messages(event.chat_id, **query.request()))
+        await self._purge(event, history, what, limit=query.limit)
+
+    async def _purge(self, event, history: AsyncIterator, what: str, limit: Optional[int] = None) -> None:
+        """Deletes every message of `history` but the command, which reports the progress."""
+        job = PurgeJob(event.chat_id, event.id)
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=constants.PURGE_PREFETCH_CHUNKS)
+        producer = asyncio.create_task(self._fetch(job, history, chunks, limit))
+        consumers = [asyncio.create_task(self._delete(job, chunks)) for _ in range(constants.PURGE_MAX_CONCURRENCY)]
+        reporter = asyncio.create_task(self._report(event, job))
+        try:
+            await asyncio.gather(producer, *consumers)
         except (ChatAdminRequiredError, MessageDeleteForbiddenError):
             await event.reply("⚠️ Error: I need 'Delete Messages' permission!")
-
-    def get_event_handlers(self):
-        """Returns event handlers for purge commands."""
-        return [
-            {"callback": self.purge_messages, "event": events.NewMessage(pattern=r"\.purge(?: |$)(\d*)", outgoing=True)},
-        ]
+            return
+        finally:
+            for task in (producer, *consumers, reporter):
+                task.cancel()
+            await asyncio.gather(producer, *consumers, reporter, return_exceptions=True)
+
+        seconds = time.monotonic() - job.started
+        logger.info(f'[{self.__class__.__name__}] Deleted {job.deleted} messages in {seconds:.1f}s '
+                    f'({job.limiter.flood_waits} flood waits)')
+        await event.edit(PURGE_DONE.format(deleted=job.deleted, what=what, seconds=seconds, rate=job.rate))
+        await asyncio.sleep(constants.PURGE_CONFIRMATION_SECONDS)
+        await event.delete()
+
+    async def _fetch(self, job: PurgeJob, history: AsyncIterator, chunks: asyncio.Queue, limit: Optional[int]) -> None:
+        """Producer: fills the queue with chunks of IDs, then one end marker per consumer."""
+        chunk: List[int] = []
+        fetched = 0
+        async for message in history:
+            if message.id == job.keep_id:
+                continue
+            chunk.append(message.id)
+            fetched += 1
+            if len(chunk) >= constants.PURGE_CHUNK_SIZE:
+                await chunks.put(chunk)
+                chunk = []
+            if limit is not None and fetched >= limit:
+                break
+        if chunk:
+            await chunks.put(chunk)
+        for _ in range(constants.PURGE_MAX_CONCURRENCY):
+            await chunks.put(None)
+
+    async def _delete(self, job: PurgeJob, chunks: asyncio.Queue) -> None:
+        """Consumer: deletes chunks as the limiter lets it, retrying a chunk after a flood wait."""
+        while (chunk := await chunks.get()) is not None:
+            while True:
+                try:
+                    async with job.limiter.slot():
+                        await self._client.delete_messages(job.chat_id, chunk)
+                except FloodWaitError:
+                    continue  # The limiter waits it out before the retry
+                job.deleted += len(chunk)
+                break
+
+    async def _report(self, event, job: PurgeJob) -> None:
+        """Edits the command message with the progress until the purge ends."""
+        while True:
+            await asyncio.sleep(constants.PURGE_PROGRESS_SECONDS)
+            try:
+                await event.edit(PURGE_PROGRESS.format(deleted=job.deleted, rate=job.rate, flood_waits=job.limiter.flood_waits))
+            except Exception as e:
+                logger.debug(f'[{self.__class__.__name__}] Could not update the purge progress: {e}')
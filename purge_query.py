@@ -0,0 +1,150 @@
+"""Selectors of `.purge`, split into what Telegram filters and what is checked locally.
+
+    .purge from:@user since:2d media:photo contains:"/hunt" limit:500
+
+`from:` (`me`, `@username` or an ID), `media:` types Telegram can filter by,
+the first `contains:`, `until:` (as `offset_date`) and a replied-to message (as
+`min_id`) go into the history request, so Telegram only returns candidates.
+The rest runs locally on that stream: every `contains:` is matched exactly (as
+a case-insensitive substring, which Telegram's word search is not), `media:`
+kinds without a server filter are checked per message, and `since:` ends the
+stream at the first older message, as history comes newest first.
+
+Durations are `<number><s|m|h|d|w>` back from now; dates are ISO 8601 (UTC
+unless they carry an offset).
+"""
+from __future__ import annotations
+
+import re
+import shlex
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+
+from telethon.tl import types
+
+# `media:` kinds Telegram filters by
+SERVER_MEDIA_FILTERS = {
+    'photo': types.InputMessagesFilterPhotos,
+    'video': types.InputMessagesFilterVideo,
+    'photovideo': types.InputMessagesFilterPhotoVideo,
+    'document': types.InputMessagesFilterDocument,
+    'gif': types.InputMessagesFilterGif,
+    'voice': types.InputMessagesFilterVoice,
+    'music': types.InputMessagesFilterMusic,
+    'round': types.InputMessagesFilterRoundVideo,
+    'url': types.InputMessagesFilterUrl,
+    'poll': types.InputMessagesFilterPoll,
+    'geo': types.InputMessagesFilterGeo,
+    'contact': types.InputMessagesFilterContacts,
+}
+# `media:` kinds checked on each message
+LOCAL_MEDIA_FILTERS: Dict[str, Callable[[Any], bool]] = {
+    'any': lambda message: message.media is not None,
+    'none': lambda message: message.media is None,
+    'sticker': lambda message: getattr(message, 'sticker', None) is not None,
+}
+DURATION_REGEX = re.compile(r'^(\d+)([smhdw])$')
+DURATION_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+SELECTORS = ('from', 'since', 'until', 'media', 'contains', 'limit')
+PURGE_QUERY_USAGE = 'Selectors: ' + ' '.join(f'`{selector}:`' for selector in SELECTORS) + \
+    ', e.g. `.purge from:me since:2d contains:"/hunt"`'
+
+
+def parse_time(value: str, now: datetime) -> datetime:
+    """A duration back from `now`, or an ISO 8601 date."""
+    match = DURATION_REGEX.match(value)
+    if match is not None:
+        return now - timedelta(**{DURATION_UNITS[match.group(2)]: int(match.group(1))})
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid time `{value}`; use e.g. `2d`, `3h` or `2024-05-01`') from None
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=timezone.utc)
+
+
+class PurgeQuery:
+    """Which messages a purge deletes."""
+
+    __slots__ = ('from_user', 'since', 'until', 'media_filter', 'search', 'texts', 'local_checks', 'limit', 'min_id')
+
+    def __init__(self, from_user: Optional[Union[int, str]] = None, limit: Optional[int] = None) -> None:
+        self.from_user = from_user
+        self.since: Optional[datetime] = None
+        self.until: Optional[datetime] = None
+        self.media_filter = None  # One of `SERVER_MEDIA_FILTERS`
+        self.search: Optional[str] = None  # Sent to Telegram; matched exactly below
+        self.texts: List[str] = []  # Lowercase substrings every message must contain
+        self.local_checks: List[Callable[[Any], bool]] = []
+        self.limit = limit
+        self.min_id = 0
+
+    @classmethod
+    def parse(cls, text: str, me: int, now: Optional[datetime] = None) -> 'PurgeQuery':
+        """Parses selectors; raises ValueError on anything it does not understand."""
+        now = now or datetime.now(timezone.utc)
+        try:
+            tokens = shlex.split(text)
+        except ValueError as e:
+            raise ValueError(f'Invalid selectors: {e}') from None
+        query = cls()
+        for token in tokens:
+            key, _, value = token.partition(':')
+            if token.isdigit():
+                key, value = 'limit', token
+            elif key not in SELECTORS or not value:
+                raise ValueError(f'Unknown selector `{token}`')
+
+            if key == 'from':
+                query.from_user = me if value == 'me' else int(value) if value.lstrip('-').isdigit() else value
+            elif key == 'since':
+                query.since = parse_time(value, now)
+            elif key == 'until':
+                query.until = parse_time(value, now)
+            elif key == 'media':
+                kind = value.lower()
+                if kind in SERVER_MEDIA_FILTERS:
+                    if query.media_filter is not None:
+                        raise ValueError('Telegram filters by one `media:` type at a time')
+                    query.media_filter = SERVER_MEDIA_FILTERS[kind]
+                elif kind in LOCAL_MEDIA_FILTERS:
+                    query.local_checks.append(LOCAL_MEDIA_FILTERS[kind])
+                else:
+                    known = ', '.join([*SERVER_MEDIA_FILTERS, *LOCAL_MEDIA_FILTERS])
+                    raise ValueError(f'Unknown media `{value}`; use one of: {known}')
+            elif key == 'contains':
+                query.search = query.search or value
+                query.texts.append(value.lower())
+            elif key == 'limit':
+                if not value.isdigit() or int(value) <= 0:
+                    raise ValueError(f'Invalid limit `{value}`')
+                query.limit = int(value)
+        return query
+
+    def request(self) -> Dict[str, Any]:
+        """Keyword arguments of `iter_messages` for the server-side part."""
+        kwargs: Dict[str, Any] = {}
+        if self.from_user is not None:
+            kwargs['from_user'] = self.from_user
+        if self.media_filter is not None:
+            kwargs['filter'] = self.media_filter
+        if self.search:
+            kwargs['search'] = self.search
+        if self.until is not None:
+            kwargs['offset_date'] = self.until
+        if self.min_id:
+            kwargs['min_id'] = self.min_id
+        if self.limit is not None and not (self.texts or self.local_checks):
+            kwargs['limit'] = self.limit + 1  # +1: the command message, which matches `from:me` but is kept
+        return kwargs
+
+    async def select(self, messages: AsyncIterator) -> AsyncIterator:
+        """The messages of the server's answer that pass the local checks, newest first."""
+        async for message in messages:
+            if self.since is not None and message.date is not None and message.date < self.since:
+                return  # Everything after this is older still
+            if self.texts:
+                text = (message.raw_text or '').lower()
+                if not all(part in text for part in self.texts):
+                    continue
+            if all(check(message) for check in self.local_checks):
+                yield message
@@ -0,0 +1,67 @@
+"""Keeping an account's engines alive across Telegram client restarts.
+
+The Manager and every subsystem talk to Telegram through one `ClientHandle`
+per account. When the connection is lost, `main.run_account` logs in with a
+new `TelegramClient` and rebinds the handle to it: event handlers are
+re-registered on the new client and the engines keep their state.
+"""
+from __future__ import annotations
+
+import random
+from typing import Callable, List, Optional, Tuple
+
+import constants
+
+
+class ClientHandle:
+    """Forwards everything to the account's current client and remembers its event handlers."""
+
+    __slots__ = ('_client', '_handlers')
+
+    def __init__(self, client) -> None:
+        self._client = client
+        self._handlers: List[Tuple[Callable, object]] = []
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+    def __call__(self, *args, **kwargs):
+        return self._client(*args, **kwargs)
+
+    @property
+    def client(self):
+        return self._client
+
+    def add_event_handler(self, callback: Callable, event=None) -> None:
+        self._handlers.append((callback, event))
+        self._client.add_event_handler(callback, event)
+
+    def rebind(self, client) -> None:
+        """Switches to `client` and registers every known event handler on it."""
+        self._client = client
+        for callback, event in self._handlers:
+            client.add_event_handler(callback, event)
+
+
+class Backoff:
+    """Jittered exponential delays between reconnects; a flood wait is always honoured in full."""
+
+    __slots__ = ('_initial', '_maximum', '_delay')
+
+    def __init__(self, initial: float = constants.RECONNECT_INITIAL_SECONDS,
+                 maximum: float = constants.RECONNECT_MAX_SECONDS) -> None:
+        self._initial = initial
+        self._maximum = maximum
+        self._delay = initial
+
+    def reset(self) -> None:
+        self._delay = self._initial
+
+    def next_delay(self, error: Optional[BaseException] = None) -> float:
+        """The delay before the next attempt; doubles with every call until `reset`."""
+        delay = random.uniform(self._delay / 2, self._delay)
+        self._delay = min(self._delay * 2, self._maximum)
+        flood_wait = getattr(error, 'seconds', None)
+        if isinstance(flood_wait, (int, float)):
+            delay = max(delay, flood_wait + random.uniform(0, self._initial))
+        return delay
@@ -1,92 +1,430 @@
+"""Releases the Pokémon of the release list through Hexa's `/release` dialogue.
+
+Releasing one Pokémon takes three steps, each answered by Hexa:
+
+    /release <name>   -> a new message listing the matching Pokémon as buttons
+    click a copy      -> that message is edited into a Release/Cancel confirmation
+    click `Release`   -> that message is edited into the final verdict
+
+Every step waits on a future that the NewMessage/MessageEdited handlers resolve
+as soon as the answer arrives. A new message is correlated to the command it
+replies to (or, if Hexa did not reply, to what it lists), and an edit to the
+message that was clicked, so hunts running in the same chat never answer a
+release. Orders are worked off one queue by a single worker; the final click of
+one order is confirmed in the background while the next `/release` goes out.
+
+An order is a (name, level) pair. Names of the release list carry no level and
+release whichever copy Hexa lists first, copy after copy until Hexa answers
+that none is left; only then does the name leave the list. `.release scan` pages through Hexa's
+collection listing once into an `Inventory`, `.release select <rule>` turns it
+into a `ReleasePlan` of exact copies (see `inventory.py`), and `.release run`
+queues the whole plan at once and keeps a progress message up to date.
+"""
+from __future__ import annotations
+
 import asyncio
-from telethon import events
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import regex
 from loguru import logger
+from telethon import events
+from telethon.errors import FloodWaitError
+
+import constants
+from inventory import Inventory, ReleaseOrder, ReleasePlan, parse_inventory_page
+from pacing import PacingScheduler
+from profiler import PROFILER
+
+
+class PendingPrompt:
+    """A command waiting for Hexa's answer."""
+
+    __slots__ = ('chat_id', 'accepts', 'command_id', 'future')
+
+    def __init__(self, chat_id: int, accepts: Callable[[Any], bool]) -> None:
+        self.chat_id = chat_id
+        self.accepts = accepts  # Whether a message that is not a reply answers the command
+        self.command_id: Optional[int] = None  # Known once the command is sent
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def answered_by(self, message) -> bool:
+        if message.chat_id != self.chat_id:
+            return False
+        if message.reply_to_msg_id is not None and self.command_id is not None:
+            return message.reply_to_msg_id == self.command_id
+        return self.accepts(message)
+
+
+def _lists_copies_of(name: str) -> Callable[[Any], bool]:
+    """Accepts a list of buttons naming the Pokémon."""
+    return lambda message: any(name in button.text.lower() for row in message.buttons or [] for button in row)
+
+
+def _is_inventory_page(message) -> bool:
+    return parse_inventory_page(message.raw_text or '') is not None
+
 
 class PokemonReleaseManager:
-    def __init__(self, client):
+    """Releases the Pokémon of the release list, or of a release plan, in the chat where releasing was started."""
+
+    __slots__ = (
+        'client', 'pacer', 'release_task', 'running', 'current_chat_id', 'release_list', 'released',
+        'inventory', 'plan', '_queue', '_attempts', '_prompts', '_edits', '_background', '_reporter'
+    )
+
+    def __init__(self, client, pacer: PacingScheduler) -> None:
         self.client = client
-        self.release_task = None
+        self.pacer = pacer  # Shared PacingScheduler of this account
+        self.release_task: Optional[asyncio.Task] = None
         self.running = False
-        self.current_chat_id = None  # Stores the chat where `.release on` was used
-        self.release_list = set()  # Pokémon to be released
+        self.current_chat_id: Optional[int] = None  # Stores the chat where `.release on` was used
+        self.release_list: Set[str] = set()  # Pokémon to be released
+        self.released = 0  # Pokémon released since startup
+        self.inventory: Optional[Inventory] = None  # Latest `.release scan`
+        self.plan: Optional[ReleasePlan] = None  # Latest `.release select`
+        self._queue: asyncio.Queue = asyncio.Queue()  # Orders waiting for the worker
+        self._attempts: Dict[ReleaseOrder, int] = {}  # Failed attempts per queued order
+        self._prompts: List[PendingPrompt] = []  # Commands waiting for Hexa's answer
+        self._edits: Dict[int, asyncio.Future] = {}  # Clicked message ID -> its next edit
+        self._background: Set[asyncio.Task] = set()  # Confirmations and progress edits
+        self._reporter: Optional[asyncio.Task] = None  # Periodic progress edits of the running plan
+
+    def start(self) -> None:
+        """Registers the handlers receiving Hexa's answers."""
+        for handler in self.event_handlers:
+            PROFILER.add_event_handler(self.client, handler['callback'], handler['event'])
+            logger.info(f'[{self.__class__.__name__}] Registered event handler: `{handler["callback"].__name__}`')
+
+    async def on_hexa_message(self, event: events.NewMessage.Event) -> None:
+        """Resolves the pending command the message answers."""
+        for prompt in self._prompts:
+            if not prompt.future.done() and prompt.answered_by(event.message):
+                prompt.future.set_result(event.message)
+                return
 
-    async def release_pokemon(self):
-        """Releases Pokémon in the chat where `.release on` was used."""
+    async def on_hexa_edit(self, event: events.MessageEdited.Event) -> None:
+        """Resolves the click waiting for this edit."""
+        future = self._edits.pop(event.message.id, None)
+        if future is not None and not future.done():
+            future.set_result(event.message)
+
+    async def release_pokemon(self) -> None:
+        """Releases the queued orders one after the other while releasing is on."""
         while self.running:
+            order = await self._queue.get()
+            if not self._wanted(order):
+                continue  # Removed, or its plan replaced, while queued
             try:
-                if not self.current_chat_id:
-                    logger.warning("No active chat ID for release. Stopping...")
-                    self.running = False
-                    return  
-
-                for pokemon in list(self.release_list):  # Convert to list to avoid set mutation issues
-                    logger.info(f"Releasing {pokemon} in chat {self.current_chat_id}...")
-                    
-                    while self.running:
-                        await self.client.send_message(self.current_chat_id, f"/release {pokemon}")
-                        await asyncio.sleep(2)  # Wait for bot response
-
-                        async for message in self.client.iter_messages(self.current_chat_id, limit=1):
-                            if message.buttons:
-                                # Step 1: Select the first Pokémon if multiple exist
-                                await message.click(0, 0)  # Click first button [1]
-                                await asyncio.sleep(4)  # Wait for next bot response
-
-                                # Step 2: Confirm release by clicking the first "Release" button
-                                async for confirm_message in self.client.iter_messages(self.current_chat_id, limit=1):
-                                    if confirm_message.buttons:
-                                        for i, row in enumerate(confirm_message.buttons):
-                                            for j, button in enumerate(row):
-                                                if "Release" in button.text:
-                                                    await confirm_message.click(i, j)  # Click the "Release" button
-                                                    logger.info(f"{pokemon} released!")
-                                                    break
-
-                                await asyncio.sleep(2)  # Wait for confirmation
-                                break  # Move to the next Pokémon
-
-                        await asyncio.sleep(3)  # Wait before releasing the next Pokémon
-
-                    self.release_list.remove(pokemon)  # Remove from list after releasing
-
+                await self._release(order)
+            except asyncio.CancelledError:
+                self._queue.put_nowait(order)  # Resumed after a reconnect
+                raise
+            except (asyncio.TimeoutError, LookupError, FloodWaitError) as e:
+                self._retry(order, f'{e.__class__.__name__}: {e}' if str(e) else 'No answer from Hexa')
             except Exception as e:
-                logger.error(f"Error: {e}")
-                await asyncio.sleep(5)  # Retry delay
+                logger.exception(f'[{self.__class__.__name__}] Error releasing {order[0]}: {e}')
+                self._retry(order, str(e))
+
+    def _wanted(self, order: ReleaseOrder) -> bool:
+        name, level = order
+        if level is None:
+            return name in self.release_list
+        return self.plan is not None and order in self.plan.pending
+
+    async def _request(self, chat_id: int, command: str, accepts: Callable[[Any], bool]):
+        """Sends a command and returns Hexa's answer to it."""
+        prompt = PendingPrompt(chat_id, accepts)
+        self._prompts.append(prompt)  # Before sending: the answer may beat `send_message`
+        try:
+            async with self.pacer.pace():
+                message = await self.client.send_message(chat_id, command)
+            prompt.command_id = message.id
+            return await asyncio.wait_for(prompt.future, constants.RELEASE_REPLY_TIMEOUT_SECONDS)
+        finally:
+            self._prompts.remove(prompt)
+
+    async def _release(self, order: ReleaseOrder) -> None:
+        """Walks Hexa's dialogue for one order; the final click is confirmed in the background."""
+        name, level = order
+        choices = await self._request(self.current_chat_id, f'/release {name}', _lists_copies_of(name))
+        if not choices.buttons:
+            logger.info(f'[{self.__class__.__name__}] Nothing to release for {name}: {choices.raw_text}')
+            self._finish(order, False, owned=False)
+            return
+
+        if level is None:
+            position = (0, 0)  # Selects the first Pokémon if several match
+        else:
+            pattern = regex.compile(rf'Lv\.?\s*{level}\b')
+            position = self._find_button(choices, lambda text: pattern.search(text) is not None)
+            if position is None:
+                logger.info(f'[{self.__class__.__name__}] No {name} of level {level} left to release.')
+                self._finish(order, False, owned=False)
+                return
+        confirmation = await self._click(choices, *position)
+        position = self._find_button(confirmation, lambda text: 'Release' in text)
+        if position is None:
+            raise LookupError(f'No Release button in: {confirmation.raw_text}')
+        self._run_in_background(self._confirm(order, confirmation, *position))
+
+    async def _confirm(self, order: ReleaseOrder, confirmation, i: int, j: int) -> None:
+        try:
+            verdict = await self._click(confirmation, i, j)
+        except asyncio.CancelledError:
+            self._queue.put_nowait(order)
+            raise
+        except (asyncio.TimeoutError, LookupError, FloodWaitError) as e:
+            self._retry(order, f'{e.__class__.__name__}: {e}' if str(e) else 'No answer from Hexa')
+            return
+        logger.info(f'[{self.__class__.__name__}] {order[0].capitalize()} released: {verdict.raw_text}')
+        self._finish(order, True)
+
+    async def _click(self, message, i: int, j: int):
+        """Clicks a button and returns the message once Hexa edited it."""
+        future = self._edits[message.id] = asyncio.get_running_loop().create_future()
+        try:
+            async with self.pacer.pace():
+                await message.click(i, j)
+            return await asyncio.wait_for(future, constants.CLICK_CONFIRM_TIMEOUT_SECONDS)
+        finally:
+            if self._edits.get(message.id) is future:
+                del self._edits[message.id]
+
+    @staticmethod
+    def _find_button(message, matches: Callable[[str], bool]) -> Optional[Tuple[int, int]]:
+        for i, row in enumerate(message.buttons or []):
+            for j, button in enumerate(row):
+                if matches(button.text):
+                    return i, j
+        return None
+
+    def _run_in_background(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
 
-    async def start_releasing(self, event):
+    def _finish(self, order: ReleaseOrder, released: bool, owned: bool = True) -> None:
+        """Settles an order: released, not owned (anymore) or given up on.
+
+        A listed name stays listed until Hexa reports none is left: after each
+        released copy it is queued again, and after giving up it waits for the
+        next `.release on`.
+        """
+        name, level = order
+        self._attempts.pop(order, None)
+        if released:
+            self.released += 1
+            if self.inventory is not None:
+                self.inventory.remove(name, level)
+        if level is None:
+            if not owned:
+                self.release_list.discard(name)
+            elif released and self.running and self._wanted(order):
+                self._queue.put_nowait(order)
+            return
+        plan = self.plan
+        if plan is not None and order in plan.pending:
+            plan.finish(order, released)
+            if plan.finished:
+                logger.info(f'[{self.__class__.__name__}] Plan `{plan.rule}` finished: {plan.released}/{plan.total} released')
+                if self._reporter is not None:
+                    self._reporter.cancel()
+                    self._reporter = None
+                self._run_in_background(self._report_progress(plan))
+
+    def _retry(self, order: ReleaseOrder, reason: str) -> None:
+        """Queues the order again, or gives up on it after `RELEASE_MAX_ATTEMPTS`."""
+        attempts = self._attempts.get(order, 0) + 1
+        name = order[0]
+        if attempts >= constants.RELEASE_MAX_ATTEMPTS:
+            logger.warning(f'[{self.__class__.__name__}] Giving up on {name} after {attempts} attempts: {reason}')
+            self._finish(order, False)
+            return
+        logger.warning(f'[{self.__class__.__name__}] Retrying {name} ({attempts}/{constants.RELEASE_MAX_ATTEMPTS}): {reason}')
+        self._attempts[order] = attempts
+        if self.running and self._wanted(order):
+            self._queue.put_nowait(order)
+
+    def _enqueue(self, orders) -> None:
+        for order in orders:
+            self._queue.put_nowait(order)
+
+    def _fill_queue(self) -> None:
+        """Queues the unfinished plan, then the release list."""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._attempts.clear()
+        if self.plan is not None and self.plan.started_at is not None:
+            self._enqueue(self.plan.pending.elements())
+        self._enqueue((name, None) for name in sorted(self.release_list))
+
+    async def _report_progress(self, plan: ReleasePlan) -> None:
+        """Edits the plan's progress message."""
+        try:
+            async with self.pacer.pace():
+                await self.client.edit_message(plan.chat_id, plan.message_id, plan.progress())
+        except Exception as e:
+            logger.warning(f'[{self.__class__.__name__}] Could not update the release progress: {e}')
+
+    async def _report_periodically(self, plan: ReleasePlan) -> None:
+        while not plan.finished:
+            await asyncio.sleep(constants.RELEASE_PROGRESS_SECONDS)
+            await self._report_progress(plan)
+
+    async def _scan(self, chat_id: int) -> Inventory:
+        """Pages through Hexa's collection listing once."""
+        message = await self._request(chat_id, constants.INVENTORY_COMMAND, _is_inventory_page)
+        page = parse_inventory_page(message.raw_text or '')
+        copies = {}
+        while True:
+            for position, (index, copy) in enumerate(page.entries):
+                copies[index if index is not None else (page.page, position)] = copy  # A page shown twice counts once
+            if page.page >= page.pages:
+                return Inventory(copies.values(), pages=page.pages)
+            position = self._find_button(message, lambda text: constants.INVENTORY_NEXT_BUTTON in text)
+            if position is None:
+                raise LookupError(f'No next page button on page {page.page}/{page.pages}')
+            message = await self._click(message, *position)
+            next_page = parse_inventory_page(message.raw_text or '')
+            if next_page is None or next_page.page <= page.page:
+                raise LookupError(f'The listing did not advance past page {page.page}/{page.pages}')
+            page = next_page
+
+    def checkpoint(self) -> Optional[Dict[str, Any]]:
+        """State kept across restarts (see `state_store.py`); nothing while there is nothing to release and releasing is off."""
+        plan = self.plan if self.plan is not None and self.plan.started_at is not None and not self.plan.finished else None
+        if not self.release_list and not self.running and plan is None:
+            return None
+        return {
+            'release_list': sorted(self.release_list),
+            'running': self.running,
+            'chat_id': self.current_chat_id,
+            'plan': plan.checkpoint() if plan is not None else None,
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Restores the release list and the unfinished plan, and resumes releasing if it was running."""
+        self.release_list = set(state.get('release_list', []))
+        self.current_chat_id = state.get('chat_id')
+        self.running = bool(state.get('running')) and self.current_chat_id is not None
+        if state.get('plan'):
+            self.plan = ReleasePlan.restore(state['plan'])
+            self.plan.started_at = time.time()
+        if self.running:
+            self._fill_queue()
+        self.start_tasks()
+
+    def start_tasks(self) -> None:
+        """Resumes releasing after a reconnect if it was running."""
+        if not self.running:
+            return
+        if self.release_task is None:
+            self.release_task = asyncio.create_task(self.release_pokemon())
+        plan = self.plan
+        if self._reporter is None and plan is not None and plan.started_at is not None and not plan.finished:
+            self._reporter = asyncio.create_task(self._report_periodically(plan))
+
+    async def stop_tasks(self) -> None:
+        """Cancels the worker, confirmations and progress edits, keeping `running` so it resumes after a reconnect."""
+        tasks = [task for task in (self.release_task, self._reporter, *self._background) if task is not None]
+        self.release_task = self._reporter = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._edits.clear()
+
+    async def start_releasing(self, event: events.NewMessage.Event) -> None:
         """Starts the auto-release process in the chat where the command was sent."""
         if not self.running:
             self.running = True
             self.current_chat_id = event.chat_id  # Store chat ID
-            self.release_task = asyncio.create_task(self.release_pokemon())
-            await event.edit("Pokémon auto-release started in this chat!")  
+            self._fill_queue()
+            self.start_tasks()
+            await event.edit(f"Pokémon auto-release started in this chat! ({self._queue.qsize()} queued)")
         else:
-            await event.edit("Release is already running!")  
+            await event.edit("Release is already running!")
 
-    async def stop_releasing(self, event):
-        """Stops the release process."""
+    async def stop_releasing(self, event: events.NewMessage.Event) -> None:
+        """Stops the release process; Pokémon not released yet stay on the list, and in the plan."""
         if self.running:
             self.running = False
-            if self.release_task:
-                self.release_task.cancel()
-                self.release_task = None
-            self.current_chat_id = None  
-            await event.edit("Pokémon auto-release stopped!")  
+            await self.stop_tasks()
+            self.current_chat_id = None
+            await event.edit(f"Pokémon auto-release stopped! {self.released} released so far.")
         else:
-            await event.edit("No active release process.")  
+            await event.edit("No active release process.")
 
-    async def add_pokemon(self, event):
-        """Adds a Pokémon to the release list."""
-        args = event.pattern_match.group(1)
-        if not args:
-            await event.edit("**Usage:** `.release add <pokemon>`")
+    async def scan_inventory(self, event: events.NewMessage.Event) -> None:
+        """Indexes the account's Pokémon from Hexa's collection listing."""
+        await event.edit("Scanning your Pokémon...")
+        started = time.monotonic()
+        try:
+            self.inventory = await self._scan(event.chat_id)
+        except (asyncio.TimeoutError, LookupError) as e:
+            await event.edit(f"Scan failed: {e or 'no answer from Hexa'}")
             return
-        pokemon_name = args.strip().lower()
-        self.release_list.add(pokemon_name)
-        await event.edit(f"**{pokemon_name.capitalize()}** added to the release list!")
+        inventory = self.inventory
+        logger.info(f'[{self.__class__.__name__}] Scanned {len(inventory)} Pokémon in {time.monotonic() - started:.1f}s')
+        await event.edit(
+            f"**Scanned** {len(inventory)} Pokémon of {len(inventory.species)} species "
+            f"({inventory.duplicates} duplicates) from {inventory.pages} pages.\n"
+            "Select what to release with `.release select <rule>`."
+        )
+
+    async def select_pokemon(self, event: events.NewMessage.Event) -> None:
+        """Plans the release of the scanned Pokémon matching a rule."""
+        if self.inventory is None:
+            await event.edit("Scan your Pokémon first with `.release scan`.")
+            return
+        if self.plan is not None and self.plan.started_at is not None and not self.plan.finished and self.running:
+            await event.edit("A release plan is still running; stop it with `.release off` first.")
+            return
+        try:
+            self.plan = self.inventory.plan(event.pattern_match.group(1))
+        except ValueError as e:
+            await event.edit(f"{e}\n**Example:** `.release select duplicate and level < 10 and not team`")
+            return
+        await event.edit(f"{self.plan.preview()}\nSend `.release run` to release them.")
+
+    async def run_plan(self, event: events.NewMessage.Event) -> None:
+        """Releases the selected Pokémon as one batch, reporting progress in the command's message."""
+        plan = self.plan
+        if plan is None or plan.finished:
+            await event.edit("Nothing planned; use `.release select <rule>` first.")
+            return
+        if plan.started_at is None:
+            plan.started_at = time.time()
+        plan.chat_id, plan.message_id = event.chat_id, event.message.id
+        if not self.running:
+            self.running = True
+            self.current_chat_id = event.chat_id
+        self._fill_queue()
+        self.start_tasks()
+        await event.edit(plan.progress())
 
-    async def remove_pokemon(self, event):
-        """Removes a Pokémon from the release list."""
+    @staticmethod
+    def _names(args: Optional[str]) -> List[str]:
+        """Lowercase names of a command argument; several are separated by commas."""
+        return [name.strip().lower() for name in (args or '').split(',') if name.strip()]
+
+    async def add_pokemon(self, event: events.NewMessage.Event) -> None:
+        """Adds Pokémon to the release list, queueing them right away while releasing is on."""
+        names = self._names(event.pattern_match.group(1))
+        if not names:
+            await event.edit("**Usage:** `.release add <pokemon>[, <pokemon>...]`")
+            return
+        added = [name for name in dict.fromkeys(names) if name not in self.release_list]
+        self.release_list.update(added)
+        if self.running:
+            self._enqueue((name, None) for name in added)
+        if len(names) == 1:
+            await event.edit(f"**{names[0].capitalize()}** added to the release list!")
+        else:
+            await event.edit(f"**{len(names)}** Pokémon added to the release list!")
+
+    async def remove_pokemon(self, event: events.NewMessage.Event) -> None:
+        """Removes a Pokémon from the release list; a queued name is skipped."""
         args = event.pattern_match.group(1)
         if not args:
             await event.edit("**Usage:** `.release remove <pokemon>`")
@@ -98,7 +436,7 @@ class PokemonReleaseManager:
         else:
             await event.edit(f"**{pokemon_name.capitalize()}** is not in the release list.")
 
-    async def list_pokemon(self, event):
+    async def list_pokemon(self, event: events.NewMessage.Event) -> None:
         """Shows the Pokémon set for release."""
         if not self.release_list:
             await event.edit("Your release list is empty!")
@@ -106,13 +444,24 @@ class PokemonReleaseManager:
             release_list_str = ", ".join(sorted(self.release_list))
             await event.edit(f"**Pokémon set for release:**\n{release_list_str}")
 
-    async def show_release_help(self, event):
+    async def show_release_help(self, event: events.NewMessage.Event) -> None:
         """Shows available release commands."""
         release_help_message = """**Release Pokémon Commands**
-• `.release on` - Start auto-releasing Pokémon  
-• `.release off` - Stop auto-releasing Pokémon  
-• `.release add <pokemon>` - Add a Pokémon to the release list  
-• `.release remove <pokemon>` - Remove a Pokémon from the release list  
-• `.release list` - Show the list of Pokémon set for release  
+• `.release on` - Start auto-releasing Pokémon
+• `.release off` - Stop auto-releasing Pokémon
+• `.release add <pokemon>[, <pokemon>...]` - Add Pokémon to the release list
+• `.release remove <pokemon>` - Remove a Pokémon from the release list
+• `.release list` - Show the list of Pokémon set for release
+• `.release scan` - Index your Pokémon from Hexa's collection
+• `.release select <rule>` - Plan releasing the scanned Pokémon matching a rule
+• `.release run` - Release the planned Pokémon
 """
         await event.edit(release_help_message)
+
+    @property
+    def event_handlers(self) -> List[Dict[str, Callable | events.NewMessage]]:
+        """Hexa's answers to the release dialogue."""
+        return [
+            {'callback': self.on_hexa_message, 'event': events.NewMessage(incoming=True, from_users=constants.HEXA_BOT_ID)},
+            {'callback': self.on_hexa_edit, 'event': events.MessageEdited(incoming=True, from_users=constants.HEXA_BOT_ID)},
+        ]
@@ -0,0 +1,93 @@
+"""Perceptual matching of stripped thumbnails, used when the exact digest lookup misses."""
+import io
+from typing import Iterable, List, Optional, Tuple
+
+from loguru import logger
+from PIL import Image, UnidentifiedImageError
+from telethon.utils import stripped_photo_to_jpg
+
+HASH_GRID_SIZE = 16  # 16x16 difference hash, 256 bits
+HASH_BITS = HASH_GRID_SIZE * HASH_GRID_SIZE
+MAX_DISTANCE = 20  # Telegram re-encodes stay well below this; distinct species can be as close as 4 bits
+MIN_MARGIN = 3  # Required gap between the best and the second best candidate
+
+
+def perceptual_hash(data: bytes) -> Optional[int]:
+    """Computes a difference hash of a stripped thumbnail.
+
+    The preview is expanded to a JPEG, decoded to a (HASH_GRID_SIZE + 1) x HASH_GRID_SIZE
+    grayscale grid and each bit records whether a pixel is brighter than its right neighbour.
+
+    Returns:
+        The hash as an integer, or None when the thumbnail cannot be decoded.
+    """
+    try:
+        image = Image.open(io.BytesIO(stripped_photo_to_jpg(data)))
+        pixels = image.convert('L').resize((HASH_GRID_SIZE + 1, HASH_GRID_SIZE), Image.BILINEAR).tobytes()
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        logger.debug(f'Cannot decode stripped thumbnail: {e}')
+        return None
+
+    value = 0
+    row_size = HASH_GRID_SIZE + 1
+    for y in range(HASH_GRID_SIZE):
+        row = pixels[y * row_size:(y + 1) * row_size]
+        for x in range(HASH_GRID_SIZE):
+            value = (value << 1) | (row[x] > row[x + 1])
+    return value
+
+
+class SimilarityIndex:
+    """Nearest-neighbour search over perceptual hashes with a confidence threshold.
+
+    A full Hamming-distance scan over ~1,000 species takes a fraction of a millisecond
+    with `int.bit_count`, so no tree structure is needed.
+    """
+
+    __slots__ = ('_hashes', '_names')
+
+    def __init__(self):
+        self._hashes: List[int] = []
+        self._names: List[str] = []
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[str, bytes]]) -> 'SimilarityIndex':
+        """Builds the index from `(name, data)` pairs. Decoding is CPU bound; run it off the event loop."""
+        index = cls()
+        for name, data in items:
+            index.learn(name, data)
+        logger.info(f'[{cls.__name__}] Hashed {len(index)} species.')
+        return index
+
+    def learn(self, name: str, data: bytes) -> None:
+        """Adds the thumbnail of `name` to the index."""
+        value = perceptual_hash(data)
+        if value is None:
+            return
+        self._hashes.append(value)
+        self._names.append(name)
+
+    def nearest(self, data: bytes) -> Optional[Tuple[str, float]]:
+        """Returns `(name, confidence)` of the closest species, or None when no match is confident enough."""
+        value = perceptual_hash(data)
+        if value is None or not self._hashes:
+            return None
+
+        best_distance = second_distance = HASH_BITS + 1
+        best_slot = -1
+        for slot, candidate in enumerate(self._hashes):
+            distance = (value ^ candidate).bit_count()
+            if distance < best_distance:
+                if best_slot < 0 or self._names[best_slot] != self._names[slot]:
+                    second_distance = best_distance
+                best_distance = distance
+                best_slot = slot
+            elif distance < second_distance and self._names[slot] != self._names[best_slot]:
+                second_distance = distance
+
+        if best_distance > MAX_DISTANCE or second_distance - best_distance < MIN_MARGIN:
+            return None
+        return self._names[best_slot], 1 - best_distance / HASH_BITS
+
+    def __len__(self) -> int:
+        return len(self._hashes)
@@ -1,12 +1,15 @@
 import asyncio
 from telethon import events
-from telethon.errors import MessageDeleteForbiddenError
+from telethon.errors import FloodWaitError, MessageDeleteForbiddenError
+
+import constants
 
 class Spam:
     """Handles spam commands like .spam, .delayspam, and .stopspam."""
 
-    def __init__(self, client):
+    def __init__(self, client, pacer):
         self.client = client
+        self.pacer = pacer  # Shared PacingScheduler of this account
         self.spamming = {}  # Dictionary to track spam per chat
 
     async def spam_message(self, chat_id, message, count, event=None):
@@ -21,7 +24,8 @@ class Spam:
         for _ in range(count):
             if not self.spamming.get(chat_id, False):  # Stop if .stopspam is used
                 break
-            await self.client.send_message(chat_id, message)
+            if not await self._send(chat_id, message):
+                break
         self.spamming[chat_id] = False  # Reset spam status after completion
 
     async def delayspam_message(self, chat_id, message, count, delay, event=None):
@@ -36,10 +40,25 @@ class Spam:
         for _ in range(count):
             if not self.spamming.get(chat_id, False):  # Stop if .stopspam is used
                 break
-            await self.client.send_message(chat_id, message)
+            if not await self._send(chat_id, message):
+                break
             await asyncio.sleep(delay)
         self.spamming[chat_id] = False  # Reset spam status after completion
 
+    async def _send(self, chat_id, message):
+        """Sends one message, again after a flood wait the pacer sat out; False once spam is stopped or it gave up."""
+        for _ in range(constants.SPAM_SEND_ATTEMPTS):
+            await self.pacer.wait()
+            if not self.spamming.get(chat_id, False):  # Stopped during the wait
+                return False
+            try:
+                async with self.pacer.measure():
+                    await self.client.send_message(chat_id, message)
+                return True
+            except FloodWaitError:
+                continue
+        return False
+
     async def stop_spam(self, event):
         """Stops any ongoing spam in the current chat."""
         chat_id = event.chat_id
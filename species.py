@@ -0,0 +1,317 @@
+"""Species database and identification index used by the guesser.
+
+The database is a compact binary file holding the raw `PhotoStrippedSize`
+bytes of every known Pokemon. Layout (little-endian):
+
+    header   : magic b'PKDB', version u16, record size u16, count u32, reserved u32
+    records  : `count` fixed-size entries of
+               digest 16s, name offset u32, name length u16, data offset u32, data length u16
+    blob     : UTF-8 names and thumbnail bytes referenced by the records
+
+The file is memory-mapped; names and thumbnails are only read when asked for.
+
+Species learned at runtime are appended to a JSON-lines journal and folded
+back into the database by `SpeciesJournal.compact`.
+"""
+import argparse
+import asyncio
+import ast
+import base64
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from loguru import logger
+
+
+STRIPPED_SIZE_REPR_REGEX = re.compile(r"^PhotoStrippedSize\(type='(\w+)', bytes=(b'.*'|b\".*\")\)$", re.S)
+
+DIGEST_SIZE = 16
+
+DATABASE_MAGIC = b'PKDB'
+DATABASE_VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+RECORD = struct.Struct(f'<{DIGEST_SIZE}sIHIH')
+
+_databases: Dict[str, 'SpeciesDatabase'] = {}
+
+
+def stripped_digest(data: bytes) -> bytes:
+    """Returns the canonical digest of the raw `PhotoStrippedSize` bytes."""
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+def parse_stripped_repr(value: str) -> Optional[bytes]:
+    """Recovers the raw bytes from the `repr()` of a `PhotoStrippedSize` object.
+
+    Args:
+        value: A string such as "PhotoStrippedSize(type='i', bytes=b'...')".
+
+    Returns:
+        The thumbnail bytes, or None when the string is not a valid repr.
+    """
+    match = STRIPPED_SIZE_REPR_REGEX.match(value or '')
+    if not match:
+        return None
+    try:
+        data = ast.literal_eval(match.group(2))
+    except (SyntaxError, ValueError):
+        return None
+    return data if isinstance(data, bytes) else None
+
+
+class SpeciesDatabase:
+    """Read-only, memory-mapped view over a binary species database."""
+
+    __slots__ = ('_path', '_mmap', '_count')
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f'{path} is too small to be a species database.')
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, record_size, count, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != DATABASE_MAGIC:
+            raise ValueError(f'{path} is not a species database.')
+        if version != DATABASE_VERSION or record_size != RECORD.size:
+            raise ValueError(f'{path} has unsupported format version {version}.')
+        if HEADER.size + count * RECORD.size > size:
+            raise ValueError(f'{path} is truncated.')
+        self._count = count
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _record(self, slot: int) -> Tuple[bytes, int, int, int, int]:
+        if not 0 <= slot < self._count:
+            raise IndexError(slot)
+        return RECORD.unpack_from(self._mmap, HEADER.size + slot * RECORD.size)
+
+    def digest_at(self, slot: int) -> bytes:
+        return self._record(slot)[0]
+
+    def name_at(self, slot: int) -> str:
+        _, name_offset, name_length, _, _ = self._record(slot)
+        return self._mmap[name_offset:name_offset + name_length].decode('utf-8')
+
+    def data_at(self, slot: int) -> bytes:
+        _, _, _, data_offset, data_length = self._record(slot)
+        return self._mmap[data_offset:data_offset + data_length]
+
+    def digests(self) -> Iterator[Tuple[int, bytes]]:
+        """Yields `(slot, digest)` pairs by reading only the record table."""
+        for slot, record in enumerate(RECORD.iter_unpack(self._mmap[HEADER.size:HEADER.size + self._count * RECORD.size])):
+            yield slot, record[0]
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        """Yields `(name, data)` for every species in the database."""
+        for slot in range(self._count):
+            yield self.name_at(slot), self.data_at(slot)
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def write_species_database(path: str, entries: Iterable[Tuple[str, bytes]]) -> int:
+    """Atomically writes `(name, data)` entries to a binary species database.
+
+    Later entries replace earlier ones with the same thumbnail.
+
+    Returns:
+        The number of thumbnails written.
+    """
+    species: Dict[bytes, Tuple[str, bytes]] = {}
+    for name, data in entries:
+        species[stripped_digest(data)] = (name, data)
+
+    records = []
+    blob = bytearray()
+    blob_offset = HEADER.size + len(species) * RECORD.size
+    for digest, (name, data) in species.items():
+        encoded_name = name.encode('utf-8')
+        if len(encoded_name) > 0xFFFF or len(data) > 0xFFFF:
+            raise ValueError(f'Entry `{name}` is too large for the species database.')
+        name_offset = blob_offset + len(blob)
+        blob += encoded_name
+        data_offset = blob_offset + len(blob)
+        blob += data
+        records.append(RECORD.pack(digest, name_offset, len(encoded_name), data_offset, len(data)))
+
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(DATABASE_MAGIC, DATABASE_VERSION, RECORD.size, len(records), 0))
+        f.writelines(records)
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return len(records)
+
+
+def convert_json_database(json_path: str, database_path: str) -> int:
+    """Converts a legacy `{name: repr(PhotoStrippedSize)}` JSON file to the binary format."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+
+    def entries() -> Iterator[Tuple[str, bytes]]:
+        for name, value in mapping.items():
+            data = parse_stripped_repr(value)
+            if data is None:
+                logger.warning(f'Skipping `{name}`: unparsable stripped size.')
+                continue
+            yield name, data
+
+    return write_species_database(database_path, entries())
+
+
+def get_species_database(path: str) -> SpeciesDatabase:
+    """Returns the process-wide database for `path`, opening it on first use."""
+    database = _databases.get(path)
+    if database is None:
+        database = _databases[path] = SpeciesDatabase(path)
+        logger.info(f'Loaded species database `{path}` ({len(database)} species).')
+    return database
+
+
+class SpeciesIndex:
+    """Maps the digest of a stripped thumbnail to the Pokemon name, independent of the number of species."""
+
+    __slots__ = ('_database', '_slots', '_learned')
+
+    def __init__(self, database: Optional[SpeciesDatabase] = None):
+        self._database = database
+        self._slots: Dict[bytes, int] = {}
+        self._learned: Dict[bytes, Tuple[str, bytes]] = {}
+        if database is not None:
+            self._slots = {digest: slot for slot, digest in database.digests()}
+
+    def lookup(self, data: bytes) -> Optional[str]:
+        """Returns the name matching the thumbnail bytes, if known."""
+        digest = stripped_digest(data)
+        learned = self._learned.get(digest)
+        if learned is not None:
+            return learned[0]
+        slot = self._slots.get(digest)
+        return self._database.name_at(slot) if slot is not None else None
+
+    def learn(self, name: str, data: bytes) -> None:
+        """Adds or replaces the entry for the thumbnail bytes in place."""
+        self._learned[stripped_digest(data)] = (name, data)
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        """Yields `(name, data)` for the database entries followed by the learned ones."""
+        if self._database is not None:
+            yield from self._database.items()
+        yield from self._learned.values()
+
+    def __bool__(self) -> bool:
+        return bool(self._slots or self._learned)
+
+    def __len__(self) -> int:
+        return len(self._slots.keys() | self._learned.keys())
+
+
+class SpeciesJournal:
+    """Append-only journal of species learned at runtime.
+
+    Every entry is a single JSON line, written and fsynced from a worker thread,
+    so a reveal never serializes the whole database on the event loop. A torn
+    trailing line left by a crash is ignored on replay. Once enough entries have
+    accumulated, the journal is folded into the binary database and truncated.
+    """
+
+    __slots__ = ('_path', '_database_path', '_compact_threshold', '_pending', '_lock', '_compaction_task')
+
+    def __init__(self, path: str, database_path: str, compact_threshold: int = 50) -> None:
+        self._path = path
+        self._database_path = database_path
+        self._compact_threshold = compact_threshold
+        self._pending = 0
+        self._lock = asyncio.Lock()
+        self._compaction_task: Optional[asyncio.Task] = None
+
+    def replay(self) -> Iterator[Tuple[str, bytes]]:
+        """Yields the journaled `(name, data)` entries in the order they were learned."""
+        try:
+            with open(self._path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return
+
+        end = content.rfind(b'\n') + 1
+        if end < len(content):
+            logger.warning(f'[{self.__class__.__name__}] Dropping torn trailing entry in `{self._path}`.')
+            os.truncate(self._path, end)
+
+        for line in content[:end].splitlines():
+            try:
+                entry = json.loads(line)
+                name, data = entry['name'], base64.b64decode(entry['bytes'])
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f'[{self.__class__.__name__}] Ignoring corrupt journal line in `{self._path}`.')
+                continue
+            self._pending += 1
+            yield name, data
+
+    def _append_sync(self, line: str) -> None:
+        with open(self._path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def append(self, name: str, data: bytes, index: 'SpeciesIndex') -> None:
+        """Durably records a learned species and schedules compaction into the database when due."""
+        line = json.dumps({'name': name, 'bytes': base64.b64encode(data).decode('ascii')}) + '\n'
+        async with self._lock:
+            await asyncio.to_thread(self._append_sync, line)
+            self._pending += 1
+        if self._pending >= self._compact_threshold and self._compaction_task is None:
+            self._compaction_task = asyncio.create_task(self.compact(index))
+
+    def _compact_sync(self, entries: list) -> int:
+        count = write_species_database(self._database_path, entries)
+        with open(self._path, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        return count
+
+    async def compact(self, index: 'SpeciesIndex') -> None:
+        """Rewrites the database with every indexed species and truncates the journal."""
+        try:
+            async with self._lock:
+                count = await asyncio.to_thread(self._compact_sync, list(index.items()))
+                self._pending = 0
+            logger.info(f'[{self.__class__.__name__}] Compacted journal into `{self._database_path}` ({count} thumbnails).')
+        except OSError as e:
+            logger.warning(f'[{self.__class__.__name__}] Journal compaction failed: {e}')
+        finally:
+            self._compaction_task = None
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Species database tools.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert = subparsers.add_parser('convert', help='Convert a legacy pokemon.json to the binary format.')
+    convert.add_argument('source', help='Path of the JSON file to convert.')
+    convert.add_argument('destination', help='Path of the binary database to write.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        count = convert_json_database(args.source, args.destination)
+        logger.info(f'Wrote {count} species to `{args.destination}`.')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
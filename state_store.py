@@ -0,0 +1,128 @@
+"""Durable engine state, so a restart resumes where the previous process stopped.
+
+Subsystems checkpoint JSON-serializable snapshots with `StateStore.put` from the
+event loop, which only remembers the newest snapshot per key. Shortly after, a
+flush writes every changed snapshot in one transaction from a worker thread, so
+the loop never waits on the disk. The database is SQLite in WAL mode:
+
+    state(account TEXT, key TEXT, value TEXT, updated_at REAL)  -- one row per subsystem of an account
+"""
+import asyncio
+import json
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+import constants
+
+_MISSING = object()
+
+
+class StateStore:
+    """Batched, asynchronous key-value store of engine snapshots, keyed by account."""
+
+    __slots__ = ('_path', '_flush_delay', '_connection', '_pending', '_saved', '_lock', '_flush_task')
+
+    def __init__(self, path: str, flush_delay: float = constants.STATE_FLUSH_SECONDS) -> None:
+        self._path = path
+        self._flush_delay = flush_delay
+        self._connection: Optional[sqlite3.Connection] = None  # Opened by the first worker thread that needs it
+        self._pending: Dict[Tuple[str, str], Any] = {}
+        self._saved: Dict[Tuple[str, str], Any] = {}  # Last snapshot written per key, to skip unchanged ones
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self._path, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS state ('
+                'account TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, '
+                'PRIMARY KEY (account, key))'
+            )
+            self._connection = connection
+        return self._connection
+
+    async def load(self, account: str) -> Dict[str, Any]:
+        """Every snapshot saved for `account`, by key."""
+        async with self._lock:
+            rows = await asyncio.to_thread(self._load_sync, account)
+        state = {}
+        for key, value in rows:
+            try:
+                state[key] = self._saved[(account, key)] = json.loads(value)
+            except ValueError:
+                logger.warning(f'[{self.__class__.__name__}] Ignoring corrupt state `{key}` of account {account}.')
+        return state
+
+    def _load_sync(self, account: str) -> List[Tuple[str, str]]:
+        return self._connect().execute('SELECT key, value FROM state WHERE account = ?', (account,)).fetchall()
+
+    def put(self, account: str, key: str, value: Optional[Any]) -> None:
+        """Queues `value` as the newest snapshot of `key`; `None` deletes it. Unchanged snapshots are not rewritten."""
+        pending_key = (account, key)
+        if pending_key not in self._pending and self._saved.get(pending_key, _MISSING if value is not None else None) == value:
+            return
+        self._pending[pending_key] = value
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._flush_delay)  # Lets the snapshots of every account join one transaction
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Writes the queued snapshots now."""
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write_sync, list(batch.items()))
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.exception(f'[{self.__class__.__name__}] Failed to write {len(batch)} snapshot(s): {e}')
+                for pending_key, value in batch.items():
+                    self._pending.setdefault(pending_key, value)  # Retried with the next flush unless superseded
+                return
+            self._saved.update(batch)
+
+    def _write_sync(self, batch: List[Tuple[Tuple[str, str], Any]]) -> None:
+        now = time.time()
+        upserts = [
+            (account, key, json.dumps(value, separators=(',', ':')), now)
+            for (account, key), value in batch if value is not None
+        ]
+        deletes = [(account, key) for (account, key), value in batch if value is None]
+        connection = self._connect()
+        with connection:  # One transaction
+            connection.executemany(
+                'INSERT INTO state (account, key, value, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (account, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at',
+                upserts
+            )
+            connection.executemany('DELETE FROM state WHERE account = ? AND key = ?', deletes)
+
+    async def close(self) -> None:
+        """Writes what is still queued and closes the database."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await asyncio.to_thread(connection.close)
+
+
+_stores: Dict[str, StateStore] = {}
+
+
+def get_state_store(path: Optional[str] = None) -> StateStore:
+    """Returns the process-wide store for `path`, which defaults to the one configured in `constants` at call time."""
+    path = path or constants.STATE_DATABASE_PATH
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = StateStore(path)
+    return store
@@ -0,0 +1,530 @@
+"""Battle strategy learned from the outcomes of past battles.
+
+Every battle the hunter plays is a `BattleRecord`: the species, each decision
+(attack or throw a ball) with the wild Pokemon's HP band at the time, how the
+battle ended, the PD it paid and how long it took. `CatchStatistics` folds the
+records into counts per species, HP band and action: how often the action
+caught the Pokemon, ended the battle otherwise (fled, fainted), or led to each
+HP band, with the PD paid and the seconds spent.
+
+Those counts form a small Markov model of a battle, with the counts of one
+species shrunk towards those of every species so rare ones still get
+estimates. `ExpectedRatePolicy` solves it for the action with the best
+expected PD per second: PD paid minus ball prices, charged for the time spent
+at the account's average PD per second, since that time could have been spent
+on the next battle. `ConfiguredPolicy` is the fixed rule of the ball lists in
+`constants` and the baseline the learned policy falls back on while it lacks
+data.
+
+Finished battles are appended to a JSON-lines journal (`BATTLE_JOURNAL_PATH`),
+which seeds the statistics at startup and is the input of the offline evaluator:
+
+    python -m strategy [--journal PATH] [--holdout FRACTION]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Protocol, Sequence, Tuple
+
+from loguru import logger
+
+import constants
+
+ATTACK = 'attack'
+BALLS = ('Regular', 'Repeat', 'Great', 'Ultra', 'Nest')  # Order in which the ball lists of `constants` are checked
+HP_BANDS = 4  # Quarters of the wild Pokemon's HP
+CONFIGURED_THROW_HP = 90  # The configured rule attacks until the wild Pokemon's HP drops to this
+
+PRIOR_WEIGHT = 5  # Battles of all species a species' own counts are blended with
+MIN_SAMPLES = 5  # Decisions needed before an action is trusted in an HP band
+EXPLORATION = 0.05  # Share of decisions spent on actions that lack samples
+SOLVE_ITERATIONS = 30  # Upper bound; solving stops once no band's value moves by `SOLVE_TOLERANCE` PD
+SOLVE_TOLERANCE = 0.01
+PLAN_REFRESH_BATTLES = 10  # A species' plan is solved again after this many new battles
+
+# Per (species, band, action): decisions, catches, PD on catch, other endings, PD on those, seconds, next bands
+DECISIONS, CATCHES, CATCH_PD, ENDINGS, ENDING_PD, SECONDS = range(6)
+NEXT_BAND = 6
+STAT_WIDTH = NEXT_BAND + HP_BANDS
+ANY_SPECIES = '*'
+
+STRATEGY_REPORT = "🧠 Battle policy `{policy}`: {battles:,} battles learned, {turns:.1f} turns and {balls:.1f} balls per catch"
+
+
+def hp_band(hp: int, max_hp: int) -> int:
+    """The quarter of its HP the wild Pokemon has left, 0 (under 25%) to 3."""
+    if max_hp <= 0:
+        return HP_BANDS - 1
+    return max(0, min(HP_BANDS - 1, hp * HP_BANDS // max_hp))
+
+
+def configured_ball(species: str) -> Optional[str]:
+    """The ball `constants` lists the species under; None for species that are not hunted."""
+    for ball in BALLS:
+        if species in getattr(constants, f'{ball.upper()}_BALL', ()):
+            return ball
+    return None
+
+
+def allowed_actions(species: str) -> Tuple[str, ...]:
+    """Attacking, the configured ball and any ball that costs no more than it."""
+    ball = configured_ball(species)
+    if ball is None:
+        return (ATTACK,)
+    ceiling = constants.POKEBALL_PRICES.get(ball, 0)
+    return (ATTACK, *(other for other in BALLS if other == ball or constants.POKEBALL_PRICES.get(other, 0) <= ceiling))
+
+
+class Decision(NamedTuple):
+    """One turn to decide: the wild Pokemon's state and the actions on offer."""
+    species: str
+    hp: int
+    max_hp: int
+    actions: Tuple[str, ...]
+
+    @property
+    def band(self) -> int:
+        return hp_band(self.hp, self.max_hp)
+
+
+class BattleRecord:
+    """The decisions and outcome of one battle; times are seconds since the battle began."""
+
+    __slots__ = ('species', 'max_hp', 'message_id', 'search_seconds', 'turns', 'outcome', 'poke_dollars', 'seconds',
+                 'planned', '_started')
+
+    def __init__(self, species: str, max_hp: int, message_id: int = 0, search_seconds: Optional[float] = None) -> None:
+        self.species = species
+        self.max_hp = max_hp
+        self.message_id = message_id
+        self.search_seconds = search_seconds  # Time spent finding this battle since the previous one ended
+        self.turns: List[Tuple[int, str, float]] = []  # (HP band, action, seconds since start)
+        self.outcome: Optional[str] = None  # 'caught', 'fled', 'fainted' or 'ended'
+        self.poke_dollars = 0
+        self.seconds = 0.0
+        self.planned: Optional[str] = None  # Action waiting for its menu to open
+        self._started = time.monotonic()
+
+    def decide(self, band: int, action: str) -> None:
+        self.turns.append((band, action, time.monotonic() - self._started))
+
+    def finish(self, outcome: str, poke_dollars: int) -> None:
+        self.outcome = outcome
+        self.poke_dollars = poke_dollars
+        self.seconds = time.monotonic() - self._started
+
+    @property
+    def last_action(self) -> Optional[str]:
+        return self.turns[-1][1] if self.turns else None
+
+    @property
+    def balls(self) -> int:
+        return sum(1 for _, action, _ in self.turns if action != ATTACK)
+
+    @property
+    def ball_cost(self) -> int:
+        return sum(constants.POKEBALL_PRICES.get(action, 0) for _, action, _ in self.turns if action != ATTACK)
+
+    def to_json(self) -> Dict:
+        return {
+            'species': self.species, 'max_hp': self.max_hp, 'search': self.search_seconds,
+            'turns': [[band, action, round(at, 3)] for band, action, at in self.turns],
+            'outcome': self.outcome, 'pd': self.poke_dollars, 'seconds': round(self.seconds, 3), 'at': time.time(),
+        }
+
+    @classmethod
+    def from_json(cls, entry: Dict) -> 'BattleRecord':
+        record = cls(entry['species'], int(entry['max_hp']), search_seconds=entry.get('search'))
+        record.turns = [(int(band), str(action), float(at)) for band, action, at in entry['turns']]
+        record.outcome = entry['outcome']
+        record.poke_dollars = int(entry.get('pd') or 0)
+        record.seconds = float(entry['seconds'])
+        return record
+
+
+class Expectation(NamedTuple):
+    """What the rest of a battle is expected to bring."""
+    poke_dollars: float = 0.0
+    ball_cost: float = 0.0
+    seconds: float = 0.0
+    turns: float = 0.0
+    balls: float = 0.0
+    catch: float = 0.0
+
+    def value(self, rate: float) -> float:
+        """Net PD, with the time charged at `rate` PD per second."""
+        return self.poke_dollars - self.ball_cost - rate * self.seconds
+
+
+class CatchStatistics:
+    """Counts of what every action did, per species and HP band, and the model they imply."""
+
+    __slots__ = ('_counts', 'battles', 'catches', 'turns', 'balls', 'poke_dollars', 'ball_cost', 'seconds', 'version')
+
+    def __init__(self) -> None:
+        self._counts: Dict[Tuple[str, int, str], List[float]] = {}
+        self.battles = 0
+        self.catches = 0
+        self.turns = 0
+        self.balls = 0
+        self.poke_dollars = 0
+        self.ball_cost = 0
+        self.seconds = 0.0  # Spent in battles and in finding them
+        self.version = 0  # Bumped by every record, so cached decisions know they are stale
+
+    def add(self, record: BattleRecord) -> None:
+        if not record.turns or record.outcome is None:
+            return
+        for index, (band, action, at) in enumerate(record.turns):
+            last = index == len(record.turns) - 1
+            until = record.seconds if last else record.turns[index + 1][2]
+            for species in (record.species, ANY_SPECIES):
+                counts = self._counts.get((species, band, action))
+                if counts is None:
+                    counts = self._counts[(species, band, action)] = [0.0] * STAT_WIDTH
+                counts[DECISIONS] += 1
+                counts[SECONDS] += max(0.0, until - at)
+                if not last:
+                    counts[NEXT_BAND + record.turns[index + 1][0]] += 1
+                elif record.outcome == 'caught':
+                    counts[CATCHES] += 1
+                    counts[CATCH_PD] += record.poke_dollars
+                else:
+                    counts[ENDINGS] += 1
+                    counts[ENDING_PD] += record.poke_dollars
+
+        self.battles += 1
+        self.catches += record.outcome == 'caught'
+        self.turns += len(record.turns)
+        self.balls += record.balls
+        self.poke_dollars += record.poke_dollars
+        self.ball_cost += record.ball_cost
+        search = record.search_seconds
+        self.seconds += record.seconds + (search if search is not None and search <= constants.PERIODICALLY_HUNT_SECONDS else 0)
+        self.version += 1
+
+    @property
+    def rate(self) -> float:
+        """Net PD per second of hunting so far: the price of a second spent in a battle."""
+        return (self.poke_dollars - self.ball_cost) / self.seconds if self.seconds > 0 else 0.0
+
+    def samples(self, band: int, action: str) -> int:
+        counts = self._counts.get((ANY_SPECIES, band, action))
+        return int(counts[DECISIONS]) if counts is not None else 0
+
+    def _blended(self, species: str, band: int, action: str) -> Optional[List[float]]:
+        """The species' counts plus `PRIOR_WEIGHT` decisions' worth of every species' average."""
+        pooled = self._counts.get((ANY_SPECIES, band, action))
+        if pooled is None or pooled[DECISIONS] < MIN_SAMPLES:
+            return None
+        own = self._counts.get((species, band, action))
+        weight = PRIOR_WEIGHT / pooled[DECISIONS]
+        if own is None:
+            return [value * weight for value in pooled]
+        return [mine + value * weight for mine, value in zip(own, pooled)]
+
+    def solve(self, species: str, actions: Sequence[str],
+              choose: Optional[Callable[[int], Optional[str]]] = None) -> Dict[int, Tuple[str, Expectation]]:
+        """The action for every HP band and what the rest of the battle brings from there.
+
+        Without `choose`, each band takes the available action of highest value;
+        otherwise the action `choose(band)` returns, which is how a fixed policy
+        is evaluated. Bands whose action lacks samples are left out.
+        """
+        rate = self.rate
+        models = {}
+        for band in range(HP_BANDS):
+            for action in (actions if choose is None else (choose(band),)):
+                counts = self._blended(species, band, action)
+                if counts is not None:
+                    models.setdefault(band, []).append((action, *self._model(counts, action)))
+
+        plan: Dict[int, Tuple[str, Expectation]] = {}
+        values: Dict[int, float] = {}
+        for _ in range(SOLVE_ITERATIONS):
+            updated, updated_values = {}, {}
+            for band, candidates in models.items():
+                for action, immediate, transitions in candidates:
+                    pd, cost, seconds, turns, balls, catch = immediate
+                    for next_band, probability in transitions:
+                        following = plan.get(next_band)
+                        if following is not None:
+                            after = following[1]
+                            pd += probability * after[0]
+                            cost += probability * after[1]
+                            seconds += probability * after[2]
+                            turns += probability * after[3]
+                            balls += probability * after[4]
+                            catch += probability * after[5]
+                    value = pd - cost - rate * seconds
+                    if band not in updated_values or value > updated_values[band]:
+                        updated[band] = (action, Expectation(pd, cost, seconds, turns, balls, catch))
+                        updated_values[band] = value
+            converged = updated_values.keys() == values.keys() and all(
+                updated[band][0] == plan[band][0] and abs(value - values[band]) < SOLVE_TOLERANCE
+                for band, value in updated_values.items()
+            )
+            plan, values = updated, updated_values
+            if converged:
+                break
+        return plan
+
+    @staticmethod
+    def _model(counts: List[float], action: str) -> Tuple[Expectation, Tuple[Tuple[int, float], ...]]:
+        """What one decision brings by itself, and the probability of each HP band it leads to."""
+        decisions = counts[DECISIONS]
+        thrown = action != ATTACK
+        immediate = Expectation(
+            (counts[CATCH_PD] + counts[ENDING_PD]) / decisions,
+            constants.POKEBALL_PRICES.get(action, 0) if thrown else 0.0,
+            counts[SECONDS] / decisions,
+            1.0,
+            1.0 if thrown else 0.0,
+            counts[CATCHES] / decisions,
+        )
+        transitions = tuple(
+            (band, counts[NEXT_BAND + band] / decisions) for band in range(HP_BANDS) if counts[NEXT_BAND + band]
+        )
+        return immediate, transitions
+
+    def generate_report(self, policy: str) -> str:
+        return STRATEGY_REPORT.format(
+            policy=policy,
+            battles=self.battles,
+            turns=self.turns / self.catches if self.catches else 0.0,
+            balls=self.balls / self.catches if self.catches else 0.0,
+        )
+
+
+class BattlePolicy(Protocol):
+    """Chooses the action for a battle turn from the actions on offer."""
+    name: str
+
+    def choose(self, decision: Decision, statistics: CatchStatistics) -> str: ...
+
+
+class ConfiguredPolicy:
+    """Attacks until the HP drops to `CONFIGURED_THROW_HP`, then throws the configured ball."""
+
+    __slots__ = ()
+    name = 'configured'
+
+    def choose(self, decision: Decision, statistics: CatchStatistics) -> str:
+        ball = configured_ball(decision.species)
+        if decision.hp > CONFIGURED_THROW_HP or ball is None:
+            return ATTACK
+        if ball not in decision.actions:
+            # Out of the configured ball: the cheapest one on offer
+            offered = [action for action in decision.actions if action != ATTACK]
+            return min(offered, key=lambda other: constants.POKEBALL_PRICES.get(other, 0)) if offered else ATTACK
+        return ball
+
+
+class ExpectedRatePolicy:
+    """Takes the action of best expected PD per second; the configured rule until it is measured."""
+
+    __slots__ = ('_fallback', '_exploration', '_plans')
+    name = 'expected_rate'
+
+    def __init__(self, fallback: Optional[BattlePolicy] = None, exploration: float = EXPLORATION) -> None:
+        self._fallback = fallback or ConfiguredPolicy()
+        self._exploration = exploration
+        self._plans: Dict[Tuple[str, Tuple[str, ...]], Tuple[int, Dict[int, Tuple[str, Expectation]]]] = {}
+
+    def choose(self, decision: Decision, statistics: CatchStatistics) -> str:
+        fallback = self._fallback.choose(decision, statistics)
+        band = decision.band
+        if self._exploration:
+            untried = [action for action in decision.actions if statistics.samples(band, action) < MIN_SAMPLES]
+            if untried and random.random() < self._exploration:
+                return random.choice(untried)
+
+        key = (decision.species, decision.actions)
+        cached = self._plans.get(key)
+        if cached is None or statistics.version - cached[0] >= PLAN_REFRESH_BATTLES:
+            cached = self._plans[key] = (statistics.version, statistics.solve(decision.species, decision.actions))
+        plan = cached[1]
+        if band not in plan or statistics.samples(band, fallback) < MIN_SAMPLES:
+            return fallback  # Never trade the known rule for an estimate it cannot be compared with
+        return plan[band][0]
+
+
+POLICIES: Dict[str, Callable[[], BattlePolicy]] = {
+    ConfiguredPolicy.name: ConfiguredPolicy,
+    ExpectedRatePolicy.name: ExpectedRatePolicy,
+}
+
+
+class BattleJournal:
+    """JSON lines of finished battles, trimmed to the newest `limit` once it holds twice as many."""
+
+    __slots__ = ('_path', '_limit', '_lines', '_lock')
+
+    def __init__(self, path: str, limit: int = constants.BATTLE_JOURNAL_LIMIT) -> None:
+        self._path = path
+        self._limit = limit
+        self._lines = 0
+        self._lock = asyncio.Lock()
+
+    def replay(self) -> Iterator[BattleRecord]:
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        self._lines = len(lines)
+        for line in lines[-self._limit:]:
+            try:
+                yield BattleRecord.from_json(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f'[{self.__class__.__name__}] Ignoring corrupt battle in `{self._path}`.')
+
+    def _append_sync(self, line: str, trim: bool) -> None:
+        with open(self._path, 'a', encoding='utf-8') as f:
+            f.write(line)
+        if trim:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()[-self._limit:]
+            temporary = f'{self._path}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(temporary, self._path)
+
+    async def append(self, record: BattleRecord) -> None:
+        line = json.dumps(record.to_json(), separators=(',', ':')) + '\n'
+        async with self._lock:
+            self._lines += 1
+            trim = self._lines >= 2 * self._limit
+            try:
+                await asyncio.to_thread(self._append_sync, line, trim)
+            except OSError as e:
+                logger.warning(f'[{self.__class__.__name__}] Failed to journal a battle: {e}')
+                return
+            if trim:
+                self._lines = self._limit
+
+
+class BattleStrategy:
+    """The policy every hunting account plays by, and the statistics all of them learn into."""
+
+    __slots__ = ('policy', 'statistics', '_journal')
+
+    def __init__(self, policy: BattlePolicy, journal: BattleJournal) -> None:
+        self.policy = policy
+        self.statistics = CatchStatistics()
+        self._journal = journal
+        for record in journal.replay():
+            self.statistics.add(record)
+        logger.info(f'[{self.__class__.__name__}] Policy `{policy.name}`, learned from {self.statistics.battles} battles.')
+
+    def choose(self, species: str, hp: int, max_hp: int, offered: Optional[Iterable[str]] = None) -> str:
+        """The action for this turn; `offered` limits the balls to those on the open menu."""
+        actions = allowed_actions(species)
+        if offered is not None:
+            offered = set(offered)
+            actions = tuple(action for action in actions if action == ATTACK or action in offered)
+        return self.policy.choose(Decision(species, hp, max_hp, actions), self.statistics)
+
+    async def record(self, record: BattleRecord) -> None:
+        self.statistics.add(record)
+        await self._journal.append(record)
+
+    def generate_report(self) -> str:
+        return self.statistics.generate_report(self.policy.name)
+
+
+_strategies: Dict[str, BattleStrategy] = {}
+
+
+def get_battle_strategy(journal_path: Optional[str] = None) -> BattleStrategy:
+    """Returns the process-wide strategy for `journal_path`, defaulting to the one configured in `constants`."""
+    journal_path = journal_path or constants.BATTLE_JOURNAL_PATH
+    strategy = _strategies.get(journal_path)
+    if strategy is None:
+        policy = POLICIES[constants.BATTLE_POLICY]()
+        strategy = _strategies[journal_path] = BattleStrategy(policy, BattleJournal(journal_path))
+    return strategy
+
+
+def evaluate(train: Sequence[BattleRecord], test: Sequence[BattleRecord],
+             policies: Dict[str, BattlePolicy]) -> Dict[str, Dict[str, float]]:
+    """Expected results of every policy over the battles of `test`, by the model learned from `train`.
+
+    Each battle is replayed from the HP band of its first decision. Battles a
+    policy cannot be evaluated on (its action lacks samples) are left out of
+    its results and counted in `coverage`.
+    """
+    statistics = CatchStatistics()
+    for record in train:
+        statistics.add(record)
+    search = sum(
+        record.search_seconds for record in test
+        if record.search_seconds is not None and record.search_seconds <= constants.PERIODICALLY_HUNT_SECONDS
+    )
+    search_per_battle = search / len(test) if test else 0.0
+
+    logged = [record for record in test if record.turns and record.outcome is not None]
+    results = {'logged': _summarize(
+        [Expectation(r.poke_dollars, r.ball_cost, r.seconds, len(r.turns), r.balls, r.outcome == 'caught') for r in logged],
+        len(logged), len(test), search_per_battle
+    )}
+    for name, policy in policies.items():
+        expectations = []
+        plans: Dict[Tuple[str, int], Dict[int, Tuple[str, Expectation]]] = {}
+        for record in logged:
+            actions = allowed_actions(record.species)
+            plan = plans.get((record.species, record.max_hp))
+            if plan is None:
+                def choose(band, species=record.species, max_hp=record.max_hp):
+                    hp = (2 * band + 1) * max_hp // (2 * HP_BANDS)  # Middle of the band
+                    return policy.choose(Decision(species, hp, max_hp, actions), statistics)
+                plan = plans[(record.species, record.max_hp)] = statistics.solve(record.species, actions, choose)
+            band = record.turns[0][0]
+            if band in plan:
+                expectations.append(plan[band][1])
+        results[name] = _summarize(expectations, len(logged), len(test), search_per_battle)
+    return results
+
+
+def _summarize(expectations: Sequence[Expectation], evaluable: int, total: int, search: float) -> Dict[str, float]:
+    count = len(expectations)
+    if not count:
+        return {'coverage': 0.0}
+    sums = Expectation(*(sum(values) for values in zip(*expectations)))
+    seconds = sums.seconds + search * count
+    return {
+        'coverage': count / total if total else 0.0,
+        'pd_per_battle': (sums.poke_dollars - sums.ball_cost) / count,
+        'pd_per_hour': (sums.poke_dollars - sums.ball_cost) / seconds * 3600 if seconds else 0.0,
+        'catch_rate': sums.catch / count,
+        'turns_per_catch': sums.turns / sums.catch if sums.catch else 0.0,
+        'balls_per_catch': sums.balls / sums.catch if sums.catch else 0.0,
+        'seconds_per_battle': sums.seconds / count,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Evaluate battle policies offline on journaled battles.')
+    parser.add_argument('--journal', default=constants.BATTLE_JOURNAL_PATH, help='Battle journal to read.')
+    parser.add_argument('--holdout', type=float, default=0.3, help='Share of the newest battles evaluated on; the rest train the model.')
+    args = parser.parse_args(argv)
+
+    records = list(BattleJournal(args.journal, limit=10**9).replay())
+    split = len(records) - int(len(records) * args.holdout)
+    train, test = records[:split], records[split:] or records
+    policies = {ConfiguredPolicy.name: ConfiguredPolicy(), ExpectedRatePolicy.name: ExpectedRatePolicy(exploration=0)}
+    results = evaluate(train, test, policies)
+    print(f'{len(records)} battles: trained on {len(train)}, evaluated on {len(test)}')
+    for name, values in results.items():
+        print(f'{name}:')
+        for key, value in values.items():
+            print(f'  {key:>20}: {value:,.2f}')
+
+
+if __name__ == '__main__':
+    main()
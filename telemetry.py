@@ -0,0 +1,192 @@
+"""Bounded activity history: per-minute, hourly and daily counters kept in ring buffers.
+
+Every `TimeSeries.add` lands in one ring per resolution, so the hourly and daily
+rings are exact roll-ups of the minutes without a separate pass. Each ring is a
+flat `array` of `len(fields) * size` counters plus the bucket number held by
+every slot. A slot is zeroed when a newer bucket claims it, so memory is fixed
+no matter how long the process runs:
+
+    minutes  : 120 buckets (2 hours)
+    hours    : 336 buckets (2 weeks)
+    days     : 400 buckets (13 months)
+
+Unlike the activity reports, the history is never reset by deactivation, and it
+is checkpointed with its engine (see `state_store.py`).
+"""
+from __future__ import annotations
+
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = ((MINUTE, 120), (HOUR, 24 * 14), (DAY, 400))  # (seconds per bucket, buckets kept)
+
+HISTORY_WINDOWS = (('1h', HOUR), ('24h', DAY), ('7d', 7 * DAY))
+SPARK_LEVELS = '▁▂▃▄▅▆▇█'
+
+HISTORY_WINDOW_LINE = "  {window}: {totals} ({rate:,.0f} {rate_label}/h)"
+HISTORY_SPARK_LINE = "  {rate_label} per {unit}, last {count}: {sparkline}"
+HISTORY_TREND_LINE = "  Last full hour vs 24h average: {trend}"
+
+
+def sparkline(values: Sequence[int]) -> str:
+    """One character per value, scaled to the largest; `·` marks empty buckets."""
+    peak = max(values, default=0)
+    if peak <= 0:
+        return '·' * len(values)
+    return ''.join('·' if value <= 0 else SPARK_LEVELS[min(len(SPARK_LEVELS) - 1, value * len(SPARK_LEVELS) // (peak + 1))] for value in values)
+
+
+class RingSeries:
+    """Counters of a fixed set of fields in fixed-width time buckets; only the latest `size` buckets are kept."""
+
+    __slots__ = ('resolution', 'size', '_width', '_values', '_buckets')
+
+    def __init__(self, width: int, resolution: int, size: int) -> None:
+        self.resolution = resolution
+        self.size = size
+        self._width = width
+        self._values = array('q', bytes(8 * width * size))
+        self._buckets = array('q', [-1]) * size
+
+    def _offset(self, bucket: int) -> int:
+        """Offset of the row holding `bucket`, claiming (and zeroing) its slot if an older bucket held it."""
+        slot = bucket % self.size
+        offset = slot * self._width
+        if self._buckets[slot] != bucket:
+            self._buckets[slot] = bucket
+            self._values[offset:offset + self._width] = array('q', bytes(8 * self._width))
+        return offset
+
+    def add(self, timestamp: float, index: int, amount: int) -> None:
+        bucket = int(timestamp // self.resolution)
+        if self._buckets[bucket % self.size] > bucket:
+            return  # Older than the bucket now holding its slot
+        self._values[self._offset(bucket) + index] += amount
+
+    def value(self, bucket: int, index: int) -> int:
+        slot = bucket % self.size
+        return self._values[slot * self._width + index] if self._buckets[slot] == bucket else 0
+
+    def series(self, timestamp: float, index: int, count: int) -> List[int]:
+        """The last `count` buckets of one field, oldest first; the newest is still filling."""
+        current = int(timestamp // self.resolution)
+        return [self.value(bucket, index) for bucket in range(current - count + 1, current + 1)]
+
+    def totals(self, timestamp: float, count: int) -> List[int]:
+        """Every field summed over the last `count` buckets."""
+        current = int(timestamp // self.resolution)
+        totals = [0] * self._width
+        for bucket in range(current - count + 1, current + 1):
+            slot = bucket % self.size
+            if self._buckets[slot] == bucket:
+                offset = slot * self._width
+                for index in range(self._width):
+                    totals[index] += self._values[offset + index]
+        return totals
+
+    def rows(self) -> Dict[int, List[int]]:
+        """The held buckets that have any counts, by bucket number."""
+        rows = {}
+        for slot, bucket in enumerate(self._buckets):
+            offset = slot * self._width
+            values = self._values[offset:offset + self._width]
+            if bucket >= 0 and any(values):
+                rows[bucket] = values.tolist()
+        return rows
+
+
+class TimeSeries:
+    """Activity history of one engine, by field name."""
+
+    __slots__ = ('fields', '_indexes', '_rings', '_since')
+
+    def __init__(self, fields: Sequence[str]) -> None:
+        self.fields = tuple(fields)
+        self._indexes = {field: index for index, field in enumerate(self.fields)}
+        self._rings = tuple(RingSeries(len(self.fields), resolution, size) for resolution, size in RESOLUTIONS)
+        self._since: Optional[float] = None  # Time of the first recorded activity
+
+    def add(self, field: str, amount: int = 1, timestamp: Optional[float] = None) -> None:
+        timestamp = time.time() if timestamp is None else timestamp
+        if self._since is None:
+            self._since = timestamp
+        index = self._indexes[field]
+        for ring in self._rings:
+            ring.add(timestamp, index, amount)
+
+    def _ring(self, resolution: int) -> RingSeries:
+        return next(ring for ring in self._rings if ring.resolution == resolution)
+
+    def _window(self, window_seconds: int) -> Tuple[RingSeries, int]:
+        """The finest ring holding the whole window, and the number of its buckets the window spans."""
+        ring = next(
+            ring for ring in self._rings
+            if window_seconds % ring.resolution == 0 and window_seconds // ring.resolution <= ring.size
+        )
+        return ring, window_seconds // ring.resolution
+
+    def totals(self, window_seconds: int, timestamp: Optional[float] = None) -> Dict[str, int]:
+        """Counts over the last `window_seconds`; the oldest bucket is whole and the newest still filling."""
+        timestamp = time.time() if timestamp is None else timestamp
+        ring, count = self._window(window_seconds)
+        return dict(zip(self.fields, ring.totals(timestamp, count)))
+
+    def series(self, field: str, resolution: int, count: int, timestamp: Optional[float] = None) -> List[int]:
+        timestamp = time.time() if timestamp is None else timestamp
+        return self._ring(resolution).series(timestamp, self._indexes[field], count)
+
+    def generate_report(self, title: str, labels: Dict[str, str], rate_field: str) -> str:
+        """Totals over the recent windows, hourly and daily sparklines of `rate_field` and its trend."""
+        now = time.time()
+        rate_label = labels[rate_field]
+        lines = [title]
+        for window, seconds in HISTORY_WINDOWS:
+            totals = self.totals(seconds, now)
+            ring, count = self._window(seconds)
+            spanned = (count - 1) * ring.resolution + now % ring.resolution
+            covered = min(spanned, now - self._since) if self._since is not None else 0
+            lines.append(HISTORY_WINDOW_LINE.format(
+                window=window,
+                totals=', '.join(f'{totals[field]:,} {label}' for field, label in labels.items()),
+                rate=totals[rate_field] / (covered / HOUR) if covered > 0 else 0.0,
+                rate_label=rate_label,
+            ))
+
+        hourly = self.series(rate_field, HOUR, 25, now)
+        lines.append(HISTORY_SPARK_LINE.format(rate_label=rate_label, unit='hour', count='24h', sparkline=sparkline(hourly[1:])))
+        lines.append(HISTORY_SPARK_LINE.format(rate_label=rate_label, unit='day', count='14d', sparkline=sparkline(self.series(rate_field, DAY, 14, now))))
+
+        last_hour, earlier = hourly[-2], [value for value in hourly[:-2] if value > 0]
+        if earlier:
+            average = sum(earlier) / len(earlier)
+            lines.append(HISTORY_TREND_LINE.format(trend=f'{(last_hour - average) / average * 100:+.0f}%'))
+        else:
+            lines.append(HISTORY_TREND_LINE.format(trend='N/A'))
+        return '\n'.join(lines)
+
+    def checkpoint(self) -> Optional[Dict[str, Any]]:
+        """The non-empty buckets of every ring, or None before anything was recorded."""
+        if self._since is None:
+            return None
+        return {
+            'fields': list(self.fields),
+            'since': self._since,
+            'rings': {str(ring.resolution): ring.rows() for ring in self._rings},
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Adds a checkpoint's counts; fields that no longer exist are dropped."""
+        indexes = [self._indexes.get(field) for field in state.get('fields', [])]
+        for ring in self._rings:
+            for bucket, values in state.get('rings', {}).get(str(ring.resolution), {}).items():
+                timestamp = int(bucket) * ring.resolution
+                for index, amount in zip(indexes, values):
+                    if index is not None and amount:
+                        ring.add(timestamp, index, int(amount))
+        since = state.get('since')
+        if since is not None and (self._since is None or since < self._since):
+            self._since = since